@@ -11,6 +11,17 @@ from .schemas import BaseDatasetSchema
 from .transforms import load_transforms
 
 
+class BatchTransformCollate:
+    """Collates a batch of samples and applies the batch transformations to the whole batch of inputs"""
+
+    def __init__(self, batch_transform):
+        self.batch_transform = batch_transform
+
+    def __call__(self, batch):
+        inputs, targets = torch.utils.data.default_collate(batch)
+        return self.batch_transform(inputs), targets
+
+
 class BaseDataset(Dataset, Configurable):
     """This class represents a basic dataset for machine learning tasks. It is a
     subclass of both :class:Dataset and :class:Configurable.
@@ -50,6 +61,8 @@ class BaseDataset(Dataset, Configurable):
         self.transform = self.load_transforms(self.config.transforms)
         self.target_transform = self.load_transforms(self.config.target_transforms)
         self.joint_transform = self.load_transforms(self.config.joint_transforms)
+        # transformations applied to whole batches after collation, see `BatchTransformCollate`
+        self.batch_transform = self.load_transforms(self.config.batch_transforms)
 
     def __getitem__(self, index):
         """Implement here what you want to return"""
@@ -73,13 +86,18 @@ class BaseDataset(Dataset, Configurable):
         return True
 
     def dataloader(self):
-        """Create and return a dataloader for the dataset"""
+        """Create and return a dataloader for the dataset, applying the batch transformations after collation"""
         return torch.utils.data.DataLoader(
             self,
             batch_size=self.batch_size,
             shuffle=self.shuffle,
             num_workers=self.num_workers,
             pin_memory=self.pin_memory,
+            collate_fn=(
+                BatchTransformCollate(self.batch_transform)
+                if self.batch_transform
+                else None
+            ),
             # drop_last=True,
         )
 
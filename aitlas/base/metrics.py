@@ -3,10 +3,80 @@ import numpy as np
 import torch
 from ignite.metrics import confusion_matrix
 from ignite.metrics.multilabel_confusion_matrix import MultiLabelConfusionMatrix
-from sklearn.metrics import average_precision_score, roc_auc_score
 from torchmetrics.detection.mean_ap import MeanAveragePrecision
 
 
+def average_precision(y_true, y_score):
+    """Computes the average precision per class, the same way as `sklearn.metrics.average_precision_score`.
+
+    :param y_true: binary labels with shape (samples, classes)
+    :type y_true: torch.Tensor
+    :param y_score: scores with shape (samples, classes)
+    :type y_score: torch.Tensor
+    :return: average precision per class, 0 for classes without positive samples
+    :rtype: torch.Tensor
+    """
+    y_score, order = torch.sort(y_score.float(), dim=0, descending=True, stable=True)
+    y_true = torch.gather(y_true, 0, order).double()
+
+    tp = torch.cumsum(y_true, dim=0)
+    fp = torch.cumsum(1 - y_true, dim=0)
+
+    # the curve is evaluated only at the last sample of each group of tied scores
+    distinct = torch.ones_like(y_score, dtype=torch.bool)
+    distinct[:-1] = y_score[:-1] != y_score[1:]
+
+    # true positives at the previous evaluated threshold
+    evaluated_tp = torch.where(distinct, tp, torch.zeros_like(tp))
+    tp_previous = torch.cummax(evaluated_tp, dim=0)[0]
+    tp_previous = torch.cat([torch.zeros_like(tp[:1]), tp_previous[:-1]])
+
+    precision = tp / (tp + fp)
+    positives = tp[-1]
+    ap = torch.where(distinct, (tp - tp_previous) * precision, torch.zeros_like(tp))
+    return ap.sum(dim=0) / positives.clamp(min=1)
+
+
+def roc_auc(y_true, y_score):
+    """Computes the area under the ROC curve per class, from the ranks of the scores (Mann-Whitney U).
+
+    :param y_true: binary labels with shape (samples, classes)
+    :type y_true: torch.Tensor
+    :param y_score: scores with shape (samples, classes)
+    :type y_score: torch.Tensor
+    :return: ROC AUC per class, NaN for classes with only one label value
+    :rtype: torch.Tensor
+    """
+    n = y_score.size(0)
+    y_score, order = torch.sort(y_score.float(), dim=0, stable=True)
+    y_true = torch.gather(y_true, 0, order).double()
+
+    # tied scores get the average of their ranks
+    positions = (
+        torch.arange(1, n + 1, dtype=torch.float64, device=y_score.device)
+        .unsqueeze(1)
+        .expand_as(y_true)
+    )
+    starts = torch.ones_like(y_score, dtype=torch.bool)
+    starts[1:] = y_score[1:] != y_score[:-1]
+    ends = torch.ones_like(y_score, dtype=torch.bool)
+    ends[:-1] = starts[1:]
+    first = torch.where(starts, positions, torch.zeros_like(positions))
+    first = torch.cummax(first, dim=0)[0]
+    last = torch.where(ends, positions, torch.full_like(positions, n))
+    last = torch.flip(torch.cummin(torch.flip(last, [0]), dim=0)[0], [0])
+    ranks = (first + last) / 2
+
+    positives = y_true.sum(dim=0)
+    negatives = n - positives
+    auc = ((ranks * y_true).sum(dim=0) - positives * (positives + 1) / 2) / (
+        positives * negatives
+    )
+    return torch.where(
+        (positives > 0) & (negatives > 0), auc, torch.full_like(auc, float("nan"))
+    )
+
+
 class BaseMetric:
     """Base class for metrics"""
 
@@ -179,34 +249,43 @@ class MultiLabelRunningScore(RunningScore):
         self.confusion_matrix = MultiLabelConfusionMatrix(
             num_classes=self.num_classes, device=self.device,
         )
-        self.list_y_prob = []
-        self.list_y_true = []
+        # growable buffers with the probabilities and the labels, kept on the device
+        self.y_prob = torch.empty((0, num_classes), dtype=torch.float32, device=device)
+        self.y_true = torch.empty((0, num_classes), dtype=torch.uint8, device=device)
+        self.count = 0
 
     def reset(self):
-        """Reset the confusion matrix and list of probabilities"""
+        """Reset the confusion matrix and the buffers of probabilities"""
         self.confusion_matrix.reset()
-        self.list_y_prob = []
-        self.list_y_true = []
+        self.count = 0
 
     def update(self, y_true, y_pred, y_prob=None):
         """Updates stats on each batch"""
         self.confusion_matrix.update((y_pred, y_true))
-        self.list_y_prob.extend(y_prob.tolist())
-        self.list_y_true.extend(y_true.tolist())
+
+        size = y_true.size(0)
+        if self.count + size > self.y_prob.size(0):
+            capacity = max(2 * self.y_prob.size(0), self.count + size, 1024)
+            self.y_prob = self.grow(self.y_prob, capacity)
+            self.y_true = self.grow(self.y_true, capacity)
+
+        self.y_prob[self.count : self.count + size] = y_prob.detach()
+        self.y_true[self.count : self.count + size] = y_true.detach()
+        self.count += size
+
+    def grow(self, buffer, capacity):
+        """Returns a larger buffer with the filled rows copied"""
+        grown = buffer.new_empty((capacity, buffer.size(1)))
+        grown[: self.count] = buffer[: self.count]
+        return grown
 
     def map(self):
-        return {
-            "mAP": average_precision_score(
-                np.array(self.list_y_true), np.array(self.list_y_prob)
-            )
-        }
+        ap = average_precision(self.y_true[: self.count], self.y_prob[: self.count])
+        return {"mAP": float(ap.mean())}
 
     def roc_auc_score(self):
-        return {
-            "roc_auc_score": roc_auc_score(
-                np.array(self.list_y_true), np.array(self.list_y_prob), average=None
-            )
-        }
+        auc = roc_auc(self.y_true[: self.count], self.y_prob[: self.count])
+        return {"roc_auc_score": auc.cpu().numpy()}
 
     def accuracy(self):
         tp, tn, fp, fn = self.get_outcomes()
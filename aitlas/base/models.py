@@ -2,10 +2,10 @@
 This is the base class for all models. All models should subclass it. 
 """
 import collections
+import contextlib
 import copy
 import logging
 import os
-from shutil import copyfile
 
 import matplotlib.patches as patches
 import matplotlib.pyplot as plt
@@ -16,7 +16,14 @@ import torch.nn as nn
 from torch.utils.tensorboard import SummaryWriter
 from tqdm import tqdm
 
-from ..utils import current_ts, save_best_model, stringify
+from ..utils import (
+    CheckpointWriter,
+    current_ts,
+    save_best_model,
+    state_dict_to_cpu,
+    stringify,
+    write_checkpoint,
+)
 from .config import Configurable
 from .datasets import BaseDataset
 from .schemas import BaseModelSchema
@@ -25,6 +32,13 @@ from .schemas import BaseModelSchema
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
 
+def batch_length(inputs):
+    """Returns the number of samples in a batch of inputs, a tensor, a list or a tuple of tensors"""
+    if isinstance(inputs, tuple):
+        return len(inputs[0])
+    return len(inputs)
+
+
 class EarlyStopping:
     """
     Early stopping to stop the training when the loss does not improve after
@@ -70,6 +84,7 @@ class BaseModel(nn.Module, Configurable):
     schema = BaseModelSchema
     name = None
     log_loss = True
+    collect_train_metrics = True
 
     def __init__(self, config=None):
         """BaseModel constructor
@@ -96,6 +111,21 @@ class BaseModel(nn.Module, Configurable):
             else None
         )
 
+        # mixed precision and memory format
+        self.mixed_precision = self.config.mixed_precision
+        self.channels_last = self.config.channels_last
+        self.autocast_dtype = None
+        if self.mixed_precision == "fp16" and self.device.type == "cuda":
+            self.autocast_dtype = torch.float16
+        elif self.mixed_precision:
+            if self.mixed_precision == "fp16":
+                logging.warning("fp16 autocast is not supported on CPU, using bf16.")
+            self.autocast_dtype = torch.bfloat16
+        self.grad_scaler = self.load_grad_scaler()
+
+        # background writer for the checkpoints, active during training
+        self.checkpoint_writer = None
+
     def prepare(self):
         """Prepare the model before using it. Loans loss criteria, optimizer, lr scheduler and early stopping."""
 
@@ -115,6 +145,8 @@ class BaseModel(nn.Module, Configurable):
         resume_model: str = None,
         val_dataset: BaseDataset = None,
         run_id: str = None,
+        train_eval_epochs: int = None,
+        train_eval_samples: int = None,
         **kwargs,
     ):
         """Main method to train the model. It trains the model for the specified number of epochs and saves the model after every save_epochs. It also logs the loss after every iterations_log.
@@ -135,6 +167,10 @@ class BaseModel(nn.Module, Configurable):
         :type val_dataset: aitlas.base.BaseDataset, optional
         :param run_id: Optional id to idenfity the experiment, defaults to None
         :type run_id: str, optional
+        :param train_eval_epochs: Number of epochs after which the train set is evaluated in a separate pass. Otherwise the train metrics are collected during training, defaults to None
+        :type train_eval_epochs: int, optional
+        :param train_eval_samples: Size of the fixed random subsample of the train set used in the separate evaluation pass, defaults to None (the whole train set)
+        :type train_eval_samples: int, optional
         :return: Returns the loss at the end of training.
         :rtype: float
         """
@@ -148,7 +184,7 @@ class BaseModel(nn.Module, Configurable):
 
         best_loss = None
         best_epoch = None
-        best_model = None
+        best_state_dict = None
 
         # load the model if needs to resume training
         if resume_model:
@@ -156,116 +192,139 @@ class BaseModel(nn.Module, Configurable):
                 resume_model, self.optimizer
             )
 
+        if train_eval_samples and not train_eval_epochs and self.collect_train_metrics:
+            logging.warning(
+                "train_eval_samples is ignored without train_eval_epochs, "
+                "the train metrics are collected during training"
+            )
+
         # allocate device
         self.allocate_device()
 
-        # start logger
+        # start logger and checkpoint writer
         self.writer = SummaryWriter(os.path.join(model_directory, run_id))
+        self.checkpoint_writer = CheckpointWriter()
 
-        # get data loaders
-        train_loader = dataset.dataloader()
-        val_loader = None
-        if val_dataset:
-            val_loader = val_dataset.dataloader()
-
-        for epoch in range(start_epoch, epochs):  # loop over the dataset multiple times
-            start = current_ts()
-            loss = self.train_epoch(
-                epoch, train_loader, self.optimizer, self.criterion, iterations_log
-            )
-            train_time = current_ts() - start
-            total_train_time += train_time
-            train_time_epoch.append(train_time)
-
-            self.writer.add_scalar("Loss/train", loss, epoch + 1)
-            if epoch % save_epochs == 0:
-                self.save_model(
-                    model_directory, epoch, self.optimizer, loss, start, run_id
-                )
-
-            # evaluate against the train set
-            self.running_metrics.reset()
-            train_loss = self.evaluate_model(
-                train_loader,
-                criterion=self.criterion,
-                description="testing on train set",
+        try:
+            # get data loaders
+            train_loader = dataset.dataloader()
+            train_eval_loader = self.train_evaluation_loader(
+                train_loader, train_eval_samples
             )
-            self.log_metrics(
-                self.running_metrics.get_scores(self.metrics),
-                dataset.get_labels(),
-                "train",
-                self.writer,
-                epoch + 1,
-            )
-
-            # for object detection log the loss calculated during training, otherwise the loss calculated in eval mode
-            if train_loss:
-                train_losses.append(train_loss)
-            else:
-                train_losses.append(loss)
-
-            # evaluate against a validation set if there is one
-            if val_loader:
-                self.running_metrics.reset()
-                val_loss = self.evaluate_model(
-                    val_loader,
-                    criterion=self.criterion,
-                    description="testing on validation set",
+            val_loader = None
+            if val_dataset:
+                val_loader = val_dataset.dataloader()
+
+            # loop over the dataset multiple times
+            for epoch in range(start_epoch, epochs):
+                start = current_ts()
+                loss = self.train_epoch(
+                    epoch, train_loader, self.optimizer, self.criterion, iterations_log
                 )
-
+                train_time = current_ts() - start
+                total_train_time += train_time
+                train_time_epoch.append(train_time)
+
+                self.writer.add_scalar("Loss/train", loss, epoch + 1)
+                if epoch % save_epochs == 0:
+                    self.save_model(
+                        model_directory, epoch, self.optimizer, loss, start, run_id
+                    )
+
+                # evaluate against the train set, if the metrics collected during training are not used
+                train_loss = None
+                if not self.collect_train_metrics or (
+                    train_eval_epochs and (epoch + 1) % train_eval_epochs == 0
+                ):
+                    self.running_metrics.reset()
+                    train_loss = self.evaluate_model(
+                        train_eval_loader,
+                        criterion=self.criterion,
+                        description="testing on train set",
+                    )
                 self.log_metrics(
                     self.running_metrics.get_scores(self.metrics),
                     dataset.get_labels(),
-                    "val",
+                    "train",
                     self.writer,
                     epoch + 1,
                 )
 
-                if self.log_loss:
-                    if not best_loss or val_loss < best_loss:
-                        best_loss = val_loss
-                        best_epoch = epoch
-                        best_model = copy.deepcopy(self.model)
-
-                    # adjust learning rate if needed
-                    if self.lr_scheduler:
-                        if isinstance(
-                            self.lr_scheduler,
-                            torch.optim.lr_scheduler.ReduceLROnPlateau,
-                        ):
-                            self.lr_scheduler.step(val_loss)
-                        else:
-                            self.lr_scheduler.step()
-
-                    val_losses.append(val_loss)
-                    self.early_stopping(val_loss)
-                    if self.early_stopping.early_stop:
-                        break
-
-                    self.writer.add_scalar("Loss/val", val_loss, epoch + 1)
-            else:
-                if self.lr_scheduler and not isinstance(
-                    self.lr_scheduler, torch.optim.lr_scheduler.ReduceLROnPlateau
-                ):
-                    self.lr_scheduler.step()
-
-        self.writer.close()
-
-        # save the model in the end
-        self.save_model(model_directory, epochs, self.optimizer, loss, start, run_id)
-
-        # save the model with lowest validation loss
-        if best_model:
-            save_best_model(
-                best_model,
-                model_directory,
-                best_epoch + 1,
-                self.optimizer,
-                best_loss,
-                start,
-                run_id,
+                # for object detection log the loss calculated during training, otherwise the loss calculated in eval mode
+                if train_loss:
+                    train_losses.append(train_loss)
+                else:
+                    train_losses.append(loss)
+
+                # evaluate against a validation set if there is one
+                if val_loader:
+                    self.running_metrics.reset()
+                    val_loss = self.evaluate_model(
+                        val_loader,
+                        criterion=self.criterion,
+                        description="testing on validation set",
+                    )
+
+                    self.log_metrics(
+                        self.running_metrics.get_scores(self.metrics),
+                        dataset.get_labels(),
+                        "val",
+                        self.writer,
+                        epoch + 1,
+                    )
+
+                    if self.log_loss:
+                        if not best_loss or val_loss < best_loss:
+                            best_loss = val_loss
+                            best_epoch = epoch
+                            best_state_dict = state_dict_to_cpu(self.model.state_dict())
+
+                        # adjust learning rate if needed
+                        if self.lr_scheduler:
+                            if isinstance(
+                                self.lr_scheduler,
+                                torch.optim.lr_scheduler.ReduceLROnPlateau,
+                            ):
+                                self.lr_scheduler.step(val_loss)
+                            else:
+                                self.lr_scheduler.step()
+
+                        val_losses.append(val_loss)
+                        self.early_stopping(val_loss)
+                        if self.early_stopping.early_stop:
+                            break
+
+                        self.writer.add_scalar("Loss/val", val_loss, epoch + 1)
+                else:
+                    if self.lr_scheduler and not isinstance(
+                        self.lr_scheduler, torch.optim.lr_scheduler.ReduceLROnPlateau
+                    ):
+                        self.lr_scheduler.step()
+
+            self.writer.close()
+
+            # save the model in the end
+            self.save_model(
+                model_directory, epochs, self.optimizer, loss, start, run_id
             )
 
+            # save the model with lowest validation loss
+            if best_state_dict:
+                save_best_model(
+                    best_state_dict,
+                    model_directory,
+                    best_epoch + 1,
+                    self.optimizer,
+                    best_loss,
+                    start,
+                    run_id,
+                    writer=self.checkpoint_writer,
+                )
+        finally:
+            # wait for the checkpoints to be written, also when training fails
+            self.checkpoint_writer.close()
+            self.checkpoint_writer = None
+
         logging.info(f"Train loss: {train_losses}")
         logging.info(f"Validation loss: {val_losses}")
         logging.info(f"Train time per epochs: {train_time_epoch}")
@@ -278,42 +337,52 @@ class BaseModel(nn.Module, Configurable):
         running_loss = 0.0
         running_items = 0
         total_loss = 0.0
+        accumulation_steps = self.config.accumulation_steps
+
+        # collect the train metrics from the outputs computed during training
+        if self.collect_train_metrics:
+            self.running_metrics.reset()
 
         self.model.train()
+        self.zero_grad_optimizers(optimizer)
         for i, data in enumerate(tqdm(dataloader, desc="training")):
             # get the inputs; data is a list of [inputs, labels]
             inputs, labels = data
-            inputs = inputs.to(self.device)
+            inputs = self.inputs_to_device(inputs)
             labels = labels.to(self.device)
 
-            # zero the parameter gradients
-            if isinstance(optimizer, tuple):
-                for opt in optimizer:
-                    opt.zero_grad()
-            else:
-                optimizer.zero_grad()
+            # the last accumulation window of the epoch can hold fewer batches
+            window_start = i - i % accumulation_steps
+            window = min(accumulation_steps, len(dataloader) - window_start)
 
-            # forward + backward + optimize
-            outputs = self(inputs)
+            # forward + backward, in micro-batches if the batch is too large
+            batch_loss = 0.0
+            for micro_inputs, micro_labels in self.split_micro_batches(inputs, labels):
+                with self.autocast():
+                    outputs = self(micro_inputs)
 
-            # check if outputs is OrderedDict for segmentation
-            if isinstance(outputs, collections.abc.Mapping):
-                outputs = outputs["out"]
+                    # check if outputs is OrderedDict for segmentation
+                    if isinstance(outputs, collections.abc.Mapping):
+                        outputs = outputs["out"]
 
-            loss = criterion(outputs, labels)
-            loss.backward()
+                    loss = criterion(outputs, micro_labels)
 
-            # perform a single optimization step
-            if isinstance(optimizer, tuple):
-                for opt in optimizer:
-                    opt.step()
-            else:
-                optimizer.step()
+                # weight the loss by the micro-batch share and the batches of the window
+                weight = batch_length(micro_inputs) / batch_length(inputs)
+                self.grad_scaler.scale(loss * weight / window).backward()
+                batch_loss += loss.item() * weight
+
+                if self.collect_train_metrics:
+                    self.update_running_metrics(outputs.detach().float(), micro_labels)
+
+            # perform an optimization step once enough gradients are accumulated
+            if (i + 1) % accumulation_steps == 0 or i + 1 == len(dataloader):
+                self.step_optimizers(optimizer)
 
             # log statistics
-            running_loss += loss.item() * inputs.size(0)
-            running_items += inputs.size(0)
-            total_loss += loss.item() * inputs.size(0)
+            running_loss += batch_loss * batch_length(inputs)
+            running_items += batch_length(inputs)
+            total_loss += batch_loss * batch_length(inputs)
 
             if (
                 i % iterations_log == iterations_log - 1
@@ -330,6 +399,41 @@ class BaseModel(nn.Module, Configurable):
         )
         return total_loss
 
+    def split_micro_batches(self, inputs, labels):
+        """
+        Split a batch into micro-batches of at most `micro_batch_size` samples
+
+        :param inputs: Batch of inputs, a tensor, a list of samples or a tuple of tensors
+                       such as (time series, mask)
+        :param labels: Batch of labels, a tensor or a list of targets
+        :yield: Tuples of (inputs, labels) for each micro-batch
+        """
+        size = batch_length(inputs)
+        step = self.config.micro_batch_size or size
+        for start in range(0, size, step):
+            if isinstance(inputs, tuple):
+                micro_inputs = tuple(x[start : start + step] for x in inputs)
+            else:
+                micro_inputs = inputs[start : start + step]
+            yield micro_inputs, labels[start : start + step]
+
+    def zero_grad_optimizers(self, optimizer):
+        """Zero the gradients of a single optimizer or a tuple of optimizers"""
+        optimizers = optimizer if isinstance(optimizer, tuple) else (optimizer,)
+        for opt in optimizers:
+            opt.zero_grad()
+
+    def step_optimizers(self, optimizer):
+        """Perform an optimization step with the accumulated gradients and zero them afterwards
+
+        :param optimizer: A single optimizer or a tuple of optimizers
+        """
+        optimizers = optimizer if isinstance(optimizer, tuple) else (optimizer,)
+        for opt in optimizers:
+            self.grad_scaler.step(opt)
+        self.grad_scaler.update()
+        self.zero_grad_optimizers(optimizer)
+
     def evaluate(
         self,
         dataset: BaseDataset = None,
@@ -377,28 +481,71 @@ class BaseModel(nn.Module, Configurable):
         ):
             if criterion:
                 batch_loss = criterion(outputs, labels)
-                total_loss += batch_loss.item() * inputs.size(0)
+                total_loss += batch_loss.item() * batch_length(inputs)
 
-            predicted_probs, predicted = self.get_predicted(outputs)
-
-            if (
-                len(labels.shape) == 1
-            ):  # if it is multiclass, then we need one hot encoding for the predictions
-                one_hot = torch.zeros(labels.size(0), self.num_classes)
-                predicted = predicted.reshape(predicted.size(0))
-                one_hot[torch.arange(labels.size(0)), predicted.type(torch.long)] = 1
-                predicted = one_hot
-                predicted = predicted.to(self.device)
-
-            self.running_metrics.update(
-                labels.type(torch.int64), predicted.type(torch.int64), predicted_probs
-            )
+            self.update_running_metrics(outputs, labels)
 
         if criterion:
             total_loss = total_loss / len(dataloader.dataset)
 
         return total_loss
 
+    def update_running_metrics(self, outputs, labels):
+        """
+        Update the running metrics with the predictions for a batch
+
+        :param outputs: Model outputs for the batch
+        :type outputs: torch.Tensor
+        :param labels: Labels for the batch
+        :type labels: torch.Tensor
+        """
+        predicted_probs, predicted = self.get_predicted(outputs)
+
+        if (
+            len(labels.shape) == 1
+        ):  # if it is multiclass, then we need one hot encoding for the predictions
+            one_hot = torch.zeros(labels.size(0), self.num_classes)
+            predicted = predicted.reshape(predicted.size(0))
+            one_hot[torch.arange(labels.size(0)), predicted.type(torch.long)] = 1
+            predicted = one_hot
+            predicted = predicted.to(self.device)
+
+        self.running_metrics.update(
+            labels.type(torch.int64), predicted.type(torch.int64), predicted_probs
+        )
+
+    def train_evaluation_loader(self, train_loader, samples=None):
+        """
+        Get the data loader used to evaluate the model against the train set
+
+        :param train_loader: Data loader for the train set
+        :type train_loader: torch.utils.data.DataLoader
+        :param samples: Size of a fixed random subsample of the train set, defaults to None (the whole train set)
+        :type samples: int, optional
+        :return: Data loader for the train set evaluation
+        :rtype: torch.utils.data.DataLoader
+        """
+        if not samples or samples >= len(train_loader.dataset):
+            return train_loader
+
+        # the loaders with a batch sampler, e.g. the length buckets of the crops datasets, have no batch size
+        batch_size = train_loader.batch_size
+        if batch_size is None:
+            batch_size = getattr(train_loader.batch_sampler, "batch_size", None)
+        if batch_size is None:
+            batch_size = train_loader.dataset.batch_size
+
+        indices = np.sort(
+            np.random.choice(len(train_loader.dataset), samples, replace=False)
+        )
+        return torch.utils.data.DataLoader(
+            torch.utils.data.Subset(train_loader.dataset, indices.tolist()),
+            batch_size=batch_size,
+            num_workers=train_loader.num_workers,
+            pin_memory=train_loader.pin_memory,
+            collate_fn=train_loader.collate_fn,
+        )
+
     def predict(
         self,
         dataset: BaseDataset = None,
@@ -416,15 +563,36 @@ class BaseModel(nn.Module, Configurable):
         y_pred_probs = []
 
         # predict
+        for labels, predicted, predicted_probs in self.predict_batches(
+            dataset, description
+        ):
+            y_pred_probs += list(predicted_probs)
+            y_pred += list(predicted)
+            y_true += list(labels)
+
+        return y_true, y_pred, y_pred_probs
+
+    def predict_batches(
+        self,
+        dataset: BaseDataset = None,
+        description="running prediction",
+    ):
+        """
+        Predicts using a model against for a specified dataset, one batch at a time,
+        so the predictions don't have to be kept in memory
+
+        :return: generator of (y_true, y_pred, y_pred_probs) numpy arrays per batch
+        :rtype: generator
+        """
         for inputs, outputs, labels in self.predict_output_per_batch(
             dataset.dataloader(), description
         ):
             predicted_probs, predicted = self.get_predicted(outputs)
-            y_pred_probs += list(predicted_probs.cpu().detach().numpy())
-            y_pred += list(predicted.cpu().detach().numpy())
-            y_true += list(labels.cpu().detach().numpy())
-
-        return y_true, y_pred, y_pred_probs
+            yield (
+                labels.cpu().detach().numpy(),
+                predicted.cpu().detach().numpy(),
+                predicted_probs.cpu().detach().numpy(),
+            )
 
     def predict_image(
         self,
@@ -606,15 +774,20 @@ class BaseModel(nn.Module, Configurable):
         with torch.no_grad():
             for i, data in enumerate(tqdm(dataloader, desc=description)):
                 inputs, labels = data
-                inputs = inputs.to(self.device)
+                inputs = self.inputs_to_device(inputs)
                 labels = labels.to(self.device)
 
-                outputs = self(inputs)
+                with self.autocast():
+                    outputs = self(inputs)
 
                 # check if outputs is OrderedDict for segmentation
                 if isinstance(outputs, collections.abc.Mapping):
                     outputs = outputs["out"]
 
+                # metrics and losses are computed in full precision
+                if self.autocast_dtype:
+                    outputs = outputs.float()
+
                 yield inputs, outputs, labels
 
     def forward(self, *input, **kwargs):
@@ -658,6 +831,8 @@ class BaseModel(nn.Module, Configurable):
         :rtype: nn.Module
         """
         self.model = self.model.to(self.device)
+        if self.channels_last:
+            self.model = self.model.to(memory_format=torch.channels_last)
         if self.criterion:
             self.criterion = self.criterion.to(self.device)
         if self.config.use_ddp:
@@ -666,6 +841,38 @@ class BaseModel(nn.Module, Configurable):
             )
         return self.model
 
+    def inputs_to_device(self, inputs):
+        """
+        Move a batch of inputs to the device, using the channels-last memory format for 4D inputs if configured
+
+        :param inputs: Batch of inputs, or a tuple of tensors such as (time series, mask)
+        :type inputs: torch.Tensor or tuple
+        :return: The inputs on the device
+        :rtype: torch.Tensor or tuple
+        """
+        if isinstance(inputs, tuple):
+            return tuple(self.inputs_to_device(x) for x in inputs)
+        if self.channels_last and inputs.dim() == 4:
+            return inputs.to(self.device, memory_format=torch.channels_last)
+        return inputs.to(self.device)
+
+    def autocast(self):
+        """
+        Context manager running the forward pass in the configured mixed precision
+
+        :return: An autocast context if mixed precision is enabled, otherwise a no-op context
+        """
+        if not self.autocast_dtype:
+            return contextlib.nullcontext()
+        return torch.autocast(device_type=self.device.type, dtype=self.autocast_dtype)
+
+    def load_grad_scaler(self):
+        """Load the gradient scaler, enabled only for fp16 training on CUDA"""
+        enabled = self.autocast_dtype == torch.float16
+        if hasattr(torch.amp, "GradScaler"):
+            return torch.amp.GradScaler(self.device.type, enabled=enabled)
+        return torch.cuda.amp.GradScaler(enabled=enabled)
+
     def save_model(self, model_directory, epoch, optimizer, loss, start, run_id):
         """
         Saves the model on disk
@@ -687,21 +894,21 @@ class BaseModel(nn.Module, Configurable):
             model_directory, run_id, f"checkpoint_{timestamp}.pth.tar"
         )
 
-        # create timestamped checkpoint
-        torch.save(
-            {
-                "epoch": epoch + 1,
-                "state_dict": self.model.state_dict(),
-                "optimizer": optimizer.state_dict(),
-                "loss": loss,
-                "start": start,
-                "id": run_id,
-            },
-            checkpoint,
-        )
-
-        # replace last checkpoint
-        copyfile(checkpoint, os.path.join(model_directory, "checkpoint.pth.tar"))
+        state = {
+            "epoch": epoch + 1,
+            "state_dict": state_dict_to_cpu(self.model.state_dict()),
+            "optimizer": state_dict_to_cpu(optimizer.state_dict()),
+            "loss": loss,
+            "start": start,
+            "id": run_id,
+        }
+
+        # create timestamped checkpoint and link it as the last checkpoint
+        last_checkpoint = os.path.join(model_directory, "checkpoint.pth.tar")
+        if self.checkpoint_writer:
+            self.checkpoint_writer.write(state, checkpoint, link=last_checkpoint)
+        else:
+            write_checkpoint(state, checkpoint, link=last_checkpoint)
 
     def extract_features(self, *input, **kwargs):
         """
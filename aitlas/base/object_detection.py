@@ -21,6 +21,7 @@ class BaseObjectDetection(BaseModel):
 
     schema = BaseObjectDetectionSchema
     log_loss = True
+    collect_train_metrics = False  # the detections are not computed in train mode
 
     def __init__(self, config):
         super().__init__(config)
@@ -84,8 +85,10 @@ class BaseObjectDetection(BaseModel):
         start = current_ts()
         running_loss = 0.0
         total_loss = 0.0
+        accumulation_steps = self.config.accumulation_steps
 
         self.model.train()
+        self.zero_grad_optimizers(optimizer)
         for i, data in enumerate(tqdm(dataloader, desc="training")):
             inputs, targets = data
 
@@ -94,28 +97,27 @@ class BaseObjectDetection(BaseModel):
             )
             targets = [{k: v.to(self.device) for k, v in t.items()} for t in targets]
 
-            # zero the parameter gradients
-            if isinstance(optimizer, tuple):
-                for opt in optimizer:
-                    opt.zero_grad()
-            else:
-                optimizer.zero_grad()
-
-            # forward + backward + optimize
-            outputs = self(inputs, targets)
-            loss = sum(loss for loss in outputs.values())
-            loss.backward()
-
-            # perform a single optimization step
-            if isinstance(optimizer, tuple):
-                for opt in optimizer:
-                    opt.step()
-            else:
-                optimizer.step()
+            # forward + backward, in micro-batches if the batch is too large
+            batch_loss = 0.0
+            for micro_inputs, micro_targets in self.split_micro_batches(
+                inputs, targets
+            ):
+                with self.autocast():
+                    outputs = self(micro_inputs, micro_targets)
+                    loss = sum(loss for loss in outputs.values())
+
+                # weight the loss by the micro-batch share and the accumulation steps
+                weight = len(micro_inputs) / len(inputs)
+                self.grad_scaler.scale(loss * weight / accumulation_steps).backward()
+                batch_loss += loss.item() * weight
+
+            # perform an optimization step once enough gradients are accumulated
+            if (i + 1) % accumulation_steps == 0 or i + 1 == len(dataloader):
+                self.step_optimizers(optimizer)
 
             # log statistics
-            running_loss += loss.item() * len(inputs)
-            total_loss += loss.item() * len(inputs)
+            running_loss += batch_loss * len(inputs)
+            total_loss += batch_loss * len(inputs)
 
             if (
                 i % iterations_log == iterations_log - 1
@@ -155,7 +157,18 @@ class BaseObjectDetection(BaseModel):
                     {k: v.to(self.device) for k, v in t.items()} for t in targets
                 ]
 
-                outputs = self(inputs, targets)
+                with self.autocast():
+                    outputs = self(inputs, targets)
+
+                # boxes and scores are evaluated in full precision
+                if self.autocast_dtype:
+                    outputs = [
+                        {
+                            k: v.float() if v.is_floating_point() else v
+                            for k, v in output.items()
+                        }
+                        for output in outputs
+                    ]
 
                 yield inputs, outputs, targets
 
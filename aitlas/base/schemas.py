@@ -27,6 +27,9 @@ class BaseDatasetSchema(Schema):
     :param joint_transforms: Classes to run transformations over the input and target data.
     :type joint_transforms: List[str], optional
 
+    :param batch_transforms: Classes to run transformations over whole batches of inputs, after collation.
+    :type batch_transforms: List[str], optional
+
     :param labels: Labels for the dataset.
     :type labels: List[str], optional
     """
@@ -54,6 +57,15 @@ class BaseDatasetSchema(Schema):
         missing=None,
         description="Classes to run transformations over the input and target data.",
     )
+    batch_transforms = fields.List(
+        fields.String,
+        missing=None,
+        description="Classes to run transformations over whole batches of inputs, after collation.",
+        example=[
+            "aitlas.transforms.BatchChannelsFirst",
+            "aitlas.transforms.BatchToFloat",
+        ],
+    )
     labels = fields.List(
         fields.String,
         missing=None,
@@ -82,6 +94,22 @@ class BaseModelSchema(Schema):
 
     :param use_ddp: Flag indicating whether to turn on distributed data processing. Default is False.
     :type use_ddp: bool, optional
+
+    :param mixed_precision: Precision used for autocast during training and inference, one of ['bf16', 'fp16'].
+        On CPU 'fp16' falls back to 'bf16'. Default is None (full precision).
+    :type mixed_precision: str, optional
+
+    :param channels_last: Flag indicating whether to use the channels-last memory format for the model and
+        the 4D inputs. Default is False.
+    :type channels_last: bool, optional
+
+    :param accumulation_steps: Number of batches over which gradients are accumulated before an optimizer step.
+        Default is 1.
+    :type accumulation_steps: int, optional
+
+    :param micro_batch_size: Maximum number of samples in a single forward/backward pass. Larger batches are
+        split into micro-batches. Default is None (no splitting).
+    :type micro_batch_size: int, optional
     """
 
     num_classes = fields.Int(missing=2, description="Number of classes", example=2)
@@ -105,6 +133,30 @@ class BaseModelSchema(Schema):
     use_ddp = fields.Boolean(
         required=False, missing=False, description="Turn on distributed data processing"
     )
+    mixed_precision = fields.String(
+        missing=None,
+        allow_none=True,
+        description="Precision used for autocast during training and inference",
+        example="bf16",
+        validate=validate.OneOf(["bf16", "fp16"]),
+    )
+    channels_last = fields.Bool(
+        missing=False,
+        description="Whether to use the channels-last memory format for the model and inputs",
+    )
+    accumulation_steps = fields.Int(
+        missing=1,
+        description="Number of batches to accumulate gradients over before an optimizer step",
+        example=4,
+        validate=validate.Range(min=1),
+    )
+    micro_batch_size = fields.Int(
+        missing=None,
+        allow_none=True,
+        description="Maximum number of samples in a single forward/backward pass",
+        example=16,
+        validate=validate.Range(min=1),
+    )
 
 
 class BaseClassifierSchema(BaseModelSchema):
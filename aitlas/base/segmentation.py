@@ -1,9 +1,10 @@
 import logging
 
+import numpy as np
 import torch
 import torch.optim as optim
 
-from ..utils import DiceLoss
+from ..utils import DiceLoss, TileBlender, tile_starts, window_weights
 from .metrics import SegmentationRunningScore
 from .models import BaseModel
 from .schemas import BaseSegmentationClassifierSchema
@@ -39,6 +40,89 @@ class BaseSegmentationClassifier(BaseModel):
         ).long()
         return predicted_probs, predicted
 
+    def predict_tiled(
+        self,
+        reader,
+        transform=None,
+        tile_size=512,
+        overlap=128,
+        batch_size=8,
+        blending="gaussian",
+        description="running tiled prediction",
+    ):
+        """
+        Predicts a large image with a sliding window. The windows are batched across the image and
+        the overlapping predictions are blended. The image is read one strip of windows at a time and
+        the probabilities are returned in strips of rows, as soon as no more windows cover them.
+
+        :param reader: reader of the image windows
+        :type reader: aitlas.utils.SceneReader
+        :param transform: transformation applied to each window, defaults to None
+        :type transform: callable, optional
+        :param tile_size: size of the windows, defaults to 512
+        :type tile_size: int, optional
+        :param overlap: overlap between neighbouring windows in pixels, defaults to 128
+        :type overlap: int, optional
+        :param batch_size: number of windows per batch, defaults to 8
+        :type batch_size: int, optional
+        :param blending: weights of the window pixels, 'gaussian' or 'uniform', defaults to 'gaussian'
+        :type blending: str, optional
+        :return: generator of (first row, probabilities of shape (num_classes, rows, width))
+        :rtype: generator
+        """
+        if not 0 <= overlap < tile_size:
+            raise ValueError("The overlap should be smaller than the tile size")
+
+        stride = tile_size - overlap
+        windows = [
+            (y, x)
+            for y in tile_starts(reader.height, tile_size, stride)
+            for x in tile_starts(reader.width, tile_size, stride)
+        ]
+        blender = TileBlender(
+            self.num_classes, reader.width, window_weights(tile_size, blending)
+        )
+
+        def batches():
+            strip_y, strip = None, None
+            for start in range(0, len(windows), batch_size):
+                tiles = []
+                for y, x in windows[start : start + batch_size]:
+                    if y != strip_y:
+                        strip_y = y
+                        strip = reader.read(
+                            y, 0, min(tile_size, reader.height - y), reader.width
+                        )
+                    tile = np.ascontiguousarray(strip[:, x : x + tile_size])
+                    # windows are padded only when the image is smaller than a window
+                    padding = [
+                        (0, tile_size - tile.shape[0]),
+                        (0, tile_size - tile.shape[1]),
+                    ] + [(0, 0)] * (tile.ndim - 2)
+                    if tile.shape[:2] != (tile_size, tile_size):
+                        tile = np.pad(tile, padding)
+                    tiles.append(
+                        transform(tile) if transform else torch.from_numpy(tile)
+                    )
+                yield torch.stack(tiles), torch.zeros(len(tiles))
+
+        start = 0
+        for _, outputs, _ in self.predict_output_per_batch(batches(), description):
+            probs, _ = self.get_predicted(outputs)
+            probs = probs.cpu().numpy()
+            for (y, x), window_probs in zip(windows[start : start + len(probs)], probs):
+                blender.add(
+                    y,
+                    x,
+                    window_probs[:, : reader.height - y, : reader.width - x],
+                )
+            start += len(probs)
+
+            # the rows above the next window are final
+            row = windows[start][0] if start < len(windows) else reader.height
+            if row > blender.top:
+                yield blender.pop(row)
+
     def load_optimizer(self):
         """Load the optimizer"""
         return optim.Adam(params=self.model.parameters(), lr=self.config.learning_rate)
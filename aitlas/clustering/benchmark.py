@@ -0,0 +1,79 @@
+"""
+Benchmark of the k-NN graph backends of PIC, recall and time against the exact flat index.
+
+The data are synthetic, L2-normalized clustered features like the output of `preprocess_features`.
+Run it with
+
+    python -m aitlas.clustering.benchmark [--n 100000] [--dim 256] [--nnn 5] [--backends flat ivf hnsw numpy]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from .utils import make_graph
+
+
+def synthetic_features(n, dim, clusters=100, seed=0):
+    """L2-normalized features drawn around `clusters` random centers"""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((clusters, dim), dtype=np.float32)
+    x = centers[rng.integers(0, clusters, n)]
+    x += rng.standard_normal((n, dim), dtype=np.float32)
+    x /= np.linalg.norm(x, axis=1, keepdims=True)
+    return x
+
+
+def recall(I, exact_I):
+    """Fraction of the exact nearest neighbors which are found, excluding the points themselves"""
+    found = [len(np.intersect1d(a, b)) for a, b in zip(I[:, 1:], exact_I[:, 1:])]
+    return np.sum(found) / exact_I[:, 1:].size
+
+
+def benchmark(xb, nnn, backend, **options):
+    """
+    Builds the k-NN graph with a backend
+
+    :return: tuple of (ids of the neighbors, seconds)
+    :rtype: tuple
+    """
+    start = time.perf_counter()
+    I, _ = make_graph(xb, nnn, backend, **options)
+    return I, time.perf_counter() - start
+
+
+def main(n=100000, dim=256, nnn=5, backends=None):
+    backends = backends or ["ivf", "hnsw", "numpy"]
+    xb = synthetic_features(n, dim)
+
+    exact_I, exact_time = benchmark(xb, nnn, "flat")
+    print(f"{'backend':<8}  {'seconds':>8}  {'recall':>7}")
+    print(f"{'flat':<8}  {exact_time:>8.2f}  {1.0:>7.4f}")
+    for backend in backends:
+        if backend == "flat":
+            continue
+        try:
+            I, seconds = benchmark(xb, nnn, backend)
+            print(f"{backend:<8}  {seconds:>8.2f}  {recall(I, exact_I):>7.4f}")
+        except Exception as e:
+            print(f"{backend:<8}  failed: {type(e).__name__}: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reports the time and the recall of the k-NN graph backends against the exact flat index."
+    )
+    parser.add_argument("--n", type=int, default=100000, help="Number of features.")
+    parser.add_argument(
+        "--dim", type=int, default=256, help="Dimension of the features."
+    )
+    parser.add_argument(
+        "--nnn", type=int, default=5, help="Number of nearest neighbors."
+    )
+    parser.add_argument(
+        "--backends", nargs="*", help="Backends compared to 'flat', all by default."
+    )
+    args = parser.parse_args()
+
+    main(n=args.n, dim=args.dim, nnn=args.nnn, backends=args.backends)
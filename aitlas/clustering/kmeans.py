@@ -1,9 +1,15 @@
 import logging
 import time
 
+import numpy as np
 from PIL import ImageFile
 
-from .utils import preprocess_features, run_kmeans
+from .utils import (
+    cluster_index_arrays,
+    preprocess_features,
+    run_kmeans,
+    run_minibatch_kmeans,
+)
 
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
@@ -13,8 +19,44 @@ ImageFile.LOAD_TRUNCATED_IMAGES = True
 
 
 class Kmeans:
-    def __init__(self, k):
+    """k-means clustering of PCA-reduced, whitened and L2-normalized features.
+
+    :param k: number of clusters
+    :type k: int
+    :param pca_sample: number of features the PCA is fitted on, all by default, see `preprocess_features`
+    :type pca_sample: int
+    :param mode: 'faiss' trains faiss k-means from scratch, 'minibatch' runs mini-batch k-means
+                 warm-started from the clusters of the previous call
+    :type mode: str
+    :param batch_size: number of features per mini-batch
+    :type batch_size: int
+    :param iterations: number of mini-batches
+    :type iterations: int
+    :param seed: seed of the first mini-batch k-means run, the following runs use the next seeds
+    :type seed: int
+    :param assignments: cluster of each feature
+    :type assignments: np.array (N)
+    :param cluster_indexes: features sorted by cluster, the features of cluster c are
+                            `cluster_indexes[cluster_offsets[c]:cluster_offsets[c + 1]]`
+    :type cluster_indexes: np.array (N)
+    :param cluster_offsets: offsets of the clusters in `cluster_indexes`
+    :type cluster_offsets: np.array (k + 1)
+    :param images_lists: for each cluster, the array of features belonging to this cluster
+    :type images_lists: list of arrays of ints
+    """
+
+    def __init__(
+        self, k, pca_sample=None, mode="faiss", batch_size=10000, iterations=100, seed=0
+    ):
         self.k = k
+        self.pca_sample = pca_sample
+        self.mode = mode
+        self.batch_size = batch_size
+        self.iterations = iterations
+        self.seed = seed
+        # number of runs so far, each run draws other initial centroids and batches
+        self.runs = 0
+        self.assignments = None
 
     def cluster(self, data, verbose=False):
         """Performs k-means clustering.
@@ -25,13 +67,31 @@ class Kmeans:
         start = time.time()
 
         # PCA-reducing, whitening and L2-normalization
-        xb = preprocess_features(data)
+        xb = preprocess_features(data, sample_size=self.pca_sample)
 
         # cluster the data
-        I, loss = run_kmeans(xb, self.k, verbose)
-        self.images_lists = [[] for i in range(self.k)]
-        for i in range(len(data)):
-            self.images_lists[I[i]].append(i)
+        if self.mode == "minibatch":
+            # warm start from the previous clusters of the same data
+            init_labels = self.assignments
+            if init_labels is not None and len(init_labels) != len(xb):
+                init_labels = None
+            I, loss = run_minibatch_kmeans(
+                xb,
+                self.k,
+                init_labels,
+                self.batch_size,
+                self.iterations,
+                seed=self.seed + self.runs,
+            )
+            self.runs += 1
+        else:
+            I, loss = run_kmeans(xb, self.k, verbose)
+
+        self.assignments = np.asarray(I, dtype=np.int32)
+        self.cluster_indexes, self.cluster_offsets = cluster_index_arrays(
+            self.assignments, self.k
+        )
+        self.images_lists = np.split(self.cluster_indexes, self.cluster_offsets[1:-1])
 
         if verbose:
             logging.info("k-means time: {0:.0f} s".format(time.time() - start))
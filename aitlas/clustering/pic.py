@@ -1,7 +1,9 @@
 import logging
 import time
 
-from .utils import make_graph, preprocess_features, run_pic
+import numpy as np
+
+from .utils import cluster_index_arrays, make_graph, preprocess_features, run_pic
 
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
@@ -18,56 +20,79 @@ class PIC:
     :type alpha: float
     :param distribute_singletons: If True, reassign each singleton to the cluster of its closest nonsingleton nearest neighbors (up to nnn nearest neighbors).
     :type distribute_singletons: bool
-    :param images_lists: for each cluster, the list of image indexes belonging to this cluster
-    :type images_lists: list of lists of ints
+    :param knn_backend: k-NN search used to build the graph, see `make_graph` (default 'auto')
+    :type knn_backend: str
+    :param knn_options: options of the k-NN search, e.g. {"nprobe": 32} for 'ivf'
+    :type knn_options: dict
+    :param max_iter: maximum number of power iterations (default 200)
+    :type max_iter: int
+    :param tol: tolerance of the change of the power iterations to stop early, see `run_pic` (default 0)
+    :type tol: float
+    :param pca_sample: number of features the PCA is fitted on, all by default, see `preprocess_features`
+    :type pca_sample: int
+    :param assignments: cluster of each image, see also `Kmeans`
+    :type assignments: np.array (N)
+    :param cluster_indexes: images sorted by cluster
+    :type cluster_indexes: np.array (N)
+    :param cluster_offsets: offsets of the clusters in `cluster_indexes`
+    :type cluster_offsets: np.array
+    :param images_lists: for each cluster, the array of image indexes belonging to this cluster
+    :type images_lists: list of arrays of ints
     """
 
     def __init__(
-        self, args=None, sigma=0.2, nnn=5, alpha=0.001, distribute_singletons=True
+        self,
+        args=None,
+        sigma=0.2,
+        nnn=5,
+        alpha=0.001,
+        distribute_singletons=True,
+        knn_backend="auto",
+        knn_options=None,
+        max_iter=200,
+        tol=0.0,
+        pca_sample=None,
     ):
         self.sigma = sigma
         self.alpha = alpha
         self.nnn = nnn
         self.distribute_singletons = distribute_singletons
+        self.knn_backend = knn_backend
+        self.knn_options = knn_options or {}
+        self.max_iter = max_iter
+        self.tol = tol
+        self.pca_sample = pca_sample
 
     def cluster(self, data, verbose=False):
         start = time.time()
 
         # preprocess the data
-        xb = preprocess_features(data)
+        xb = preprocess_features(data, sample_size=self.pca_sample)
 
         # construct nnn graph
-        I, D = make_graph(xb, self.nnn)
+        I, D = make_graph(xb, self.nnn, self.knn_backend, **self.knn_options)
 
         # run PIC
-        clust = run_pic(I, D, self.sigma, self.alpha)
-        images_lists = {}
-        for h in set(clust):
-            images_lists[h] = []
-        for data, c in enumerate(clust):
-            images_lists[c].append(data)
+        clust = run_pic(I, D, self.sigma, self.alpha, self.max_iter, self.tol)
 
         # allocate singletons to clusters of their closest NN not singleton
         if self.distribute_singletons:
-            clust_NN = {}
-            for i in images_lists:
-                # if singleton
-                if len(images_lists[i]) == 1:
-                    s = images_lists[i][0]
-                    # for NN
-                    for n in I[s, 1:]:
-                        # if NN is not a singleton
-                        if not len(images_lists[clust[n]]) == 1:
-                            clust_NN[s] = n
-                            break
-            for s in clust_NN:
-                del images_lists[clust[s]]
-                clust[s] = clust[clust_NN[s]]
-                images_lists[clust[s]].append(s)
-
-        self.images_lists = []
-        for c in images_lists:
-            self.images_lists.append(images_lists[c])
+            sizes = np.bincount(clust)
+            singletons = np.flatnonzero(sizes[clust] == 1)
+            neighbors = I[singletons, 1:]
+            # the singletons are reassigned at once, the clusters of their targets do not change
+            valid = (neighbors >= 0) & (sizes[clust[np.maximum(neighbors, 0)]] > 1)
+            found = valid.any(axis=1)
+            targets = neighbors[found, valid[found].argmax(axis=1)]
+            clust[singletons[found]] = clust[targets]
+
+        # the images of each cluster, with the clusters numbered consecutively
+        _, clust = np.unique(clust, return_inverse=True)
+        self.assignments = clust.astype(np.int32)
+        self.cluster_indexes, self.cluster_offsets = cluster_index_arrays(
+            self.assignments, clust.max() + 1 if len(clust) else 0
+        )
+        self.images_lists = np.split(self.cluster_indexes, self.cluster_offsets[1:-1])
 
         if verbose:
             logging.info("pic time: {0:.0f} s".format(time.time() - start))
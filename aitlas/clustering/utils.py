@@ -1,7 +1,6 @@
 import logging
 import time
 
-import faiss
 import numpy as np
 import torch
 import torch.utils.data as data
@@ -11,64 +10,265 @@ from scipy.sparse import csr_matrix
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
 
-def preprocess_features(npdata, pca=256):
+# number of memory-mapped features the PCA is fitted on by default, so they are not all read into RAM
+MEMMAP_PCA_SAMPLE_SIZE = 100000
+
+
+def pca_whitening(sample, pca):
+    """Fits a PCA-whitening in numpy, like `faiss.PCAMatrix` with an eigen power of -0.5
+
+    :param sample: features the PCA is fitted on
+    :type sample: np.array (n * dim)
+    :param pca: dim of output
+    :type pca: int
+    :return: mean of the features and projection of the centered features
+    :rtype: tuple of (np.array (dim), np.array (dim * pca))
+    """
+    if pca > sample.shape[1]:
+        raise ValueError(f"PCA cannot output {pca} dimensions from {sample.shape[1]}")
+    sample = np.asarray(sample, dtype=np.float64)
+    mean = sample.mean(axis=0)
+    eigenvalues, eigenvectors = np.linalg.eigh(np.cov(sample, rowvar=False, bias=True))
+    components = np.argsort(eigenvalues)[::-1][:pca]
+    projection = eigenvectors[:, components] / np.sqrt(eigenvalues[components])
+    return mean.astype("float32"), projection.astype("float32")
+
+
+def preprocess_features(npdata, pca=256, sample_size=None, block_size=65536):
     """Preprocess an array of features.
 
+    The PCA is fitted on a random sample of the features and applied block by block, so the
+    features can be a memory-mapped array larger than RAM. It is fitted with faiss if it is
+    installed, in numpy otherwise.
+
     :param npdata: features to preprocess
     :type npdata: np.array (N * dim)
     :param pca: dim of output
     :type pca: int
+    :param sample_size: number of features the PCA is fitted on, all by default, or at most
+                        `MEMMAP_PCA_SAMPLE_SIZE` of memory-mapped features
+    :type sample_size: int
+    :param block_size: number of features transformed at once
+    :type block_size: int
     :return: data PCA-reduced, whitened and L2-normalized
     :rtype: np.array (N * pca)
     """
-    _, ndim = npdata.shape
-    npdata = npdata.astype("float32")
+    n, ndim = npdata.shape
+    if not sample_size and isinstance(npdata, np.memmap):
+        sample_size = MEMMAP_PCA_SAMPLE_SIZE
+    if sample_size and sample_size < n:
+        rows = np.sort(np.random.RandomState(0).choice(n, sample_size, replace=False))
+        sample = npdata[rows]
+    else:
+        sample = npdata
+    sample = np.ascontiguousarray(sample, dtype="float32")
 
     # Apply PCA-whitening with Faiss
-    mat = faiss.PCAMatrix(ndim, pca, eigen_power=-0.5)
-    mat.train(npdata)
-    assert mat.is_trained
-    npdata = mat.apply_py(npdata)
+    try:
+        import faiss
+    except ImportError:
+        faiss = None
+    if faiss:
+        mat = faiss.PCAMatrix(ndim, pca, -0.5)  # eigen_power
+        mat.train(sample)
+        assert mat.is_trained
+        transform = mat.apply_py
+    else:
+        mean, projection = pca_whitening(sample, pca)
+
+        def transform(block):
+            return (block - mean) @ projection
+
+    reduced = np.empty((n, pca), dtype="float32")
+    for start in range(0, n, block_size):
+        block = transform(
+            np.ascontiguousarray(npdata[start : start + block_size], dtype="float32")
+        )
+        # L2 normalization
+        block /= np.linalg.norm(block, axis=1)[:, np.newaxis]
+        reduced[start : start + len(block)] = block
+
+    return reduced
+
+
+def knn_gpu(xb, k):
+    """Exact k-NN search with a flat L2 index on the last GPU"""
+    import faiss
+
+    N, dim = xb.shape
+
+    # we need only a StandardGpuResources per GPU
+    res = faiss.StandardGpuResources()
+
+    # L2
+    flat_config = faiss.GpuIndexFlatConfig()
+    flat_config.device = int(torch.cuda.device_count()) - 1
+    index = faiss.GpuIndexFlatL2(res, dim, flat_config)
+    index.add(xb)
+    D, I = index.search(xb, k)
+    return I, D
+
+
+def knn_flat(xb, k):
+    """Exact k-NN search with a flat L2 index on the CPU"""
+    import faiss
+
+    index = faiss.IndexFlatL2(xb.shape[1])
+    index.add(xb)
+    D, I = index.search(xb, k)
+    return I, D
+
+
+def knn_ivf(xb, k, nlist=None, nprobe=16, train_size=None):
+    """Approximate k-NN search with an inverted file index, searching the `nprobe` closest of `nlist` lists
+
+    :param nlist: number of lists, about 4 * sqrt(N) by default
+    :type nlist: int, optional
+    :param nprobe: number of lists searched per query
+    :type nprobe: int, optional
+    :param train_size: number of samples the lists are trained on, 64 per list by default
+    :type train_size: int, optional
+    """
+    import faiss
+
+    N, dim = xb.shape
+    nlist = nlist or max(1, min(N // 39, int(4 * np.sqrt(N))))
+    quantizer = faiss.IndexFlatL2(dim)
+    index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_L2)
 
-    # L2 normalization
-    row_sums = np.linalg.norm(npdata, axis=1)
-    npdata = npdata / row_sums[:, np.newaxis]
+    train_size = min(N, train_size or 64 * nlist)
+    sample = np.random.RandomState(0).choice(N, train_size, replace=False)
+    index.train(xb[np.sort(sample)])
+    index.add(xb)
+    index.nprobe = min(nprobe, nlist)
+    D, I = index.search(xb, k)
+    return I, D
+
+
+def knn_hnsw(xb, k, M=32, ef_construction=64, ef_search=128):
+    """Approximate k-NN search with a hierarchical navigable small world graph
+
+    :param M: number of neighbors of each node in the graph
+    :type M: int, optional
+    :param ef_construction: size of the candidate lists when building the graph
+    :type ef_construction: int, optional
+    :param ef_search: size of the candidate lists when searching
+    :type ef_search: int, optional
+    """
+    import faiss
 
-    return npdata
+    index = faiss.IndexHNSWFlat(xb.shape[1], M)
+    index.hnsw.efConstruction = ef_construction
+    index.add(xb)
+    index.hnsw.efSearch = max(ef_search, k)
+    D, I = index.search(xb, k)
+    return I, D
+
+
+def knn_numpy(xb, k, block_size=4096):
+    """Exact k-NN search in numpy, without faiss. The distances are computed between blocks of
+    `block_size` queries and `block_size` data points, keeping the k nearest found so far.
+
+    :param block_size: number of queries and of data points per block
+    :type block_size: int, optional
+    """
+    N = xb.shape[0]
+    k = min(k, N)
+    norms = np.einsum("ij,ij->i", xb, xb)
+    I = np.empty((N, k), dtype=np.int64)
+    D = np.empty((N, k), dtype=np.float32)
+
+    for q0 in range(0, N, block_size):
+        q1 = min(q0 + block_size, N)
+        best_D = np.full((q1 - q0, 0), np.inf, dtype=np.float32)
+        best_I = np.zeros((q1 - q0, 0), dtype=np.int64)
+        for d0 in range(0, N, block_size):
+            d1 = min(d0 + block_size, N)
+            # squared L2 distances ||q||^2 - 2 q.x + ||x||^2
+            dist = xb[q0:q1] @ xb[d0:d1].T
+            dist *= -2
+            dist += norms[q0:q1, None]
+            dist += norms[None, d0:d1]
+            np.maximum(dist, 0, out=dist)
+
+            # the k nearest of the block, merged with the k nearest so far
+            if dist.shape[1] > k:
+                keep = np.argpartition(dist, k - 1, axis=1)[:, :k]
+                block_D = np.take_along_axis(dist, keep, axis=1)
+                block_I = keep + d0
+            else:
+                block_D = dist
+                block_I = np.broadcast_to(np.arange(d0, d1), dist.shape)
+            cand_D = np.concatenate([best_D, block_D], axis=1)
+            cand_I = np.concatenate([best_I, block_I], axis=1)
+            if cand_D.shape[1] > k:
+                keep = np.argpartition(cand_D, k - 1, axis=1)[:, :k]
+                cand_D = np.take_along_axis(cand_D, keep, axis=1)
+                cand_I = np.take_along_axis(cand_I, keep, axis=1)
+            best_D, best_I = cand_D, cand_I
+
+        order = np.argsort(best_D, axis=1, kind="stable")
+        D[q0:q1] = np.take_along_axis(best_D, order, axis=1)
+        I[q0:q1] = np.take_along_axis(best_I, order, axis=1)
+    return I, D
+
+
+KNN_GRAPH_BACKENDS = {
+    "gpu": knn_gpu,
+    "flat": knn_flat,
+    "ivf": knn_ivf,
+    "hnsw": knn_hnsw,
+    "numpy": knn_numpy,
+}
+
+
+def default_knn_backend():
+    """
+    The exact GPU index if faiss has GPU support and a GPU is available, otherwise the exact CPU index,
+    or the numpy search if faiss is not installed
+    """
+    try:
+        import faiss
+    except ImportError:
+        return "numpy"
+    if hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0:
+        return "gpu"
+    return "flat"
 
 
-def make_graph(xb, nnn):
+def make_graph(xb, nnn, backend="auto", **options):
     """Builds a graph of nearest neighbors.
 
     :param xb: data
     :type xb: np.array (N * dim)
     :param nnn: number of nearest neighbors
     :type nnn: int
+    :param backend: k-NN search, one of `KNN_GRAPH_BACKENDS` or 'auto' for `default_knn_backend`:
+                    'gpu' and 'flat' are exact faiss indexes, 'ivf' and 'hnsw' approximate ones for large N,
+                    and 'numpy' an exact blocked search which does not need faiss
+    :type backend: str
+    :param options: options of the backend, e.g. `nprobe` for 'ivf' or `ef_search` for 'hnsw'
     :return: list for each data the list of ids to its nnn nearest neighbors
     :return: list for each data the list of distances to its nnn NN
     :rtype: np.array (N * nnn)
     """
-    N, dim = xb.shape
-
-    # we need only a StandardGpuResources per GPU
-    res = faiss.StandardGpuResources()
-
-    # L2
-    flat_config = faiss.GpuIndexFlatConfig()
-    flat_config.device = int(torch.cuda.device_count()) - 1
-    index = faiss.GpuIndexFlatL2(res, dim, flat_config)
-    index.add(xb)
-    D, I = index.search(xb, nnn + 1)
-    return I, D
+    if backend == "auto":
+        backend = default_knn_backend()
+    if backend not in KNN_GRAPH_BACKENDS:
+        raise ValueError(
+            f"Unknown k-NN graph backend {backend}, use one of {list(KNN_GRAPH_BACKENDS)}"
+        )
+    xb = np.ascontiguousarray(xb, dtype=np.float32)
+    return KNN_GRAPH_BACKENDS[backend](xb, nnn + 1, **options)
 
 
 class ReassignedDataset(data.Dataset):
     """A dataset where the new images labels are given in argument.
 
     :param image_indexes: list of data indexes
-    :type image_indexes: list of ints
+    :type image_indexes: array-like of ints
     :param pseudolabels: list of labels for each data
-    :type pseudolabels: list of ints
+    :type pseudolabels: array-like of ints
     :param dataset: initial dataset
     :type dataset: list of tuples with paths to images
     :param transform: a function/transform that takes in an PIL image and returns a transformed version
@@ -80,11 +280,12 @@ class ReassignedDataset(data.Dataset):
         self.dataset = dataset
 
     def make_dataset(self, image_indexes, pseudolabels):
-        label_to_idx = {label: idx for idx, label in enumerate(set(pseudolabels))}
-        pseudolabels = []
-        for j, idx in enumerate(image_indexes):
-            pseudolabels.append(label_to_idx[pseudolabels[j]])
-        return pseudolabels
+        """Returns the pseudolabel of each data, indexed by data, with the labels numbered consecutively"""
+        image_indexes = np.asarray(image_indexes, dtype=np.int64)
+        _, labels = np.unique(np.asarray(pseudolabels), return_inverse=True)
+        by_index = np.empty(len(image_indexes), dtype=np.int32)
+        by_index[image_indexes] = labels
+        return by_index
 
     def __getitem__(self, index):
         """
@@ -92,65 +293,223 @@ class ReassignedDataset(data.Dataset):
         :type index: int
         :return: tuple (image, pseudolabel) where pseudolabel is the cluster of index datapoint
         """
-        return self.dataset.__getitem__(index)[0], self.pseudolabels[index]
+        return self.dataset.__getitem__(index)[0], int(self.pseudolabels[index])
 
     def __len__(self):
         return len(self.pseudolabels)
 
 
+def flatten_clusters(images_lists):
+    """Concatenates the clusters.
+
+    :params images_lists: for each cluster, the image indexes belonging to this cluster
+    :type images_lists: list of arrays or lists of ints
+    :return: image indexes sorted by cluster, and the cluster of each of them
+    :rtype: tuple of (np.array (N), np.array (N))
+    """
+    sizes = [len(images) for images in images_lists]
+    if not sum(sizes):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int32)
+    image_indexes = np.concatenate(
+        [np.asarray(images, dtype=np.int64) for images in images_lists]
+    )
+    pseudolabels = np.repeat(np.arange(len(images_lists), dtype=np.int32), sizes)
+    return image_indexes, pseudolabels
+
+
 def cluster_assign(images_lists, dataset):
     """Creates a dataset from clustering, with clusters as labels.
 
-    :params images_lists: for each cluster, the list of image indexes belonging to this cluster
-    :type images_lists: list of lists of ints
+    :params images_lists: for each cluster, the image indexes belonging to this cluster
+    :type images_lists: list of arrays or lists of ints
     :params dataset: initial dataset
     :type dataset: list of tuples with paths to images
     :return: dataset with clusters as labels
     :rtype: ReassignedDataset(torch.utils.data.Dataset)
     """
     assert images_lists is not None
-    pseudolabels = []
-    image_indexes = []
-    for cluster, images in enumerate(images_lists):
-        image_indexes.extend(images)
-        pseudolabels.extend([cluster] * len(images))
-
+    image_indexes, pseudolabels = flatten_clusters(images_lists)
     return ReassignedDataset(image_indexes, pseudolabels, dataset)
 
 
 def run_kmeans(x, nmb_clusters, verbose=False):
-    """Runs kmeans on 1 GPU.
+    """Runs kmeans with faiss, on 1 GPU if faiss has GPU support.
     :param x: data
     :type x: np.array (N * dim)
     :param nmb_clusters: number of clusters
     :type nmb_clusters: int
-    :return: list of ids for each data to its nearest cluster
-    :rtype: list of ints
+    :return: ids for each data to its nearest cluster, and the loss
+    :rtype: tuple of (np.array (N), float)
     """
+    import faiss
+
     n_data, d = x.shape
 
     # faiss implementation of k-means
     clus = faiss.Kmeans(d, nmb_clusters)
-    index = faiss.IndexFlatL2(d)
 
     # perform the training
     clus.train(x)
     dists, I = clus.index.search(x, 1)
-    losses = faiss.vector_to_array(clus.obj)
+    losses = clus.obj
+    if not isinstance(losses, np.ndarray):  # older faiss versions
+        losses = faiss.vector_to_array(losses)
     if verbose:
         logging.info("k-means loss evolution: {0}".format(losses))
 
-    return [int(n[0]) for n in I], losses[-1]
+    labels = fill_empty_clusters(I[:, 0], dists[:, 0], nmb_clusters)
+    return labels, losses[-1]
+
+
+def assign_to_centroids(x, centroids, block_size=65536):
+    """Finds the nearest centroid of each data, block by block.
+
+    :return: ids of the nearest centroids and squared L2 distances to them
+    :rtype: tuple of np.array (N)
+    """
+    import faiss
+
+    index = faiss.IndexFlatL2(centroids.shape[1])
+    index.add(np.ascontiguousarray(centroids, dtype="float32"))
+
+    labels = np.empty(len(x), dtype=np.int64)
+    dists = np.empty(len(x), dtype=np.float32)
+    for start in range(0, len(x), block_size):
+        D, I = index.search(
+            np.ascontiguousarray(x[start : start + block_size], dtype="float32"), 1
+        )
+        labels[start : start + len(I)] = I[:, 0]
+        dists[start : start + len(D)] = D[:, 0]
+    return labels, dists
+
+
+def cluster_sums(x, labels, nmb_clusters):
+    """Sums and number of the data of each cluster, as one sparse product"""
+    n = len(labels)
+    membership = csr_matrix(
+        (np.ones(n, dtype=np.float32), (labels, np.arange(n))), shape=(nmb_clusters, n)
+    )
+    return np.asarray(membership @ x), np.bincount(labels, minlength=nmb_clusters)
+
+
+def fill_empty_clusters(labels, dists, nmb_clusters):
+    """Moves into each empty cluster the data farthest from its centroid, taken from
+    the clusters which keep at least one data.
+
+    :return: ids of the clusters, without empty clusters if there are enough data
+    :rtype: np.array (N)
+    """
+    sizes = np.bincount(labels, minlength=nmb_clusters)
+    empty = np.flatnonzero(sizes == 0)
+    if len(empty) == 0:
+        return labels
+
+    labels = labels.copy()
+    farthest = iter(np.argsort(-dists, kind="stable"))
+    for cluster in empty:
+        for i in farthest:
+            if sizes[labels[i]] > 1:
+                sizes[labels[i]] -= 1
+                labels[i] = cluster
+                sizes[cluster] = 1
+                break
+    return labels
+
+
+def run_minibatch_kmeans(
+    x, nmb_clusters, init_labels=None, batch_size=10000, iterations=100, seed=0
+):
+    """Runs mini-batch k-means (Sculley, Web-scale k-means clustering, 2010).
+
+    Each iteration assigns a random batch of data to the nearest centroids and moves each
+    centroid towards the mean of its batch data, with a learning rate decreasing with the
+    number of data it was assigned so far.
+
+    :param x: data
+    :type x: np.array (N * dim)
+    :param nmb_clusters: number of clusters
+    :type nmb_clusters: int
+    :param init_labels: clusters of the previous clustering of the same data, whose means are the
+                        initial centroids. Random data are the initial centroids otherwise.
+    :type init_labels: np.array (N), optional
+    :param batch_size: number of data per iteration
+    :type batch_size: int
+    :param iterations: number of iterations
+    :type iterations: int
+    :param seed: seed of the initial centroids and of the batches, to vary between calls on the same data
+    :type seed: int
+    :return: ids for each data to its nearest cluster, and the sum of the squared distances to the centroids
+    :rtype: tuple of (np.array (N), float)
+    """
+    rng = np.random.RandomState(seed)
+    n, d = x.shape
+    if n < nmb_clusters:
+        raise ValueError(
+            f"Mini-batch k-means needs at least as many data as clusters, got {n} data for {nmb_clusters} clusters"
+        )
+
+    centroids = np.array(
+        x[np.sort(rng.choice(n, nmb_clusters, replace=False))], dtype=np.float32
+    )
+    if init_labels is not None:
+        sums = np.zeros((nmb_clusters, d), dtype=np.float32)
+        sizes = np.zeros(nmb_clusters, dtype=np.int64)
+        for start in range(0, n, batch_size):
+            block_sums, block_sizes = cluster_sums(
+                x[start : start + batch_size],
+                init_labels[start : start + batch_size],
+                nmb_clusters,
+            )
+            sums += block_sums
+            sizes += block_sizes
+        # the empty clusters keep their random data
+        warm = sizes > 0
+        centroids[warm] = sums[warm] / sizes[warm, None]
+
+    counts = np.zeros(nmb_clusters, dtype=np.int64)
+    for _ in range(iterations):
+        batch = np.ascontiguousarray(
+            x[np.sort(rng.choice(n, min(batch_size, n), replace=False))],
+            dtype=np.float32,
+        )
+        labels, _ = assign_to_centroids(batch, centroids)
+        batch_sums, batch_sizes = cluster_sums(batch, labels, nmb_clusters)
+
+        # c <- c + (sum - m * c) / count, the running mean of the data assigned to c
+        counts += batch_sizes
+        hit = batch_sizes > 0
+        centroids[hit] += (
+            batch_sums[hit] - batch_sizes[hit, None] * centroids[hit]
+        ) / counts[hit, None]
+
+    labels, dists = assign_to_centroids(x, centroids)
+    labels = fill_empty_clusters(labels, dists, nmb_clusters)
+    return labels, float(dists.sum())
+
+
+def cluster_index_arrays(labels, nmb_clusters):
+    """Groups the data by cluster, in CSR style.
+
+    :param labels: cluster of each data
+    :type labels: np.array (N)
+    :param nmb_clusters: number of clusters
+    :type nmb_clusters: int
+    :return: ids of the data sorted by cluster, and offsets such that the data of cluster c
+             are `indexes[offsets[c]:offsets[c + 1]]`
+    :rtype: tuple of (np.array (N), np.array (nmb_clusters + 1))
+    """
+    indexes = np.argsort(labels, kind="stable")
+    offsets = np.zeros(nmb_clusters + 1, dtype=np.int64)
+    np.cumsum(np.bincount(labels, minlength=nmb_clusters), out=offsets[1:])
+    return indexes, offsets
 
 
 def arrange_clustering(images_lists):
-    pseudolabels = []
-    image_indexes = []
-    for cluster, images in enumerate(images_lists):
-        image_indexes.extend(images)
-        pseudolabels.extend([cluster] * len(images))
-    indexes = np.argsort(image_indexes)
-    return np.asarray(pseudolabels)[indexes]
+    """Returns the cluster of each image, indexed by image"""
+    image_indexes, pseudolabels = flatten_clusters(images_lists)
+    by_index = np.empty(len(image_indexes), dtype=np.int32)
+    by_index[image_indexes] = pseudolabels
+    return by_index
 
 
 def make_adjacencyW(I, D, sigma):
@@ -165,82 +524,90 @@ def make_adjacencyW(I, D, sigma):
     :return:  affinity matrix of the graph.
     :rtype: scipy.sparse.csr_matrix
     """
-    V, k = I.shape
-    k = k - 1
-    indices = np.reshape(np.delete(I, 0, 1), (1, -1))
-    indptr = np.multiply(k, np.arange(V + 1))
-
-    def exp_ker(d):
-        return np.exp(-d / sigma**2)
-
-    exp_ker = np.vectorize(exp_ker)
-    res_D = exp_ker(D)
-    data = np.reshape(np.delete(res_D, 0, 1), (1, -1))
-    adj_matrix = csr_matrix((data[0], indices[0], indptr), shape=(V, V))
+    V = I.shape[0]
+    indices = I[:, 1:]
+    # the kernel is applied to all the edges at once, missing neighbors (-1) are dropped
+    data = np.exp(-D[:, 1:] / sigma**2)
+    found = indices >= 0
+    indptr = np.zeros(V + 1, dtype=np.int64)
+    np.cumsum(found.sum(axis=1), out=indptr[1:])
+    adj_matrix = csr_matrix((data[found], indices[found], indptr), shape=(V, V))
     return adj_matrix
 
 
-def run_pic(I, D, sigma, alpha):
-    """Run PIC algorithm"""
+def run_pic(I, D, sigma, alpha, max_iter=200, tol=0.0):
+    """Run PIC algorithm
+
+    :param max_iter: maximum number of power iterations
+    :type max_iter: int
+    :param tol: the iterations stop when the L1 norm of the change of the L1-normalized vector is at most `tol`,
+                by default when it reaches a fixed point
+    :type tol: float
+    :return: cluster of each node
+    :rtype: numpy array
+    """
     a = make_adjacencyW(I, D, sigma)
     graph = a + a.transpose()
-    cgraph = graph
     nim = graph.shape[0]
 
     W = graph
-    t0 = time.time()
-
-    v0 = np.ones(nim) / nim
+    # the damping factor is folded into the transposed matrix, computed once
+    Wt = (alpha * W.transpose()).tocsr().astype("float32")
 
     # power iterations
-    v = v0.astype("float32")
-
-    t0 = time.time()
-    dt = 0
-    for i in range(200):
-        vnext = np.zeros(nim, dtype="float32")
-
-        vnext = vnext + W.transpose().dot(v)
-
-        vnext = alpha * vnext + (1 - alpha) / nim
+    v = np.full(nim, 1 / nim, dtype="float32")
+    teleport = np.float32((1 - alpha) / nim)
+    iterations, residual = 0, np.nan
+    while iterations < max_iter:
+        vnext = Wt.dot(v)
+        vnext += teleport
         # L1 normalize
         vnext /= vnext.sum()
+        residual = np.abs(vnext - v).sum()
         v = vnext
+        iterations += 1
+        if residual <= tol:
+            break
+    logging.info(f"PIC stopped after {iterations} iterations, residual {residual:.3g}")
 
-        if i == 200 - 1:
-            clust = find_maxima_cluster(W, v)
-
-    return [int(i) for i in clust]
+    return find_maxima_cluster(W, v)
 
 
 def find_maxima_cluster(W, v):
+    """
+    Clusters the nodes by following from each node the edge to its neighbor with the largest
+    weighted increase of `v`, up to a local maximum, which identifies the cluster.
+
+    :param W: symmetric affinity matrix of the graph
+    :type W: scipy.sparse.csr_matrix
+    :param v: result of the power iterations
+    :type v: numpy array
+    :return: cluster of each node, the clusters are numbered in the order of their maxima
+    :rtype: numpy array
+    """
     n, m = W.shape
     assert n == m
-    assign = np.zeros(n)
-    # for each node
-    pointers = list(range(n))
-    for i in range(n):
-        best_vi = 0
-        l0 = W.indptr[i]
-        l1 = W.indptr[i + 1]
-        for l in range(l0, l1):
-            j = W.indices[l]
-            vi = W.data[l] * (v[j] - v[i])
-            if vi > best_vi:
-                best_vi = vi
-                pointers[i] = j
-    n_clus = 0
-    cluster_ids = -1 * np.ones(n)
-    for i in range(n):
-        if pointers[i] == i:
-            cluster_ids[i] = n_clus
-            n_clus = n_clus + 1
-    for i in range(n):
-        # go from pointers to pointers starting from i until reached a local optim
-        current_node = i
-        while pointers[current_node] != current_node:
-            current_node = pointers[current_node]
-
-        assign[i] = cluster_ids[current_node]
-        assert assign[i] >= 0
-    return assign
+    rows = np.repeat(np.arange(n), np.diff(W.indptr))
+    score = W.data * (v[W.indices] - v[rows])
+
+    # for each node, the first neighbor with the largest positive score
+    row_max = np.zeros(n, dtype=score.dtype)
+    nonempty = np.diff(W.indptr) > 0
+    row_max[nonempty] = np.maximum.reduceat(score, W.indptr[:-1][nonempty])
+    candidates = np.flatnonzero((score > 0) & (score == row_max[rows]))
+    candidate_rows = rows[candidates]
+    first = np.ones(len(candidates), dtype=bool)
+    first[1:] = candidate_rows[1:] != candidate_rows[:-1]
+    pointers = np.arange(n)
+    pointers[candidate_rows[first]] = W.indices[candidates[first]]
+
+    # pointer jumping, each step halves the remaining path to the local maxima
+    while True:
+        jumped = pointers[pointers]
+        if np.array_equal(jumped, pointers):
+            break
+        pointers = jumped
+
+    roots = pointers == np.arange(n)
+    cluster_ids = np.cumsum(roots) - 1
+    return cluster_ids[pointers]
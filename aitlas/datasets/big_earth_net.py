@@ -17,7 +17,7 @@ from skimage.transform import resize
 from torch.utils.data import DataLoader, Dataset
 from ..base import BaseDataset
 from .schemas import BigEarthNetSchema
-from ..utils import tiff_loader
+from ..utils import decode_bands, tiff_loader
 
 LABELS = {
     "original_labels": {
@@ -109,6 +109,14 @@ LABELS = {
     },
 }
 
+# layout of the memory-mapped storage: shape per patch and dtype of each band group
+# bands10 are stored rescaled to uint8, in the order B04, B03, B02, B08 so that RGB is a contiguous slice
+MEMMAP_BANDS = {
+    "bands10": ((120, 120, 4), np.uint8),
+    "bands20": ((60, 60, 6), np.uint16),
+    "bands60": ((20, 20, 2), np.uint16),
+}
+
 DISPLAY_NAMES = {
     "Land principally occupied by agriculture, with significant areas of natural vegetation": "Agriculture and vegetation",
     "Annual crops associated with permanent crops": "Crops",
@@ -174,6 +182,11 @@ def dumps_pickle(obj):
     return pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)
 
 
+def rescale_bands10(bands10, scale=1 / 2000, channels=None):
+    """Rescale the 10m bands to uint8 the same way it is done when reading from LMDB"""
+    return decode_bands(bands10, scale, channels=channels)
+
+
 def cls2multihot(cls_vec, label_indices):
     label_conversion = label_indices["label_conversion"]
 
@@ -211,10 +224,13 @@ class BigEarthNetDataset(BaseDataset):
 
         self.data_dir = self.config.data_dir
         self.lmdb_path = self.config.lmdb_path
+        self.memmap_path = self.config.memmap_path
         self.version = self.config.version
         self.selection = self.config.selection
 
-        if self.lmdb_path and not self.config.import_to_lmdb:
+        if self.memmap_path and not self.config.import_to_memmap:
+            self.load_memmap_index()
+        elif self.lmdb_path and not self.config.import_to_lmdb:
             self.db = lmdb.open(
                 self.lmdb_path,
                 readonly=True,
@@ -230,14 +246,21 @@ class BigEarthNetDataset(BaseDataset):
 
         self.patches = self.load_patches()
 
+        if self.memmap_path and not self.config.import_to_memmap:
+            store_rows = {name: row for row, name in enumerate(self.store_patches)}
+            self.rows = np.array(
+                [store_rows[name] for name in self.patches], dtype=np.int64
+            )
+
     def __getitem__(self, index):
+        if self.memmap_path:
+            return self.get_memmap_item(index)
+
         patch_name = self.patches[index]
 
         with self.db.begin(write=False) as txn:
             byteflow = txn.get(patch_name.encode())
             bands10, bands20, _, multihots_19, multihots_43 = loads_pickle(byteflow)
-            bands10 = bands10 / 2000 * 255.0
-            bands10 = np.clip(bands10, 0, 255).astype(np.uint8)
 
             if self.version == "19 labels":
                 multihots = multihots_19.astype(np.float32)
@@ -245,8 +268,12 @@ class BigEarthNetDataset(BaseDataset):
                 multihots = multihots_43.astype(np.float32)
 
             if self.selection == "rgb":
-                # bands10 = bands10.astype(np.float32)[:, :, [2, 1, 0]]
-                bands10 = bands10[:, :, [2, 1, 0]]
+                bands10 = decode_bands(
+                    bands10,
+                    self.config.calibration_scale,
+                    channels=[2, 1, 0],
+                    to_float=self.config.decode_to_float,
+                )
                 if self.transform:
                     bands10 = self.transform(bands10)
                 if self.target_transform:
@@ -257,6 +284,7 @@ class BigEarthNetDataset(BaseDataset):
             elif self.selection == "all":
                 # TODO interpolate/merge bands10 and bands20
                 bands20 = interp_band(bands20)
+                bands10 = rescale_bands10(bands10, self.config.calibration_scale)
                 bands10 = bands10.astype(np.float32)
                 bands20 = bands20.astype(np.float32)
 
@@ -269,6 +297,67 @@ class BigEarthNetDataset(BaseDataset):
 
                 return bands10, bands20, multihots
 
+    def get_memmap_item(self, index):
+        """Read a patch from the memory-mapped storage. The RGB bands are a view of the shard."""
+        shard, offset = divmod(int(self.rows[index]), self.shard_size)
+        bands10 = self.memmap_shard("bands10", shard)[offset]
+
+        multihots = np.unpackbits(
+            self.multihots[self.rows[index]], count=len(self.labels)
+        ).astype(np.float32)
+        if self.target_transform:
+            multihots = self.target_transform(multihots)
+
+        if self.selection == "rgb":
+            if self.config.decode_to_float:
+                # the stored bands are already calibrated to uint8
+                bands10 = decode_bands(
+                    bands10, 1 / 255, channels=[0, 1, 2], to_float=True
+                )
+            else:
+                bands10 = bands10[:, :, :3]
+            if self.transform:
+                bands10 = self.transform(bands10)
+
+            return bands10, multihots
+
+        elif self.selection == "all":
+            # restore the original band order B02, B03, B04, B08
+            bands10 = bands10[:, :, [2, 1, 0, 3]].astype(np.float32)
+            bands20 = interp_band(self.memmap_shard("bands20", shard)[offset])
+
+            if self.transform:
+                bands10, bands20, bands60, multihots = self.transform(
+                    (bands10, bands20)
+                )
+
+            return bands10, bands20, multihots
+
+    def memmap_shard(self, name, shard):
+        """Returns a band group shard, mapped lazily so each worker opens its own maps"""
+        key = (name, shard)
+        if key not in self.shards:
+            self.shards[key] = np.load(
+                os.path.join(self.memmap_path, f"{name}_{shard:05d}.npy"),
+                mmap_mode="c",
+            )
+        return self.shards[key]
+
+    def load_memmap_index(self):
+        """Loads the index and the packed labels of the memory-mapped storage"""
+        with open(os.path.join(self.memmap_path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        self.shard_size = meta["shard_size"]
+
+        with open(os.path.join(self.memmap_path, "patches.csv"), "r") as f:
+            self.store_patches = [row[0] for row in csv.reader(f)]
+
+        labels_file = (
+            "labels_19.npy" if self.version == "19 labels" else "labels_43.npy"
+        )
+        self.multihots = np.load(os.path.join(self.memmap_path, labels_file))
+        self.shards = {}
+
     def __len__(self):
         return len(self.patches)
 
@@ -276,13 +365,15 @@ class BigEarthNetDataset(BaseDataset):
         return list(self.labels.keys())
 
     def load_patches(self):
-        if self.lmdb_path:
+        if self.lmdb_path or self.memmap_path:
             patch_names = []
             if self.config.csv_file:
                 with open(self.config.csv_file, "r") as f:
                     csv_reader = csv.reader(f)
                     for row in csv_reader:
                         patch_names.append(row[0])
+            elif self.memmap_path and not self.config.import_to_memmap:
+                patch_names = list(self.store_patches)
             return patch_names
 
     def get_item_name(self, index):
@@ -414,7 +505,99 @@ class BigEarthNetDataset(BaseDataset):
 
     def prepare(self):
         super().prepare()
-        self.process_to_lmdb()
+        if self.memmap_path:
+            if self.config.import_to_memmap:
+                self.process_to_memmap()
+        else:
+            self.process_to_lmdb()
+
+    def process_to_memmap(self):
+        """Converts the patches to a sharded store of fixed-dtype, memory-mapped band arrays.
+
+        The store contains one `.npy` file per band group and shard, the bit-packed 19 and 43 label matrices,
+        the patch names in storage order (`patches.csv`) and `meta.json`. The patches are read in batches by
+        `num_workers` processes.
+        """
+        patches = []
+        dir = os.path.expanduser(self.data_dir)
+        if os.path.isdir(dir):
+            patches = sorted(os.listdir(dir))
+
+        os.makedirs(self.memmap_path, exist_ok=True)
+        shard_size = self.config.shard_size
+        count = len(patches)
+
+        # preallocate the shards and the label matrices
+        shards = {}
+        for name, (shape, dtype) in MEMMAP_BANDS.items():
+            for shard, start in enumerate(range(0, count, shard_size)):
+                shards[(name, shard)] = np.lib.format.open_memmap(
+                    os.path.join(self.memmap_path, f"{name}_{shard:05d}.npy"),
+                    mode="w+",
+                    dtype=dtype,
+                    shape=(min(shard_size, count - start),) + shape,
+                )
+        labels_19 = np.zeros(
+            (count, (len(LABELS["BigEarthNet-19_labels"]) + 7) // 8), dtype=np.uint8
+        )
+        labels_43 = np.zeros(
+            (count, (len(LABELS["original_labels"]) + 7) // 8), dtype=np.uint8
+        )
+
+        datagen = PrepBigEarthNetDataset(
+            self.data_dir, patch_names_list=patches, label_indices=LABELS
+        )
+        dataloader = DataLoader(
+            datagen, batch_size=self.batch_size, num_workers=self.num_workers
+        )
+
+        start = 0
+        patch_names = []
+        for idx, data in enumerate(dataloader):
+            print(f"Processed batch {idx} of {len(dataloader)}")
+            bands10, bands20, bands60, names, multihots_19, multihots_43 = data
+            end = start + len(names)
+
+            arrays = {
+                "bands10": rescale_bands10(
+                    bands10.numpy(),
+                    self.config.calibration_scale,
+                    channels=[2, 1, 0, 3],
+                ),
+                "bands20": bands20.numpy().astype(np.uint16),
+                "bands60": bands60.numpy().astype(np.uint16),
+            }
+            # a batch can span several shards, it is split at the shard boundaries
+            first_boundary = (start // shard_size + 1) * shard_size
+            bounds = [start] + list(range(first_boundary, end, shard_size)) + [end]
+            for name, array in arrays.items():
+                for row, next_row in zip(bounds[:-1], bounds[1:]):
+                    shard, offset = divmod(row, shard_size)
+                    shards[(name, shard)][offset : offset + next_row - row] = array[
+                        row - start : next_row - start
+                    ]
+
+            labels_19[start:end] = np.packbits(
+                multihots_19.numpy().astype(np.uint8), axis=1
+            )
+            labels_43[start:end] = np.packbits(
+                multihots_43.numpy().astype(np.uint8), axis=1
+            )
+            patch_names.extend(names)
+            start = end
+
+        for shard in shards.values():
+            shard.flush()
+        np.save(os.path.join(self.memmap_path, "labels_19.npy"), labels_19)
+        np.save(os.path.join(self.memmap_path, "labels_43.npy"), labels_43)
+
+        with open(os.path.join(self.memmap_path, "patches.csv"), "w", newline="") as f:
+            csv_writer = csv.writer(f)
+            for patch_name in patch_names:
+                csv_writer.writerow([patch_name])
+
+        with open(os.path.join(self.memmap_path, "meta.json"), "w") as f:
+            json.dump({"count": count, "shard_size": shard_size}, f)
 
     def process_to_lmdb(self):
         patches = []
@@ -289,69 +289,16 @@ class BreizhCropsDataset(CropsDataset):
             download_file(CODESURL, self.codesfile)
         self.codes = pd.read_csv(self.codesfile, delimiter=";", index_col=0)
 
-        # for now
-        self.X_list = None
+        self.build_lookup()
+        if self.config.preload_ram and self.config.load_timeseries:
+            self.load_timeseries_to_ram()
 
         self.index.rename(columns={"meanQA60": "meanCLD"}, inplace=True)
 
         self.get_codes()
 
-    def __len__(self):
-        return len(self.index)
-
-    def __getitem__(self, index):
-        """
-        :param index: Index
-        :type index: int
-        :return: typle where target is index of the target class.
-        :rtype: tuple (image, target)
-        """
-        row = self.index.iloc[index]
-
-        h5path = self.h5path[row.region]
-
-        if self.X_list is None:
-            # Looks like this is what I need (load directly from file)
-            with h5py.File(h5path, "r") as dataset:
-                X = np.array(dataset[(row.path)])
-        else:
-            X = self.X_list[index]
-
-        # translate CODE_CULTU to class id
-        y = self.mapping.loc[row["CODE_CULTU"]].id
-
-        if self.transform:
-            X, y = self.transform((X, y))
-
-        return X, y  # , row.id
-
-    def get_labels(self):
-        return self.index.classid
-
     # visualization functions
 
-    def data_distribution_table(self):
-        label_count = (
-            self.index[["id", "region", "classname"]]
-            .groupby(["classname", "region"])
-            .count()
-            .reset_index()
-        )
-        label_count.columns = ["Label", "Region", "Number of parcels"]
-        return label_count
-
-    def parcel_distribution_table(self):
-        # Figure 2 a) in the paper
-        parcel_count = (
-            self.index[["id", "region"]].groupby("region").count().reset_index()
-        )
-        parcel_count.columns = ["Region NUTS-3", "# " + self.config.level]
-        total_row = parcel_count.sum(axis=0)
-        total_row["Region NUTS-3"] = "Total"
-
-        parcel_count = parcel_count.append(total_row, ignore_index=True)
-        return parcel_count
-
     def data_distribution_barchart(self):
         # Figure 2 b) in the paper
         label_count = self.data_distribution_table()
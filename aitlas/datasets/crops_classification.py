@@ -6,14 +6,83 @@ import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import seaborn as sns
+import torch
+from tqdm import tqdm
 
 from ..base import BaseDataset
+from ..utils import pad_time_series
 from .schemas import CropsDatasetSchema
 
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
 
 
+class TimeSeriesCollate:
+    """
+    Pads the time series of a batch and applies the batch transformations to the whole batch.
+    With `return_mask`, the inputs are a tuple of the padded time series and their mask,
+    for the models which handle time series of different lengths.
+    """
+
+    def __init__(self, batch_transform=None, return_mask=False):
+        self.batch_transform = batch_transform
+        self.return_mask = return_mask
+
+    def __call__(self, batch):
+        x, mask, y = pad_time_series(batch)
+        if self.batch_transform:
+            x, mask, y = self.batch_transform((x, mask, y))
+        if self.return_mask:
+            return (x, mask), y
+        return x, y
+
+
+class LengthBucketBatchSampler(torch.utils.data.Sampler):
+    """
+    Batches time series of similar lengths, so that little padding is needed. Each epoch the
+    samples are shuffled and split into buckets of `bucket_batches` batches, each bucket is
+    sorted by length and cut into batches, and the batches are shuffled.
+    """
+
+    def __init__(self, lengths, batch_size, shuffle=True, bucket_batches=100):
+        """
+        :param lengths: length of each time series
+        :type lengths: array-like
+        :param batch_size: number of samples per batch
+        :type batch_size: int
+        :param shuffle: whether to randomize the buckets and the batches, defaults to True
+        :type shuffle: bool, optional
+        :param bucket_batches: number of batches per bucket, defaults to 100
+        :type bucket_batches: int, optional
+        """
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.bucket_size = batch_size * bucket_batches
+
+    def __iter__(self):
+        if self.shuffle:
+            indexes = np.random.permutation(len(self.lengths))
+        else:
+            indexes = np.arange(len(self.lengths))
+
+        batches = []
+        for start in range(0, len(indexes), self.bucket_size):
+            bucket = indexes[start : start + self.bucket_size]
+            bucket = bucket[np.argsort(self.lengths[bucket], kind="stable")]
+            batches += [
+                bucket[i : i + self.batch_size].tolist()
+                for i in range(0, len(bucket), self.batch_size)
+            ]
+
+        if self.shuffle:
+            np.random.shuffle(batches)
+        return iter(batches)
+
+    def __len__(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+
 class CropsDataset(BaseDataset):
     """CropsDataset - a crop type classification dataset"""
 
@@ -22,6 +91,27 @@ class CropsDataset(BaseDataset):
     def __init__(self, config):
         super().__init__(config)
 
+        # HDF5 files opened by the current process, see `h5file`
+        self.h5files = {}
+        self.h5files_pid = None
+
+        # time series of all parcels preloaded in RAM, see `load_timeseries_to_ram`
+        self.X_packed = None
+        self.X_offsets = None
+
+        # per parcel arrays looked up in `__getitem__`, see `build_lookup`
+        self.region_names = None
+        self.parcel_region = None
+        self.parcel_path = None
+        self.parcel_class = None
+
+    def __getstate__(self):
+        # the HDF5 files are opened again in each data loader worker
+        state = self.__dict__.copy()
+        state["h5files"] = {}
+        state["h5files_pid"] = None
+        return state
+
     def preprocess(self):
         raise NotImplementedError(
             "Please implement the `preprocess` method for your crop type classification dataset"
@@ -38,47 +128,160 @@ class CropsDataset(BaseDataset):
         Returns:
             tuple: (timeseries, target) where target is index of the target class.
         """
-        row = self.index.iloc[index]
-
-        h5path = self.h5path[row.region]
-        if self.X_list is None:
-            # Looks like this is what I need (load directly from file)
-            with h5py.File(h5path, "r") as dataset:
-                X = np.array(dataset[(row.path)])
+        if self.X_packed is None:
+            region = self.region_names[self.parcel_region[index]]
+            X = self.h5file(region)[self.parcel_path[index]][()]
         else:
-            X = self.X_list[index]
+            X = self.X_packed[self.X_offsets[index] : self.X_offsets[index + 1]]
 
-        # translate CODE_CULTU to class id
-        y = self.mapping.loc[row["CODE_CULTU"]].id
+        # class id translated from CODE_CULTU
+        y = self.parcel_class[index]
 
         if self.transform:
             X, y = self.transform((X, y))
 
         return X, y
 
+    def dataloader(self):
+        """
+        Create and return a dataloader for the dataset, collating padded batches if there are batch
+        transformations or the time series are kept at their own lengths, and batching time series
+        of similar lengths together if `bucket_by_length` is set
+        """
+        collate_fn = None
+        if self.batch_transform or self.config.variable_length:
+            collate_fn = TimeSeriesCollate(
+                self.batch_transform, return_mask=self.config.variable_length
+            )
+
+        if not self.config.bucket_by_length:
+            if collate_fn is None:
+                return super().dataloader()
+            return torch.utils.data.DataLoader(
+                self,
+                batch_size=self.batch_size,
+                shuffle=self.shuffle,
+                num_workers=self.num_workers,
+                pin_memory=self.pin_memory,
+                collate_fn=collate_fn,
+            )
+
+        batch_sampler = LengthBucketBatchSampler(
+            self.get_lengths(),
+            self.batch_size,
+            shuffle=self.shuffle,
+            bucket_batches=self.config.bucket_batches,
+        )
+        return torch.utils.data.DataLoader(
+            self,
+            batch_sampler=batch_sampler,
+            num_workers=self.num_workers,
+            pin_memory=self.pin_memory,
+            collate_fn=collate_fn,
+        )
+
+    def get_lengths(self):
+        """Returns the length of the time series of each parcel"""
+        if self.X_offsets is not None:
+            return np.diff(self.X_offsets)
+        return self.index["sequencelength"].values
+
+    def build_lookup(self):
+        """
+        Precomputes the region, the HDF5 path and the class id of each parcel as numpy arrays,
+        so that getting an item doesn't index the pandas index. Call it whenever the index changes.
+        """
+        self.region_names, parcel_region = np.unique(
+            self.index["region"].values.astype(str), return_inverse=True
+        )
+        self.parcel_region = parcel_region.astype(np.int32)
+        self.parcel_path = self.index["path"].values.astype(str)
+        # translate CODE_CULTU to class id
+        self.parcel_class = (
+            self.mapping["id"].reindex(self.index["CODE_CULTU"].values).values
+        )
+
+    def h5file(self, region):
+        """
+        Returns the HDF5 file of a region. The file is opened once per process, on first use, so
+        handles opened before the data loader workers are forked are never shared with them.
+        """
+        if self.h5files_pid != os.getpid():
+            self.h5files = {}
+            self.h5files_pid = os.getpid()
+        if region not in self.h5files:
+            self.h5files[region] = h5py.File(self.h5path[region], "r")
+        return self.h5files[region]
+
+    def load_timeseries_to_ram(self):
+        """
+        Reads the time series of all parcels into one packed array of shape (total length, bands),
+        with `X_offsets` giving the rows of each parcel. The parcels of a region are read from one
+        open file, in the order in which they are stored on disk, directly into the packed array.
+        """
+        regions = self.index["region"].values
+        paths = self.index["path"].values
+
+        # first pass: the shapes and the position on disk of each parcel
+        lengths = np.zeros(len(self.index), dtype=np.int64)
+        storage = {}
+        bands, dtype = 0, np.float64
+        for region in pd.unique(regions):
+            items = np.flatnonzero(regions == region)
+            with h5py.File(self.h5path[region], "r") as file:
+                offsets = []
+                for i in items:
+                    dataset = file[paths[i]]
+                    lengths[i] = dataset.shape[0]
+                    if dataset.ndim == 2 and dataset.shape[0]:
+                        bands, dtype = dataset.shape[1], dataset.dtype
+                    offset = dataset.id.get_offset()  # None if not stored contiguously
+                    offsets.append(-1 if offset is None else offset)
+            storage[region] = items[np.argsort(offsets, kind="stable")]
+
+        self.X_offsets = np.zeros(len(self.index) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=self.X_offsets[1:])
+        X_packed = np.empty((self.X_offsets[-1], bands), dtype=dtype)
+
+        # second pass: read the parcels in storage order
+        for region, items in storage.items():
+            with h5py.File(self.h5path[region], "r") as file:
+                for i in tqdm(items, desc=f"loading {region} to RAM"):
+                    if lengths[i]:
+                        file[paths[i]].read_direct(
+                            X_packed,
+                            dest_sel=np.s_[self.X_offsets[i] : self.X_offsets[i + 1]],
+                        )
+        self.X_packed = X_packed
+
     def get_labels(self):
-        return self.index.classid
+        return self.parcel_class
 
     def data_distribution_table(self):
-        label_count = (
-            self.index[["id", "region", "classname"]]
-            .groupby(["classname", "region"])
-            .count()
-            .reset_index()
+        classnames = self.mapping.groupby("id").first().classname
+        classes, class_index = np.unique(self.parcel_class, return_inverse=True)
+        counts = np.zeros((len(classes), len(self.region_names)), dtype=np.int64)
+        np.add.at(counts, (class_index.reshape(-1), self.parcel_region), 1)
+
+        class_pos, region_pos = np.nonzero(counts)
+        label_count = pd.DataFrame(
+            {
+                "Label": classnames.loc[classes[class_pos]].values,
+                "Region": self.region_names[region_pos],
+                "Number of parcels": counts[class_pos, region_pos],
+            }
         )
-        label_count.columns = ["Label", "Region", "Number of parcels"]
-        return label_count
+        return label_count.sort_values(["Label", "Region"], ignore_index=True)
 
     def parcel_distribution_table(self):
         # Figure 2 a) in the paper
-        parcel_count = (
-            self.index[["id", "region"]].groupby("region").count().reset_index()
+        counts = np.bincount(self.parcel_region, minlength=len(self.region_names))
+        parcel_count = pd.DataFrame(
+            {
+                "Region NUTS-3": list(self.region_names) + ["Total"],
+                "# " + self.config.level: list(counts) + [counts.sum()],
+            }
         )
-        parcel_count.columns = ["Region NUTS-3", "# " + self.config.level]
-        total_row = parcel_count.sum(axis=0)
-        total_row["Region NUTS-3"] = "Total"
-
-        parcel_count = parcel_count.append(total_row, ignore_index=True)
         return parcel_count
 
     def data_distribution_barchart(self):
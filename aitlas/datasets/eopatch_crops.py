@@ -1,6 +1,7 @@
 import logging
 import os
 import urllib
+from multiprocessing import Pool
 
 import h5py
 import matplotlib.pyplot as plt
@@ -43,6 +44,59 @@ def download_file(url, output_path, overwrite=False):
 BANDS = ["B3", "B4", "B5", "B6", "B7", "B8", "B11", "B12", "NDVI", "NDWI", "Brightness"]
 
 
+def process_eopatch(args):
+    """
+    Computes the time series of the polygons of an EOPatch, as the sums of the features of their pixels.
+    The polygons are rasterized together into a single raster of polygon numbers and the features are
+    summed per polygon in one grouped reduction. Where polygons overlap, the pixels belong to the last one.
+
+    :param args: tuple of (EOPatches directory, EOPatch name, ids of the polygons to process)
+    :type args: tuple
+    :return: tuple of (EOPatch name, length of the time series, dict of polygon id -> time series of shape
+             (time, bands))
+    :rtype: tuple
+    """
+    root, patch, polygon_ids = args
+    eop = EOPatch.load(os.path.join(root, patch))
+    polygons = eop.vector_timeless["CROP_TYPE_GDF"]
+    polygons = polygons[polygons.polygon_id.astype(int).isin(polygon_ids)]
+    polygon_ids = polygons.polygon_id.astype(int).values
+
+    # pixels of the n-th polygon are set to n, the others to 0
+    polygons = polygons.assign(polygon_number=np.arange(1, len(polygons) + 1))
+    eop = VectorToRasterTask(
+        vector_input=polygons,
+        raster_feature=(FeatureType.MASK_TIMELESS, "POLYGON_NUMBER"),
+        values_column="polygon_number",
+        raster_shape=(FeatureType.MASK_TIMELESS, "CROP_TYPE"),
+        raster_dtype=np.int32,
+    ).execute(eop)
+    numbers = eop.mask_timeless["POLYGON_NUMBER"].ravel()
+
+    features = eop.data["FEATURES_S2"]
+    time, height, width, bands = features.shape
+    series = {
+        polygon_id: np.zeros((time, bands), dtype=features.dtype)
+        for polygon_id in polygon_ids
+    }
+
+    # sum the features of the pixels of each polygon, sorted by polygon
+    pixels = np.flatnonzero(numbers)
+    pixels = pixels[np.argsort(numbers[pixels], kind="stable")]
+    covered, starts = np.unique(numbers[pixels], return_index=True)
+    if len(pixels):
+        sums = np.add.reduceat(
+            features.reshape(time, height * width, bands)[:, pixels],
+            starts,
+            axis=1,
+            dtype=np.float64,
+        )
+        for number, polygon_sums in zip(covered, sums.transpose(1, 0, 2)):
+            series[polygon_ids[number - 1]] = polygon_sums.astype(features.dtype)
+
+    return patch, time, series
+
+
 class EOPatchCrops(CropsDataset):
     """EOPatchCrops - a crop type classification dataset"""
 
@@ -78,7 +132,9 @@ class EOPatchCrops(CropsDataset):
             )
             self.index = pd.concat([self.index, region_ind], axis=0, ignore_index=True)
 
-        self.X_list = None
+        self.build_lookup()
+        if self.config.preload_ram:
+            self.load_timeseries_to_ram()
 
     def preprocess(self):
         self.eopatches = [
@@ -98,13 +154,20 @@ class EOPatchCrops(CropsDataset):
             "region",
         ]
         list_index = list()
+        patch_polygons = {}
         for patch in self.eopatches:
-            eop = EOPatch.load(os.path.join(self.root, "eopatches", patch))
+            # only the polygons are needed for the index
+            eop = EOPatch.load(
+                os.path.join(self.root, "eopatches", patch),
+                features=[(FeatureType.VECTOR_TIMELESS, "CROP_TYPE_GDF")],
+            )
             polygons = eop.vector_timeless["CROP_TYPE_GDF"]
+            patch_polygons[patch] = []
             for row in polygons.itertuples():
                 if row.ct_eu_code not in self.mapping.index.values:
                     continue
                 poly_id = int(row.polygon_id)
+                patch_polygons[patch].append(poly_id)
 
                 classid = self.mapping.loc[row.ct_eu_code].id
                 classname = self.mapping.loc[row.ct_eu_code].classname
@@ -131,42 +194,25 @@ class EOPatchCrops(CropsDataset):
 
         self.index.set_index("path", drop=False, inplace=True)
 
-        for patch in self.eopatches:
-            eop = EOPatch.load(os.path.join(self.root, "eopatches", patch))
-            polygons = eop.vector_timeless["CROP_TYPE_GDF"]
-            for row in polygons.itertuples():
-                if row.ct_eu_code not in self.mapping.index.values:
-                    continue
-                poly_id = int(row.polygon_id)
-                index_row = self.index.loc[os.path.join(patch, str(poly_id))]
-
-                polygon = polygons[polygons.polygon_id == poly_id]
-                temp = VectorToRasterTask(
-                    vector_input=polygon,
-                    raster_feature=(FeatureType.MASK_TIMELESS, "poly"),
-                    values=1,
-                    raster_shape=(FeatureType.MASK_TIMELESS, "CROP_TYPE"),
-                )
-                polygon_indicator_mask = temp.execute(eop).mask_timeless["poly"]
-
-                seq_length = eop.data["FEATURES_S2"].shape[0]
-                num_bands = eop.data["FEATURES_S2"].shape[3]
-
-                polygon_indicator_mask_ts = np.repeat(
-                    polygon_indicator_mask[np.newaxis, :, :, :], seq_length, axis=0
-                )
-                polygon_indicator_mask_ts = np.repeat(
-                    polygon_indicator_mask_ts, num_bands, axis=3
-                )
-
-                temp_X = np.sum(
-                    np.multiply(polygon_indicator_mask_ts, eop.data["FEATURES_S2"]),
-                    axis=(1, 2),
-                )
+        # the EOPatches are processed in parallel, the time series are written by this process only
+        tasks = [
+            (os.path.join(self.root, "eopatches"), patch, patch_polygons[patch])
+            for patch in self.eopatches
+        ]
+        with Pool(self.config.num_threads) as pool:
+            for patch, time, series in tqdm(
+                pool.imap_unordered(process_eopatch, tasks),
+                total=len(tasks),
+                desc="processing eopatches",
+            ):
+                for poly_id, temp_X in series.items():
+                    path = os.path.join(patch, str(poly_id))
+                    region = self.index.at[path, "region"]
+                    f[region].create_dataset(patch + os.sep + str(poly_id), data=temp_X)
+                    self.index.at[path, "sequencelength"] = time
 
-                dset = f[index_row.region].create_dataset(
-                    patch + os.sep + str(poly_id), data=temp_X
-                )
+        for set in self.split_sets:
+            f[set].close()
         self.index.reset_index(inplace=True, drop=True)
         self.write_index()
 
@@ -180,15 +226,16 @@ class EOPatchCrops(CropsDataset):
 
         X_train = pd.DataFrame(X_train, columns=self.index.columns)
         X_train["region"] = "train"
-        X_train.to_csv(os.path.join(self.root, "train.csv"))
         X_test = pd.DataFrame(X_test, columns=self.index.columns)
         X_test["region"] = "test"
-        X_test.to_csv(os.path.join(self.root, "test.csv"))
         X_val = pd.DataFrame(X_val, columns=self.index.columns)
         X_val["region"] = "val"
-        X_val.to_csv(os.path.join(self.root, "val.csv"))
 
         self.index = pd.concat([X_train, X_val, X_test], ignore_index=True)
 
     def write_index(self):
+        # the split indexes are written with the sequence lengths, once the time series are processed
+        for set in self.split_sets:
+            split_index = self.index[self.index.region == set].reset_index(drop=True)
+            split_index.to_csv(os.path.join(self.root, f"{set}.csv"))
         self.index.to_csv(self.indexfile)
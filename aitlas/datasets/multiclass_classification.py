@@ -7,7 +7,7 @@ import pandas as pd
 import seaborn as sns
 
 from ..base import BaseDataset
-from ..utils import image_loader
+from ..utils import DecodedImageCache, image_loader
 from .schemas import ClassificationDatasetSchema
 
 
@@ -31,6 +31,13 @@ class MultiClassClassificationDataset(BaseDataset):
         self.csv_file = self.config.csv_file
         self.data = self.load_dataset()
 
+        # cache of the decoded images
+        self.image_cache = None
+        if self.config.cache_images:
+            self.image_cache = DecodedImageCache(
+                len(self.data), self.config.cache_size * 2**20, self.config.cache_file
+            )
+
     def __getitem__(self, index):
         """
         :param index: Index
@@ -40,7 +47,7 @@ class MultiClassClassificationDataset(BaseDataset):
 
         """
         # load image
-        img = image_loader(self.data[index][0])
+        img = self.load_image(index)
         # apply transformations
         if self.transform:
             img = self.transform(img)
@@ -52,6 +59,12 @@ class MultiClassClassificationDataset(BaseDataset):
     def __len__(self):
         return len(self.data)
 
+    def load_image(self, index):
+        """Loads the image for an item, from the cache of decoded images if enabled"""
+        if self.image_cache:
+            return self.image_cache.get(index, self.data[index][0], image_loader)
+        return image_loader(self.data[index][0])
+
     def get_labels(self):
         return self.labels
 
@@ -8,7 +8,7 @@ import cv2
 import math
 
 from ..base import BaseDataset
-from ..utils import image_loader, load_voc_format_dataset
+from ..utils import DecodedImageCache, image_loader, load_voc_format_dataset
 from .schemas import ClassificationDatasetSchema
 
 
@@ -32,6 +32,13 @@ class MultiLabelClassificationDataset(BaseDataset):
         self.csv_file = self.config.csv_file
         self.data = self.load_dataset(self.data_dir, self.csv_file)
 
+        # cache of the decoded images
+        self.image_cache = None
+        if self.config.cache_images:
+            self.image_cache = DecodedImageCache(
+                len(self.data), self.config.cache_size * 2**20, self.config.cache_file
+            )
+
     def __getitem__(self, index):
         """
         Args:
@@ -41,7 +48,7 @@ class MultiLabelClassificationDataset(BaseDataset):
             tuple: (image, target) where target is index of the target class.
         """
         # load image
-        img = self.image_loader(self.data[index][0])
+        img = self.load_image(index)
         if self.transform:
             img = self.transform(img)
         target = self.data[index][1]
@@ -52,6 +59,12 @@ class MultiLabelClassificationDataset(BaseDataset):
     def __len__(self):
         return len(self.data)
 
+    def load_image(self, index):
+        """Loads the image for an item, from the cache of decoded images if enabled"""
+        if self.image_cache:
+            return self.image_cache.get(index, self.data[index][0], self.image_loader)
+        return self.image_loader(self.data[index][0])
+
     def get_labels(self):
         return self.labels
 
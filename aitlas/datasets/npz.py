@@ -1,9 +1,9 @@
 import numpy as np
 
 from ..base import BaseDataset
+from ..utils import decode_bands
 from .schemas import NPZDatasetSchema
 from numpy import load
-from PIL import Image
 
 """
 Load a dataset from a file in .npz format
@@ -34,7 +34,14 @@ class NpzDataset(BaseDataset):
         """
         # load image and convert to RGB
         img, target = self.data[index]
-        img = np.asarray(Image.fromarray(img).convert('RGB'))
+        # grayscale images repeat their single channel, alpha channels are dropped
+        gray = img.ndim == 2 or img.shape[2] == 1
+        img = decode_bands(
+            img,
+            self.config.calibration_scale,
+            channels=[0, 0, 0] if gray else [0, 1, 2],
+            to_float=self.config.decode_to_float,
+        )
         # apply transformations
         if self.transform:
             img = self.transform(img)
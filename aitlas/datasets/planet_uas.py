@@ -43,7 +43,7 @@ class PlanetUASMultiLabelDataset(MultiLabelClassificationDataset):
             tuple: (image, target) where target is index of the target class.
         """
         # load image and remove last channel
-        img = self.image_loader(self.data[index][0])[:, :, :3]
+        img = self.load_image(index)[:, :, :3]
         if self.transform:
             img = self.transform(img)
         target = self.data[index][1]
@@ -1,7 +1,6 @@
 import numpy as np
 from PIL import Image
 
-from ..utils import image_loader
 from .multiclass_classification import MultiClassClassificationDataset
 
 
@@ -75,9 +74,7 @@ class RSD46WHUDataset(MultiClassClassificationDataset):
             tuple: (image, target) where target is index of the target class.
         """
         # load image
-        img = np.asarray(
-            Image.fromarray(image_loader(self.data[index][0])).convert("RGB")
-        )
+        img = np.asarray(Image.fromarray(self.load_image(index)).convert("RGB"))
 
         # apply transformations
         if self.transform:
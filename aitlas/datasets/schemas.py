@@ -41,6 +41,15 @@ class NPZDatasetSchema(BaseDatasetSchema):
         required=False,
         description="List of labels",
     )
+    calibration_scale = fields.Float(
+        missing=1 / 255,
+        description="Scale of the raw pixel values, the images are clip(values * scale, 0, 1)",
+    )
+    decode_to_float = fields.Bool(
+        missing=False,
+        description="Decode the images straight to float tensors (channels, height, width) with values in 0-1, "
+        "for tensor and batch transforms, instead of uint8 arrays (height, width, channels)",
+    )
 
 
 class ClassificationDatasetSchema(BaseDatasetSchema):
@@ -53,6 +62,20 @@ class ClassificationDatasetSchema(BaseDatasetSchema):
     csv_file = fields.String(
         missing=None, description="CSV file on disk", example="./data/train.csv",
     )
+    cache_images = fields.Bool(
+        missing=False,
+        description="Whether to cache the decoded images, shared between the workers",
+    )
+    cache_file = fields.String(
+        missing=None,
+        description="File for the image cache, reused across runs. The cache is kept in RAM if not set.",
+        example="./data/cache/train.bin",
+    )
+    cache_size = fields.Int(
+        missing=4096,
+        description="Maximum size of the image cache in MB",
+        validate=validate.Range(min=1),
+    )
 
 
 class SegmentationDatasetSchema(BaseDatasetSchema):
@@ -125,6 +148,28 @@ class BigEarthNetSchema(BaseDatasetSchema):
     import_to_lmdb = fields.Bool(
         missing=False, description="Should the data be moved to LMDB"
     )
+    memmap_path = fields.String(
+        missing=None,
+        description="Path to the sharded memory-mapped storage. Used instead of LMDB if set.",
+    )
+    import_to_memmap = fields.Bool(
+        missing=False,
+        description="Should the data be moved to the memory-mapped storage",
+    )
+    shard_size = fields.Int(
+        missing=10000,
+        description="Number of patches per shard of the memory-mapped storage",
+        validate=validate.Range(min=1),
+    )
+    calibration_scale = fields.Float(
+        missing=1 / 2000,
+        description="Scale of the raw reflectances of the 10m bands, the images are clip(values * scale, 0, 1)",
+    )
+    decode_to_float = fields.Bool(
+        missing=False,
+        description="Decode the RGB images straight to float tensors (channels, height, width) with values in 0-1, "
+        "for tensor and batch transforms, instead of uint8 arrays (height, width, channels)",
+    )
     bands10_mean = fields.List(
         fields.Float,
         missing=(429.9430203, 614.21682446, 590.23569706),
@@ -265,7 +310,29 @@ class BreizhCropsSchema(BaseDatasetSchema):
     recompile_h5_from_csv = fields.Bool(
         missing=False, description="recompile_h5_from_csv"
     )
-    preload_ram = fields.Bool(missing=False, description="preload_ram")
+    preload_ram = fields.Bool(
+        missing=False,
+        description="Whether to load the time series of all parcels into RAM at initialization",
+    )
+    batch_transforms = fields.List(
+        fields.String,
+        missing=None,
+        description="Classes to run transformations over whole padded batches of time series",
+        example=["aitlas.transforms.SelectBandsBatch"],
+    )
+    variable_length = fields.Bool(
+        missing=False,
+        description="Whether to keep the time series at their own lengths and pass them to the model "
+        "as padded time series with a mask of the observed steps",
+    )
+    bucket_by_length = fields.Bool(
+        missing=False,
+        description="Whether to batch time series of similar lengths together, to reduce the padding",
+    )
+    bucket_batches = fields.Int(
+        missing=100,
+        description="Number of batches in each bucket of shuffled time series sorted by length",
+    )
 
 
 class CropsDatasetSchema(BaseDatasetSchema):
@@ -291,6 +358,33 @@ class CropsDatasetSchema(BaseDatasetSchema):
         description="Brittany region (frh01..frh04) or train/val/test",
         example="['frh01','frh01']",
     )
+    num_threads = fields.Int(
+        missing=None,
+        description="Number of processes preparing the time series of the EOPatches, all CPUs by default",
+    )
+    preload_ram = fields.Bool(
+        missing=False,
+        description="Whether to load the time series of all parcels into RAM at initialization",
+    )
+    batch_transforms = fields.List(
+        fields.String,
+        missing=None,
+        description="Classes to run transformations over whole padded batches of time series",
+        example=["aitlas.transforms.SelectBandsBatch"],
+    )
+    variable_length = fields.Bool(
+        missing=False,
+        description="Whether to keep the time series at their own lengths and pass them to the model "
+        "as padded time series with a mask of the observed steps",
+    )
+    bucket_by_length = fields.Bool(
+        missing=False,
+        description="Whether to batch time series of similar lengths together, to reduce the padding",
+    )
+    bucket_batches = fields.Int(
+        missing=100,
+        description="Number of batches in each bucket of shuffled time series sorted by length",
+    )
 
 
 class So2SatDatasetSchema(BaseDatasetSchema):
@@ -298,5 +392,36 @@ class So2SatDatasetSchema(BaseDatasetSchema):
     Schema for configuring the So2Sat dataset.
     """
     h5_file = fields.String(
-        required=True, description="H5 file on disk", example="./data/train.h5"
+        missing=None, description="H5 file on disk", example="./data/train.h5"
+    )
+    memmap_path = fields.String(
+        missing=None,
+        description="Path to the memory-mapped copy of sen2 and label. Used instead of the H5 file if set.",
+    )
+    import_to_memmap = fields.Bool(
+        missing=False,
+        description="Should the H5 file be copied to the memory-mapped storage",
+    )
+    chunk_size = fields.Int(
+        missing=None,
+        description="Number of consecutive samples read at once, by default a multiple of the HDF5 chunks of about 256",
+        validate=validate.Range(min=1),
+    )
+    group_chunks = fields.Int(
+        missing=4,
+        description="Number of chunks whose samples are shuffled together, and kept in memory by each worker",
+        validate=validate.Range(min=1),
+    )
+    chunk_sampling = fields.Bool(
+        missing=False,
+        description="Batch the samples chunk by chunk, so that each chunk is read once per epoch and worker",
+    )
+    calibration_scale = fields.Float(
+        missing=3.5,
+        description="Scale of the raw Sentinel-2 reflectances, the images are clip(values * scale, 0, 1)",
+    )
+    decode_to_float = fields.Bool(
+        missing=False,
+        description="Decode the images straight to float tensors (channels, height, width) with values in 0-1, "
+        "for tensor and batch transforms, instead of uint8 arrays (height, width, channels)",
     )
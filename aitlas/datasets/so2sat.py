@@ -1,12 +1,18 @@
 import logging
+import os
 import random
+from collections import OrderedDict
+
 import h5py
 import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
 import seaborn as sns
+import torch
 
 from ..base import BaseDataset
+from ..base.datasets import BatchTransformCollate
+from ..utils import decode_bands
 from .schemas import So2SatDatasetSchema
 
 
@@ -34,6 +40,68 @@ LABELS = [
 ]
 
 
+class ChunkBatchSampler(torch.utils.data.Sampler):
+    """
+    Batches the samples so that each chunk of consecutive samples is read from the storage at once. Each epoch
+    the chunks are shuffled and taken in groups of `group_chunks`, and the samples of each group are shuffled
+    before they are cut into batches. The samples are thus mixed within groups of chunks only.
+    """
+
+    def __init__(
+        self, num_samples, chunk_size, batch_size, shuffle=True, group_chunks=4
+    ):
+        """
+        :param num_samples: number of samples of the dataset
+        :type num_samples: int
+        :param chunk_size: number of consecutive samples per chunk
+        :type chunk_size: int
+        :param batch_size: number of samples per batch
+        :type batch_size: int
+        :param shuffle: whether to randomize the chunks and the samples within the groups, defaults to True
+        :type shuffle: bool, optional
+        :param group_chunks: number of chunks whose samples are shuffled together, defaults to 4
+        :type group_chunks: int, optional
+        """
+        self.num_samples = num_samples
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.shuffle = shuffle
+        self.group_chunks = group_chunks
+
+    def __iter__(self):
+        num_chunks = (self.num_samples + self.chunk_size - 1) // self.chunk_size
+        if self.shuffle:
+            chunks = np.random.permutation(num_chunks)
+        else:
+            chunks = np.arange(num_chunks)
+
+        groups = []
+        for start in range(0, num_chunks, self.group_chunks):
+            indexes = np.concatenate(
+                [
+                    np.arange(
+                        chunk * self.chunk_size,
+                        min((chunk + 1) * self.chunk_size, self.num_samples),
+                    )
+                    for chunk in chunks[start : start + self.group_chunks]
+                ]
+            )
+            if self.shuffle:
+                np.random.shuffle(indexes)
+            groups.append(indexes)
+
+        indexes = np.concatenate(groups) if groups else np.zeros(0, dtype=np.int64)
+        return iter(
+            [
+                indexes[i : i + self.batch_size].tolist()
+                for i in range(0, len(indexes), self.batch_size)
+            ]
+        )
+
+    def __len__(self):
+        return (self.num_samples + self.batch_size - 1) // self.batch_size
+
+
 class So2SatDataset(BaseDataset):
     """
         So2Sat dataset version 2 (contains train, validation and test splits)
@@ -42,6 +110,10 @@ class So2SatDataset(BaseDataset):
         data acquired by the Sentinel-1 and Sentinel-2 remote sensing satellites, and a corresponding local climate
         zones (LCZ) label. The dataset is distributed over 42 cities across different continents and cultural regions
         of the world, and comes with a split into fully independent, non-overlapping training, validation, and test sets.
+
+        The samples are read from the HDF5 file, or from its memory-mapped copy, which each process opens
+        on first use. With `chunk_sampling`, they are read one chunk of consecutive samples at a time and
+        each process keeps its last chunks in memory.
     """
 
     url = "https://dataserv.ub.tum.de/s/m1483140/download?path=%2F&files=testing.h5"
@@ -53,17 +125,93 @@ class So2SatDataset(BaseDataset):
         super().__init__(config)
 
         self.file_path = self.config.h5_file
-        self.data = h5py.File(
-            self.file_path
-        )  # TODO: we should close this file eventually
+        self.memmap_path = self.config.memmap_path
+        self.use_memmap = bool(self.memmap_path) and not self.config.import_to_memmap
+        if not self.file_path and not self.use_memmap:
+            raise ValueError(
+                "You need to provide the h5 file or the memory-mapped storage"
+            )
+
+        # storage opened by the current process, see `data`
+        self.storage = None
+        self.storage_pid = None
+        self.chunks = OrderedDict()
+
+        # only the metadata is read here, the storage is not kept open in the parent process
+        if self.use_memmap:
+            with open(os.path.join(self.memmap_path, "label.npy"), "rb") as f:
+                if np.lib.format.read_magic(f) == (1, 0):
+                    shape, _, _ = np.lib.format.read_array_header_1_0(f)
+                else:
+                    shape, _, _ = np.lib.format.read_array_header_2_0(f)
+            self.num_samples = shape[0]
+            rows = 1
+        else:
+            with h5py.File(self.file_path, "r") as file:
+                self.num_samples = file["label"].shape[0]
+                rows = file["sen2"].chunks[0] if file["sen2"].chunks else 1
+        # chunks of samples aligned to the HDF5 chunks
+        self.chunk_size = self.config.chunk_size or rows * max(1, 256 // rows)
+
+    def __getstate__(self):
+        # the storage is opened again in each data loader worker
+        state = self.__dict__.copy()
+        state["storage"] = None
+        state["storage_pid"] = None
+        state["chunks"] = OrderedDict()
+        return state
+
+    @property
+    def data(self):
+        """
+        The `sen2` and `label` arrays. They are opened once per process, on first use, so handles opened
+        before the data loader workers are forked are never shared with them.
+        """
+        if self.storage_pid != os.getpid():
+            self.chunks = OrderedDict()
+            if self.use_memmap:
+                self.storage = {
+                    name: np.load(
+                        os.path.join(self.memmap_path, f"{name}.npy"), mmap_mode="r"
+                    )
+                    for name in ["sen2", "label"]
+                }
+            else:
+                self.storage = h5py.File(self.file_path, "r")
+            self.storage_pid = os.getpid()
+        return self.storage
+
+    def read_chunk(self, chunk):
+        """Returns the `sen2` and `label` arrays of a chunk of samples, read at once and kept for reuse"""
+        data = self.data
+        if chunk in self.chunks:
+            self.chunks.move_to_end(chunk)
+            return self.chunks[chunk]
+
+        start = chunk * self.chunk_size
+        stop = min(start + self.chunk_size, self.num_samples)
+        self.chunks[chunk] = (data["sen2"][start:stop], data["label"][start:stop])
+        # a group of chunks of the sampler is read once by each worker
+        while len(self.chunks) > self.config.group_chunks:
+            self.chunks.popitem(last=False)
+        return self.chunks[chunk]
 
     def __getitem__(self, index):
-        label = self.data["label"][index]
+        if self.config.chunk_sampling:
+            # the batches of `ChunkBatchSampler` come chunk by chunk
+            chunk, offset = divmod(int(index), self.chunk_size)
+            sen2, labels = self.read_chunk(chunk)
+            sen2, label = sen2[offset], labels[offset]
+        else:
+            sen2, label = self.data["sen2"][index], self.data["label"][index]
 
-        # we are using sentinel 2 data only for now
-        img = self.data["sen2"][index][:, :, [2, 1, 0]].astype(np.float32)
-        # Calibration for the optical RGB channels of Sentinel-2 in this dataset.
-        img = np.clip(img * 3.5 * 255.0, 0, 255).astype(np.uint8)
+        # we are using sentinel 2 data only for now, calibrated for the optical RGB channels
+        img = decode_bands(
+            sen2,
+            self.config.calibration_scale,
+            channels=[2, 1, 0],
+            to_float=self.config.decode_to_float,
+        )
 
         if self.transform:
             img = self.transform(img)
@@ -73,8 +221,61 @@ class So2SatDataset(BaseDataset):
 
         return img, np.where(label == 1.0)[0][0]
 
+    def dataloader(self):
+        """
+        Create and return a dataloader for the dataset, batching the samples chunk by chunk
+        if `chunk_sampling` is set
+        """
+        if not self.config.chunk_sampling:
+            return super().dataloader()
+
+        batch_sampler = ChunkBatchSampler(
+            len(self),
+            self.chunk_size,
+            self.batch_size,
+            shuffle=self.shuffle,
+            group_chunks=self.config.group_chunks,
+        )
+        return torch.utils.data.DataLoader(
+            self,
+            batch_sampler=batch_sampler,
+            num_workers=self.num_workers,
+            pin_memory=self.pin_memory,
+            collate_fn=(
+                BatchTransformCollate(self.batch_transform)
+                if self.batch_transform
+                else None
+            ),
+        )
+
+    def prepare(self):
+        super().prepare()
+        if self.memmap_path and self.config.import_to_memmap:
+            self.process_to_memmap()
+
+    def process_to_memmap(self):
+        """
+        Converts `sen2` and `label` of the HDF5 file to `.npy` files which are memory-mapped when reading.
+        `sen2` is stored as float32, the precision to which it is calibrated anyway.
+        """
+        os.makedirs(self.memmap_path, exist_ok=True)
+        with h5py.File(self.file_path, "r") as file:
+            for name, dtype in [("sen2", np.float32), ("label", np.uint8)]:
+                dataset = file[name]
+                array = np.lib.format.open_memmap(
+                    os.path.join(self.memmap_path, f"{name}.npy"),
+                    mode="w+",
+                    dtype=dtype,
+                    shape=dataset.shape,
+                )
+                for start in range(0, dataset.shape[0], self.chunk_size):
+                    stop = min(start + self.chunk_size, dataset.shape[0])
+                    array[start:stop] = dataset[start:stop]
+                array.flush()
+                logging.info(f"Converted {name} of {dataset.shape[0]} samples")
+
     def __len__(self):
-        return self.data["label"].shape[0]
+        return self.num_samples
 
     def get_labels(self):
         return self.labels
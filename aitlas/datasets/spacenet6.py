@@ -6,7 +6,6 @@ import glob
 import math
 import os
 import warnings
-from functools import partial
 from multiprocessing import Pool
 
 import cv2
@@ -19,9 +18,10 @@ except ModuleNotFoundError as err:
 import numpy as np
 import pandas as pd
 import torch
+from scipy import ndimage
 from shapely.wkt import loads
 from skimage import io, measure
-from skimage.morphology import dilation, erosion, square
+from skimage.morphology import dilation, square
 from skimage.segmentation import watershed
 from tqdm import tqdm
 
@@ -47,8 +47,72 @@ def polygon_to_mask(poly, image_size):
     return image_mask
 
 
+def image_id(image_path):
+    """Returns the ImageId of a SAR image, as used in the ground-truth buildings csv"""
+    return "_".join(os.path.basename(image_path).split("_")[-4:])[:-4]
+
+
+def group_gt_buildings(gt_buildings):
+    """
+    Groups the ground-truth buildings by image, so they are parsed only once.
+
+    :param gt_buildings: the ground-truth buildings csv
+    :type gt_buildings: pandas.DataFrame
+    :return: the (TileBuildingId, PolygonWKT_Pix, Mean_Building_Height) rows of each ImageId
+    :rtype: dict
+    """
+    columns = ["TileBuildingId", "PolygonWKT_Pix", "Mean_Building_Height"]
+    return {
+        name: group[columns].values
+        for name, group in gt_buildings.groupby("ImageId", sort=False)
+    }
+
+
+def border_mask(labels, edge_width):
+    """
+    Returns the pixels of each building which are within `edge_width` of another label
+    (background or another building), the same as eroding each building separately.
+    """
+    # a pixel is inside its building when its whole neighbourhood has the same label.
+    # even windows are placed like the square structuring element of `skimage.morphology.erosion`
+    origin = -1 if edge_width % 2 == 0 else 0
+    inside = (
+        ndimage.minimum_filter(labels, size=edge_width, mode="reflect", origin=origin)
+        == labels
+    ) & (
+        ndimage.maximum_filter(labels, size=edge_width, mode="reflect", origin=origin)
+        == labels
+    )
+    return (labels > 0) & ~inside
+
+
+def contact_mask(labels, candidates):
+    """
+    Returns the candidate pixels whose neighbourhood (7x7 for background pixels, 3x3 for
+    building pixels) contains more than one building.
+    """
+    # the neighbourhood contains several buildings when its smallest and largest building labels differ
+    no_building = np.iinfo(np.int32).max
+    positive = np.where(labels > 0, labels.astype(np.int32), no_building)
+    labels = labels.astype(np.int32)
+
+    contact = np.zeros_like(candidates)
+    for size, pixels in ((7, labels == 0), (3, labels > 0)):
+        smallest = ndimage.minimum_filter(
+            positive, size=size, mode="constant", cval=no_building
+        )
+        largest = ndimage.maximum_filter(labels, size=size, mode="constant", cval=0)
+        contact |= pixels & (largest > smallest) & (smallest != no_building)
+    return contact & candidates
+
+
 def process_image(
-    image_path, segmentation_directory, edge_width, contact_width, gt_buildings_csv
+    image_path,
+    segmentation_directory,
+    edge_width,
+    contact_width,
+    gt_buildings_csv=None,
+    buildings=None,
 ):
     """
     Creates and saves the target (ground-truth) segmentation mask for the input image.
@@ -61,17 +125,20 @@ def process_image(
     :type edge_width: int
     :param contact_width: the width of the contact
     :type contact_width: int
-    :param gt_buildings_csv: path to the source ground-truth-buildings csv
-    :type gt_buildings_csv: str
+    :param gt_buildings_csv: path to the source ground-truth-buildings csv, read if `buildings` is not given
+    :type gt_buildings_csv: str, optional
+    :param buildings: the (TileBuildingId, PolygonWKT_Pix, Mean_Building_Height) rows of the image,
+                      see `group_gt_buildings`
+    :type buildings: numpy.ndarray, optional
 
     """
-    gt_buildings = pd.read_csv(gt_buildings_csv)
     image_name = os.path.basename(image_path)
-    values = gt_buildings[
-        (gt_buildings["ImageId"] == "_".join(image_name.split("_")[-4:])[:-4])
-    ][["TileBuildingId", "PolygonWKT_Pix", "Mean_Building_Height"]].values
+    if buildings is None:
+        buildings = group_gt_buildings(pd.read_csv(gt_buildings_csv)).get(
+            image_id(image_path)
+        )
+    values = buildings if buildings is not None else np.empty((0, 3), dtype=object)
     labels = np.zeros((900, 900), dtype="uint16")
-    heights = np.zeros((900, 900), dtype="float")
     cur_lbl = 0
     for i in range(values.shape[0]):
         poly = loads(values[i, 1])
@@ -79,40 +146,16 @@ def process_image(
             cur_lbl += 1
             msk = polygon_to_mask(poly, (900, 900))
             labels[msk > 0] = cur_lbl
-            if values[i, 2] == values[i, 2]:
-                heights[msk > 0] = values[i, 2]
     msk = np.zeros((900, 900, 3), dtype="uint8")
     if cur_lbl > 0:
         footprint_msk = labels > 0
-        border_msk = np.zeros_like(labels, dtype="bool")
-        for l in range(1, labels.max() + 1):
-            tmp_lbl = labels == l
-            _k = square(edge_width)
-            tmp = erosion(tmp_lbl, _k)
-            tmp = tmp ^ tmp_lbl
-            border_msk = border_msk | tmp
+        border_msk = border_mask(labels, edge_width)
         tmp = dilation(labels > 0, square(contact_width))
         tmp2 = watershed(tmp, labels, mask=tmp, watershed_line=True) > 0
         tmp = tmp ^ tmp2
         tmp = tmp | border_msk
         tmp = dilation(tmp, square(contact_width))
-        contact_msk = np.zeros_like(labels, dtype="bool")
-        for y0 in range(labels.shape[0]):
-            for x0 in range(labels.shape[1]):
-                if not tmp[y0, x0]:
-                    continue
-                if labels[y0, x0] == 0:
-                    sz = 3
-                else:
-                    sz = 1
-                unique = np.unique(
-                    labels[
-                        max(0, y0 - sz) : min(labels.shape[0], y0 + sz + 1),
-                        max(0, x0 - sz) : min(labels.shape[1], x0 + sz + 1),
-                    ]
-                )
-                if len(unique[unique > 0]) > 1:
-                    contact_msk[y0, x0] = True
+        contact_msk = contact_mask(labels, tmp)
         msk = np.stack(
             (255 * footprint_msk, 255 * border_msk, 255 * contact_msk)
         ).astype("uint8")
@@ -120,6 +163,18 @@ def process_image(
     io.imsave(os.path.join(segmentation_directory, image_name), msk)
 
 
+def process_image_buildings(args):
+    """Runs `process_image` for a tuple of (image_path, segmentation_directory, edge_width, contact_width, buildings)"""
+    image_path, segmentation_directory, edge_width, contact_width, buildings = args
+    return process_image(
+        image_path,
+        segmentation_directory,
+        edge_width,
+        contact_width,
+        buildings=buildings,
+    )
+
+
 class SpaceNet6Dataset(BaseDataset):
     """SpaceNet6 dataset."""
 
@@ -265,25 +320,30 @@ class SpaceNet6Dataset(BaseDataset):
             self.config.root_directory,
             "SummaryData/SN6_Train_AOI_11_Rotterdam_Buildings.csv",
         )
-        # Read gt building csv file
+        # Read gt building csv file once, grouped by image
         gt_buildings = pd.read_csv(gt_buildings_csv_filepath)
+        buildings_per_image = group_gt_buildings(gt_buildings)
         # Walk the raw data directory with the SAR images and save the filenames in it
         sar_image_paths = glob.glob(
             os.path.join(self.config.root_directory, "SAR-Intensity", "*.tif")
         )
-        # Process each SAR image
+        # Process each SAR image, each worker gets only the buildings of its image
         with Pool(self.config.num_threads) as pool:
             for _ in tqdm(
                 pool.imap_unordered(
-                    partial(
-                        process_image,
-                        segmentation_directory=self.config.segmentation_directory,
-                        edge_width=self.config.edge_width,
-                        contact_width=self.config.contact_width,
-                        gt_buildings_csv=gt_buildings_csv_filepath,
-                    ),
-                    sar_image_paths,
-                )
+                    process_image_buildings,
+                    [
+                        (
+                            image_path,
+                            self.config.segmentation_directory,
+                            self.config.edge_width,
+                            self.config.contact_width,
+                            buildings_per_image.get(image_id(image_path)),
+                        )
+                        for image_path in sar_image_paths
+                    ],
+                ),
+                total=len(sar_image_paths),
             ):
                 pass
         orientations = pd.read_csv(
@@ -8,6 +8,7 @@ LSTM model
 import torch.nn as nn
 import torch.nn.functional as F
 import torch.optim as optim
+from torch.nn.utils.rnn import pack_padded_sequence
 
 from ..base import BaseMulticlassClassifier
 from .schemas import LSTMSchema
@@ -55,9 +56,19 @@ class LSTM(BaseMulticlassClassifier):
         )
 
     def logits(self, x):
+        mask = None
+        # padded time series of different lengths and their mask
+        if isinstance(x, tuple):
+            x, mask = x
+
         if self.config.use_layernorm:
             x = self.model.inlayernorm(x)
 
+        if mask is not None:
+            # the padded steps are skipped, the last states are those of the last observed steps
+            lengths = mask.sum(1).clamp(min=1).cpu()
+            x = pack_padded_sequence(x, lengths, batch_first=True, enforce_sorted=False)
+
         outputs, last_state_list = self.model.lstm.forward(x)
 
         h, c = last_state_list
@@ -71,6 +82,10 @@ class LSTM(BaseMulticlassClassifier):
         return logits
 
     def forward(self, x):
+        """
+        :param x: time series of shape (batch, time, bands), or a tuple of padded time series
+                  and a mask of shape (batch, time) which is True for the observed steps
+        """
         logprobabilities = F.log_softmax(self.logits(x), dim=-1)
         return logprobabilities
 
@@ -214,6 +214,41 @@ class UnsupervisedDeepMulticlassClassifierSchema(BaseModelSchema):
     sobel = fields.Boolean(
         missing=False, description="Whether to turn on on sobel filtering."
     )
+    clustering = fields.String(
+        missing="Kmeans",
+        description="Clustering of the features into pseudo-labels.",
+        validate=validate.OneOf(["Kmeans", "PIC"]),
+    )
+    knn_backend = fields.String(
+        missing="auto",
+        description="k-NN search building the graph of PIC: auto, gpu, flat, ivf, hnsw or numpy.",
+        validate=validate.OneOf(["auto", "gpu", "flat", "ivf", "hnsw", "numpy"]),
+    )
+    kmeans_mode = fields.String(
+        missing="faiss",
+        description="k-means trained from scratch with faiss, or mini-batch k-means warm-started from the previous epoch.",
+        validate=validate.OneOf(["faiss", "minibatch"]),
+    )
+    kmeans_batch_size = fields.Integer(
+        missing=10000,
+        description="Number of features per mini-batch of k-means.",
+        validate=validate.Range(min=1),
+    )
+    kmeans_iterations = fields.Integer(
+        missing=100,
+        description="Number of mini-batches of k-means per epoch.",
+        validate=validate.Range(min=1),
+    )
+    features_path = fields.String(
+        missing=None,
+        description="File of the memory-mapped features computed each epoch, the features are kept in RAM if not set.",
+        example="./features.npy",
+    )
+    pca_sample = fields.Integer(
+        missing=None,
+        description="Number of features the PCA whitening is fitted on, all by default, or at most 100000 of the memory-mapped features.",
+        validate=validate.Range(min=1),
+    )
 
 
 class UNetEfficientNetModelSchema(BaseSegmentationClassifierSchema):
@@ -18,6 +18,7 @@ import torch.nn.init as init
 import torch.optim as optim
 import torch.utils.data
 from torch.autograd import Variable
+from torch.nn.utils.rnn import PackedSequence, pack_padded_sequence, pad_packed_sequence
 
 from ..base import BaseMulticlassClassifier
 from .schemas import StarRNNSchema
@@ -80,18 +81,36 @@ class StarRNN(BaseMulticlassClassifier):
                 self.model.bn = nn.BatchNorm1d(hidden_dims)
 
     def _logits(self, x):
+        mask = None
+        # padded time series of different lengths and their mask
+        if isinstance(x, tuple):
+            x, mask = x
+
         if self.config.use_layernorm:
             x = self.model.inlayernorm(x)
 
-        outputs = self.model.block(x)
+        if mask is None:
+            outputs = self.model.block(x)
 
-        if self.config.use_batchnorm:
-            outputs = outputs[:, -1:, :]
-            b, t, d = outputs.shape
-            o_ = outputs.view(b, -1, d).permute(0, 2, 1)
-            outputs = self.model.bn(o_).permute(0, 2, 1).view(b, t, d)
+            if self.config.use_batchnorm:
+                outputs = outputs[:, -1:, :]
+                b, t, d = outputs.shape
+                o_ = outputs.view(b, -1, d).permute(0, 2, 1)
+                outputs = self.model.bn(o_).permute(0, 2, 1).view(b, t, d)
+
+            h = outputs[:, -1, :]
+        else:
+            # the padded steps are skipped, see `StarLayer.forward_packed`
+            lengths = mask.sum(1).clamp(min=1).cpu()
+            x = pack_padded_sequence(x, lengths, batch_first=True, enforce_sorted=False)
+            outputs, _ = pad_packed_sequence(self.model.block(x), batch_first=True)
 
-        h = outputs[:, -1, :]
+            # output of the last observed step of each time series
+            last = (lengths - 1).to(outputs.device)
+            h = outputs[torch.arange(len(last), device=outputs.device), last]
+
+            if self.config.use_batchnorm:
+                h = self.model.bn(h)
 
         if self.config.use_layernorm:
             h = self.model.clayernorm(h)
@@ -101,6 +120,10 @@ class StarRNN(BaseMulticlassClassifier):
         return logits
 
     def forward(self, x):
+        """
+        :param x: time series of shape (batch, time, bands), or a tuple of padded time series
+                  and a mask of shape (batch, time) which is True for the observed steps
+        """
         logits = self._logits(x)
 
         logprobabilities = F.log_softmax(logits, dim=-1)
@@ -191,6 +214,9 @@ class StarLayer(nn.Module):
             self.layer_norm_layer = nn.LayerNorm(hidden_dim)
 
     def forward(self, x):
+        if isinstance(x, PackedSequence):
+            return self.forward_packed(x)
+
         # Initialize hidden state with zeros
         h0 = Variable(torch.zeros(x.size(0), self.hidden_dim)).to(self.device)
         outs = Variable(torch.zeros(x.size(0), x.shape[1], self.hidden_dim)).to(
@@ -211,3 +237,32 @@ class StarLayer(nn.Module):
             outs = self.layer_norm_layer(outs)
 
         return outs
+
+    def forward_packed(self, x):
+        """
+        Runs the layer over packed time series of different lengths. At each step only the
+        time series which are still observed are updated, and the normalization statistics
+        are computed over the observed steps.
+
+        :param x: packed time series
+        :type x: torch.nn.utils.rnn.PackedSequence
+        :rtype: torch.nn.utils.rnn.PackedSequence
+        """
+        hn = x.data.new_zeros(int(x.batch_sizes[0]), self.hidden_dim)
+        outs = []
+        start = 0
+        # the time series are sorted by length, the observed ones come first at each step
+        for batch_size in x.batch_sizes.tolist():
+            hn = self.cell(x.data[start : start + batch_size], hn[:batch_size])
+            outs.append(hn)
+            start += batch_size
+        outs = torch.cat(outs)
+
+        if self.droput_factor != 0:
+            outs = self.naive_dropout(outs)
+        if self.batch_norm:
+            outs = self.bn_layer(outs)
+        if self.layer_norm:
+            outs = self.layer_norm_layer(outs)
+
+        return PackedSequence(outs, x.batch_sizes, x.sorted_indices, x.unsorted_indices)
@@ -44,11 +44,25 @@ class TransformerModel(BaseMulticlassClassifier):
         self.model.outlinear = Linear(self.config.d_model, self.config.num_classes)
 
     def forward(self, x):
+        """
+        :param x: time series of shape (batch, time, bands), or a tuple of padded time series
+                  and a mask of shape (batch, time) which is True for the observed steps
+        """
+        padding_mask = None
+        if isinstance(x, tuple):
+            x, mask = x
+            padding_mask = ~mask
+            # empty time series attend to their first padded step instead of nothing
+            padding_mask[:, 0] = False
+
         x = self.model.inlinear(x)
         x = self.model.relu(x)
         x = x.transpose(0, 1)  # N x T x D -> T x N x D
-        x = self.model.transformerencoder(x)
+        x = self.model.transformerencoder(x, src_key_padding_mask=padding_mask)
         x = x.transpose(0, 1)  # T x N x D -> N x T x D
+        if padding_mask is not None:
+            # pool over the observed steps only
+            x = x.masked_fill(padding_mask[:, :, None], float("-inf"))
         x = x.max(1)[0]
         x = self.model.relu(x)
         logits = self.model.outlinear(x)
@@ -6,7 +6,7 @@ import torch.nn as nn
 from torch.utils.data.sampler import Sampler
 
 from ..base import BaseMulticlassClassifier
-from ..clustering import Kmeans, cluster_assign
+from ..clustering import PIC, Kmeans, cluster_assign
 from .schemas import UnsupervisedDeepMulticlassClassifierSchema
 
 
@@ -17,6 +17,7 @@ class UnsupervisedDeepMulticlassClassifier(BaseMulticlassClassifier):
     """
 
     schema = UnsupervisedDeepMulticlassClassifierSchema
+    collect_train_metrics = False  # the model is trained on pseudo-labels
 
     def __init__(self, config):
         super().__init__(config)
@@ -30,7 +31,18 @@ class UnsupervisedDeepMulticlassClassifier(BaseMulticlassClassifier):
         self.fd = int(self.model.top_layer.weight.size()[1])
         self.model.top_layer = None
 
-        self.deepcluster = Kmeans(self.number_of_clusters)
+        if self.config.clustering == "PIC":
+            self.deepcluster = PIC(
+                knn_backend=self.config.knn_backend, pca_sample=self.config.pca_sample
+            )
+        else:
+            self.deepcluster = Kmeans(
+                self.number_of_clusters,
+                pca_sample=self.config.pca_sample,
+                mode=self.config.kmeans_mode,
+                batch_size=self.config.kmeans_batch_size,
+                iterations=self.config.kmeans_iterations,
+            )
 
         self.reassign = 1
 
@@ -48,9 +60,9 @@ class UnsupervisedDeepMulticlassClassifier(BaseMulticlassClassifier):
         features = compute_features(
             dataloader,
             self.model,
-            len(dataloader),
-            dataset.config.batch_size,
+            len(dataset),
             self.device,
+            path=self.config.features_path,
         )
 
         # cluster the features]
@@ -102,24 +114,41 @@ class UnsupervisedDeepMulticlassClassifier(BaseMulticlassClassifier):
         return self.model.forward(x)
 
 
-def compute_features(dataloader, model, N, batch, device):
-    """Compute features for images"""
-    model.eval()
-
-    # discard the label information in the dataloader
-    for i, (input_tensor, _) in enumerate(dataloader):
-        input_var = torch.autograd.Variable(input_tensor.to(device), volatile=True)
-        aux = model(input_var).data.cpu().numpy()
-
-        if i == 0:
-            features = np.zeros((N, aux.shape[1])).astype("float32")
+def compute_features(dataloader, model, N, device, path=None):
+    """Compute features for images, without autograd
 
-        if i < len(dataloader) - 1:
-            features[i * batch : (i + 1) * batch] = aux.astype("float32")
-        else:
-            # special treatment for final batch
-            features[i * batch :] = aux.astype("float32")
+    :param dataloader: dataloader of the images
+    :param model: model computing the features
+    :param N: number of images
+    :type N: int
+    :param device: device of the model
+    :param path: `.npy` file the features are written to as a memory-mapped array, in RAM by default
+    :type path: str, optional
+    :return: features of the images
+    :rtype: np.array (N * dim)
+    """
+    model.eval()
 
+    features = None
+    start = 0
+    with torch.no_grad():
+        # discard the label information in the dataloader
+        for input_tensor, _ in dataloader:
+            aux = model(input_tensor.to(device)).cpu().numpy().astype("float32")
+
+            if features is None:
+                if path:
+                    features = np.lib.format.open_memmap(
+                        path, mode="w+", dtype="float32", shape=(N, aux.shape[1])
+                    )
+                else:
+                    features = np.zeros((N, aux.shape[1]), dtype="float32")
+
+            features[start : start + len(aux)] = aux
+            start += len(aux)
+
+    if path and features is not None:
+        features.flush()
     return features
 
 
@@ -228,7 +257,7 @@ class UnifLabelSampler(Sampler):
     :param N: size of returned iterator.
     :type N: int
     :param images_lists: lists of images for each pseudolabel.
-    :type images_list: dict of key (target), value (list of data with this target)
+    :type images_list: list of arrays of data with this target
     """
 
     def __init__(self, N, images_lists):
@@ -237,19 +266,43 @@ class UnifLabelSampler(Sampler):
         self.indexes = self.generate_indexes_epoch()
 
     def generate_indexes_epoch(self):
-        size_per_pseudolabel = int(self.N / len(self.images_lists)) + 1
-        res = np.zeros(size_per_pseudolabel * len(self.images_lists))
-
-        for i in range(len(self.images_lists)):
-            indexes = np.random.choice(
-                self.images_lists[i],
-                size_per_pseudolabel,
-                replace=(len(self.images_lists[i]) <= size_per_pseudolabel),
+        sizes = np.array([len(images) for images in self.images_lists], dtype=np.int64)
+        if not sizes.any():
+            raise ValueError(
+                "All the clusters are empty, there are no images to sample"
+            )
+        indexes = np.concatenate(
+            [np.asarray(images, dtype=np.int64) for images in self.images_lists]
+        )
+        offsets = np.zeros(len(sizes) + 1, dtype=np.int64)
+        np.cumsum(sizes, out=offsets[1:])
+
+        # the empty clusters are not sampled
+        nonempty = np.flatnonzero(sizes)
+        size_per_pseudolabel = int(self.N / len(nonempty)) + 1
+
+        # the smaller clusters are sampled with replacement, all at once
+        small = nonempty[sizes[nonempty] <= size_per_pseudolabel]
+        positions = [
+            offsets[small, None]
+            + (
+                np.random.random((len(small), size_per_pseudolabel))
+                * sizes[small, None]
+            ).astype(np.int64)
+        ]
+
+        # the larger ones without replacement, the first positions of each shuffled cluster
+        large = nonempty[sizes[nonempty] > size_per_pseudolabel]
+        if len(large):
+            cluster_of = np.repeat(np.arange(len(sizes)), sizes)
+            shuffled = np.lexsort((np.random.random(len(indexes)), cluster_of))
+            positions.append(
+                shuffled[offsets[large, None] + np.arange(size_per_pseudolabel)]
             )
-            res[i * size_per_pseudolabel : (i + 1) * size_per_pseudolabel] = indexes
 
+        res = indexes[np.concatenate([p.ravel() for p in positions])]
         np.random.shuffle(res)
-        return res[: self.N].astype("int")
+        return res[: self.N]
 
     def __iter__(self):
         return iter(self.indexes)
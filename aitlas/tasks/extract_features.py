@@ -40,6 +40,9 @@ class ExtractFeaturesTask(BaseTask):
         # set model in eval model
         self.model.eval()
 
+        # the transformations are constructed once and reused for all images
+        transform = load_transforms(self.transforms, self.config)
+
         # run through the directory
         with torch.no_grad():
             data_dir = os.path.expanduser(self.data_dir)
@@ -47,9 +50,7 @@ class ExtractFeaturesTask(BaseTask):
                 for fname in sorted(fnames):
                     full_path = os.path.join(root, fname)
                     img = image_loader(full_path)
-                    input = load_transforms(self.transforms, self.config)(img).to(
-                        device
-                    )
+                    input = transform(img).to(device)
                     feats = self.model(input.unsqueeze(0))
 
                     # move the features to cpu if not there
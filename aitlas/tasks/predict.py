@@ -2,8 +2,16 @@ import csv
 import logging
 import os
 
+import numpy as np
+
 from ..base import BaseDataset, BaseModel, BaseTask, Configurable
-from ..utils import get_class, image_loader, stringify
+from ..utils import (
+    PREDICTION_WRITERS,
+    SceneReader,
+    get_class,
+    image_loader,
+    stringify,
+)
 from ..visualizations import (
     display_eopatch_predictions,
     display_image_labels,
@@ -28,12 +36,18 @@ class ImageFolderDataset(BaseDataset):
 
         self.data = []
         self.fnames = []
+        # the paths relative to `data_dir` identify the images in the predictions,
+        # images in different subfolders can have the same file name
+        self.relative_paths = []
 
         data_dir = os.path.expanduser(self.data_dir)
         for root, _, fnames in sorted(os.walk(data_dir)):
             for fname in sorted(fnames):
                 self.data.append(os.path.join(root, fname))
                 self.fnames.append(fname)
+                self.relative_paths.append(
+                    os.path.relpath(os.path.join(root, fname), data_dir)
+                )
 
     def __getitem__(self, index):
         img = self.data[index]
@@ -45,6 +59,14 @@ class ImageFolderDataset(BaseDataset):
     def __len__(self):
         return len(self.data)
 
+    def exclude(self, relative_paths):
+        """Remove the images with the given paths, relative to `data_dir`"""
+        excluded = set(relative_paths)
+        kept = [i for i, path in enumerate(self.relative_paths) if path not in excluded]
+        self.data = [self.data[i] for i in kept]
+        self.fnames = [self.fnames[i] for i in kept]
+        self.relative_paths = [self.relative_paths[i] for i in kept]
+
 
 class PredictTask(BaseTask):
     schema = PredictTaskSchema
@@ -78,39 +100,56 @@ class PredictTask(BaseTask):
         # load the model
         self.model.load_model(self.config.model_path)
 
-        # run predictions
-        y_true, y_pred, y_prob = self.model.predict(dataset=test_dataset,)
-
         if self.output_format == "plot":
-            for i, image_path in enumerate(test_dataset.data):
-                plot_path = os.path.join(
-                    self.output_dir, f"{test_dataset.fnames[i]}_plot.png"
-                )
-                # y_true, y_pred, y_prob, labels, file
-                display_image_labels(
-                    image_path,
-                    y_true[i],
-                    y_pred[i],
-                    y_prob[i],
-                    test_dataset.labels,
-                    plot_path,
-                )
+            # run predictions, one batch at a time
+            i = 0
+            for y_true, y_pred, y_prob in self.model.predict_batches(
+                dataset=test_dataset
+            ):
+                for j in range(len(y_prob)):
+                    plot_path = os.path.join(
+                        self.output_dir, f"{test_dataset.fnames[i + j]}_plot.png"
+                    )
+                    # y_true, y_pred, y_prob, labels, file
+                    display_image_labels(
+                        test_dataset.data[i + j],
+                        y_true[j],
+                        y_pred[j],
+                        y_prob[j],
+                        test_dataset.labels,
+                        plot_path,
+                    )
+                i += len(y_prob)
         else:
-            self.export_predictions_to_csv(
-                self.output_file, test_dataset.fnames, y_prob, test_dataset.labels
-            )
-
-    def export_predictions_to_csv(self, file, fnames, probs, labels):
-        with open(file, "w", newline="") as csvfile:
-            fieldnames = ["image"] + labels
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames, delimiter=";")
-            writer.writeheader()
-
-            for i, fname in enumerate(fnames):
-                obj = {label: probs[i][j] for j, label in enumerate(labels)}
-                obj["image"] = fname
+            self.export_predictions(test_dataset)
+
+    def export_predictions(self, dataset):
+        """
+        Runs the predictions and writes them to the output file one batch at a time,
+        so the memory use doesn't grow with the number of images.
+        When resuming, the images which already have predictions are skipped.
+        """
+        writer_class = PREDICTION_WRITERS.get(
+            self.output_format, PREDICTION_WRITERS["csv"]
+        )
+        writer = writer_class(
+            self.output_file, dataset.labels, len(dataset), self.config.resume
+        )
+        try:
+            done = writer.written()
+            if done:
+                size = len(dataset)
+                dataset.exclude(done)
+                logging.info(
+                    f"Resuming predictions, {size - len(dataset)} of {size} images are already in {self.output_file}"
+                )
 
-                writer.writerow(obj)
+            i = 0
+            for _, _, y_prob in self.model.predict_batches(dataset=dataset):
+                writer.write(dataset.relative_paths[i : i + len(y_prob)], y_prob)
+                i += len(y_prob)
+        finally:
+            writer.close()
 
 
 class PredictSegmentationTask(BaseTask):
@@ -142,6 +181,10 @@ class PredictSegmentationTask(BaseTask):
         # load the model
         self.model.load_model(self.config.model_path)
 
+        if self.config.tile_size:
+            self.predict_tiled(test_dataset, batch_size)
+            return
+
         # run predictions
         y_true, y_pred, y_prob = self.model.predict(dataset=test_dataset,)
 
@@ -169,6 +212,52 @@ class PredictSegmentationTask(BaseTask):
                     y_pred[i], test_dataset.labels, base_filepath_name,
                 )
 
+    def predict_tiled(self, dataset, batch_size):
+        """
+        Predicts each image with a sliding window, reading only the windows being predicted.
+        Only the thresholded masks (and the probabilities as uint8 for plots) of the whole image are kept.
+        """
+        for i, image_path in enumerate(dataset.data):
+            reader = SceneReader(image_path)
+            try:
+                shape = (self.model.num_classes, reader.height, reader.width)
+                y_pred = np.zeros(shape, dtype=np.uint8)
+                y_prob = (
+                    np.zeros(shape, dtype=np.uint8)
+                    if self.output_format == "plot"
+                    else None
+                )
+                for row, probs in self.model.predict_tiled(
+                    reader,
+                    dataset.transform,
+                    tile_size=self.config.tile_size,
+                    overlap=self.config.tile_overlap,
+                    batch_size=batch_size,
+                    blending=self.config.tile_blending,
+                    description=f"running tiled prediction for {dataset.fnames[i]}",
+                ):
+                    rows = slice(row, row + probs.shape[1])
+                    y_pred[:, rows] = probs >= self.model.config.threshold
+                    if y_prob is not None:
+                        y_prob[:, rows] = np.rint(probs * 255)
+            finally:
+                reader.close()
+
+            if self.output_format == "plot":
+                plot_path = os.path.join(
+                    self.config.output_dir, f"{dataset.fnames[i]}_plot.png"
+                )
+                display_image_segmentation(
+                    image_path, None, y_pred, y_prob, dataset.labels, plot_path,
+                )
+            else:
+                base_filepath_name = os.path.join(
+                    self.config.output_dir, os.path.splitext(dataset.fnames[i])[0]
+                )
+                save_predicted_masks(
+                    y_pred, dataset.labels, base_filepath_name,
+                )
+
 
 class PredictEOPatchTask(BaseTask):
     schema = PredictTaskSchema
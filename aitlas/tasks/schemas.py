@@ -93,6 +93,14 @@ class TrainTaskSchema(BaseTaskShema):
 
     :param resume_model: File path to the model to be resumed. Default is None.
     :type resume_model: str, optional
+
+    :param train_eval_epochs: Number of epochs between separate evaluations on the train set. Default is None,
+        the train metrics are collected during training.
+    :type train_eval_epochs: int, optional
+
+    :param train_eval_samples: Size of the fixed random subsample of the train set used in the separate evaluation.
+        Default is None (the whole train set).
+    :type train_eval_samples: int, optional
     """
     dataset_config = fields.Nested(
         nested=ObjectConfig,
@@ -119,6 +127,16 @@ class TrainTaskSchema(BaseTaskShema):
         description="File path to the model to be resumed",
         example="/tmp/model/checkpoint.pth.tar",
     )
+    train_eval_epochs = fields.Int(
+        missing=None,
+        description="Number of epochs between separate evaluations on the train set.",
+        example=10,
+    )
+    train_eval_samples = fields.Int(
+        missing=None,
+        description="Size of the train subsample used in the separate evaluation.",
+        example=10000,
+    )
 
 
 class TrainAndEvaluateTaskSchema(BaseTaskShema):
@@ -140,6 +158,14 @@ class TrainAndEvaluateTaskSchema(BaseTaskShema):
     :param resume_model: File path to the model to be resumed. Default is None.
     :type resume_model: str, optional
 
+    :param train_eval_epochs: Number of epochs between separate evaluations on the train set. Default is None,
+        the train metrics are collected during training.
+    :type train_eval_epochs: int, optional
+
+    :param train_eval_samples: Size of the fixed random subsample of the train set used in the separate evaluation.
+        Default is None (the whole train set).
+    :type train_eval_samples: int, optional
+
     :param train_dataset_config: Train dataset type and configuration. This is required.
     :type train_dataset_config: ObjectConfig
 
@@ -166,6 +192,16 @@ class TrainAndEvaluateTaskSchema(BaseTaskShema):
         description="File path to the model to be resumed",
         example="/tmp/model/checkpoint.pth.tar",
     )
+    train_eval_epochs = fields.Int(
+        missing=None,
+        description="Number of epochs between separate evaluations on the train set.",
+        example=10,
+    )
+    train_eval_samples = fields.Int(
+        missing=None,
+        description="Size of the train subsample used in the separate evaluation.",
+        example=10000,
+    )
     train_dataset_config = fields.Nested(
         nested=ObjectConfig,
         required=True,
@@ -277,6 +313,7 @@ class PredictTaskSchema(BaseTaskShema):
     :type output_dir: str, optional
 
     :param output_file: CSV file path where the predictions will be stored. Default is 'predictions.csv'.
+                        For 'parquet' it is a directory of part files, for 'npy' an .npy file.
     :type output_file: str, optional
 
     :param dataset_config: Dataset type and configuration. Default is None.
@@ -291,9 +328,22 @@ class PredictTaskSchema(BaseTaskShema):
     :param transforms: Classes to run transformations. Default is a list of common torchvision transformations.
     :type transforms: List[str], optional
 
-    :param output_format: Whether to output the predictions to CSV or plots. Default is 'plot'.
-                          Must be one of ['plot', 'csv', 'image'].
+    :param output_format: Whether to output the predictions to CSV, Parquet, NPY or plots. Default is 'plot'.
+                          Must be one of ['plot', 'csv', 'parquet', 'npy', 'image'].
     :type output_format: str, optional
+
+    :param resume: Whether to keep the predictions already in the output file and skip their images. Default is False.
+    :type resume: bool, optional
+
+    :param tile_size: Size of the sliding window for predicting large images in tiles. Default is None (whole images).
+    :type tile_size: int, optional
+
+    :param tile_overlap: Overlap between neighbouring windows in pixels. Default is 128.
+    :type tile_overlap: int, optional
+
+    :param tile_blending: How the overlapping windows are blended. Default is 'gaussian'.
+                          Must be one of ['gaussian', 'uniform'].
+    :type tile_blending: str, optional
     """
     data_dir = fields.String(
         required=True,
@@ -311,7 +361,8 @@ class PredictTaskSchema(BaseTaskShema):
     )
     output_file = fields.String(
         missing="predictions.csv",
-        description="CSV file path where the predictions will be stored",
+        description="CSV file path where the predictions will be stored. "
+        "A directory of part files for parquet, an .npy file for npy.",
     )
     dataset_config = fields.Nested(
         missing=None,
@@ -336,8 +387,28 @@ class PredictTaskSchema(BaseTaskShema):
     )
     output_format = fields.String(
         missing="plot",
-        description="Whether to output the predictions to csv or plots",
-        validate=validate.OneOf(["plot", "csv", "image"]),
+        description="Whether to output the predictions to csv, parquet, npy or plots",
+        validate=validate.OneOf(["plot", "csv", "parquet", "npy", "image"]),
+    )
+    resume = fields.Bool(
+        missing=False,
+        description="Whether to keep the predictions already in the output file and skip their images",
+    )
+    tile_size = fields.Int(
+        missing=None,
+        description="Size of the sliding window for predicting large images in tiles",
+        validate=validate.Range(min=1),
+        example=512,
+    )
+    tile_overlap = fields.Int(
+        missing=128,
+        description="Overlap between neighbouring windows in pixels",
+        validate=validate.Range(min=0),
+    )
+    tile_blending = fields.String(
+        missing="gaussian",
+        description="How the overlapping windows are blended",
+        validate=validate.OneOf(["gaussian", "uniform"]),
     )
 
 
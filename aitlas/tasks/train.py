@@ -31,6 +31,8 @@ class TrainTask(BaseTask):
             resume_model=self.config.resume_model,
             run_id=self.id,
             iterations_log=self.config.iterations_log,
+            train_eval_epochs=self.config.train_eval_epochs,
+            train_eval_samples=self.config.train_eval_samples,
             metrics=self.model.metrics,
         )
 
@@ -55,6 +57,8 @@ class TrainAndEvaluateTask(BaseTask):
             resume_model=self.config.resume_model,
             run_id=self.id,
             iterations_log=self.config.iterations_log,
+            train_eval_epochs=self.config.train_eval_epochs,
+            train_eval_samples=self.config.train_eval_samples,
             metrics=self.model.metrics,
         )
 
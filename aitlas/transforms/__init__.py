@@ -1,3 +1,4 @@
+from .batch import *
 from .big_earth_net import *
 from .breizhcrops import *
 from .classification import *
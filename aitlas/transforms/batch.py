@@ -0,0 +1,198 @@
+"""
+Contains classes for transformations of whole batches of images, applied after collation.
+
+The datasets only decode the images in the data loader workers and the batch is augmented at once,
+with vectorized tensor operations, instead of one image at a time. Set them as `batch_transforms`
+in the dataset config, starting with `BatchChannelsFirst`. Cropping and flipping are cheapest on
+the uint8 images, before `BatchToFloat`, for example
+["aitlas.transforms.BatchChannelsFirst", "aitlas.transforms.BatchRandomCrop",
+"aitlas.transforms.BatchRandomFlipHV", "aitlas.transforms.BatchToFloat", "aitlas.transforms.BatchNormalize"].
+Resizing and color jittering work on float images. The datasets with `decode_to_float` already
+return float images of shape (channels, height, width), scaled to 0-1.
+"""
+import math
+
+import torch
+import torch.nn.functional as F
+
+from ..base import BaseTransforms
+
+
+class BatchChannelsFirst(BaseTransforms):
+    """
+    Views a batch of decoded images of shape (batch, height, width, channels) as (batch, channels, height, width),
+    without copying or converting them
+    """
+
+    def __call__(self, images):
+        """
+        :param images: batch of images, of shape (batch, height, width, channels) or (batch, height, width)
+        :type images: torch.Tensor
+        :return: batch of images of shape (batch, channels, height, width)
+        :rtype: torch.Tensor
+        """
+        images = torch.as_tensor(images)
+        if images.dim() == 3:  # grayscale
+            images = images[..., None]
+        return images.permute(0, 3, 1, 2)
+
+
+class BatchToFloat(BaseTransforms):
+    """Converts a batch of images to float, scaling the uint8 images to 0-1 like `ToTensor`"""
+
+    def __call__(self, images):
+        if images.dtype == torch.uint8:
+            return images.contiguous().float().div_(255)
+        return images.float()
+
+
+class BatchResize(BaseTransforms):
+    """
+    Resizes a batch of images so that their shorter side is `size`, like `Resize(256)`, bilinear and
+    antialiased like `Resize` of tensors
+    """
+
+    size = 256
+
+    def __call__(self, images):
+        height, width = images.shape[-2:]
+        if height <= width:
+            size = (self.size, int(self.size * width / height))
+        else:
+            size = (int(self.size * height / width), self.size)
+        if size == (height, width):
+            return images
+        return F.interpolate(
+            images, size=size, mode="bilinear", align_corners=False, antialias=True
+        )
+
+
+class BatchCenterCrop(BaseTransforms):
+    """Crops the center of a batch of images to `size` x `size`"""
+
+    size = 224
+
+    def __call__(self, images):
+        height, width = images.shape[-2:]
+        top = (height - self.size) // 2
+        left = (width - self.size) // 2
+        return images[..., top : top + self.size, left : left + self.size]
+
+
+class BatchRandomCrop(BaseTransforms):
+    """Crops each image of a batch to `size` x `size` at its own random position"""
+
+    size = 224
+
+    def __call__(self, images):
+        batch, channels, height, width = images.shape
+        top = torch.randint(0, height - self.size + 1, (batch,), device=images.device)
+        left = torch.randint(0, width - self.size + 1, (batch,), device=images.device)
+
+        # view of all the crops of each image, of shape (batch, channels, rows, columns, size, size),
+        # from which the crop of each image is gathered at once
+        windows = images.unfold(2, self.size, 1).unfold(3, self.size, 1)
+        return windows[torch.arange(batch, device=images.device), :, top, left]
+
+
+class BatchRandomResizedCrop(BaseTransforms):
+    """
+    Crops a random area of each image of a batch, with a random aspect ratio, and resizes it to
+    `size` x `size`, like `RandomResizedCrop`. The crops are sampled together with a single bilinear
+    `grid_sample`, without antialiasing.
+    """
+
+    size = 224
+    scale = (0.08, 1.0)
+    ratio = (3.0 / 4.0, 4.0 / 3.0)
+
+    def __call__(self, images):
+        batch, channels, height, width = images.shape
+
+        # area and aspect ratio of each crop, as fractions of the image size
+        area = torch.empty(batch).uniform_(*self.scale) * height * width
+        log_ratio = torch.empty(batch).uniform_(
+            math.log(self.ratio[0]), math.log(self.ratio[1])
+        )
+        crop_width = torch.sqrt(area * torch.exp(log_ratio)).clamp(max=width) / width
+        crop_height = torch.sqrt(area / torch.exp(log_ratio)).clamp(max=height) / height
+
+        # centers of the crops, in the [-1, 1] coordinates of grid_sample
+        center_x = (torch.rand(batch) * (1 - crop_width) + crop_width / 2) * 2 - 1
+        center_y = (torch.rand(batch) * (1 - crop_height) + crop_height / 2) * 2 - 1
+
+        theta = torch.zeros(batch, 2, 3)
+        theta[:, 0, 0] = crop_width
+        theta[:, 0, 2] = center_x
+        theta[:, 1, 1] = crop_height
+        theta[:, 1, 2] = center_y
+        grid = F.affine_grid(
+            theta.to(images.device, images.dtype),
+            (batch, channels, self.size, self.size),
+            align_corners=False,
+        )
+        return F.grid_sample(
+            images, grid, mode="bilinear", padding_mode="border", align_corners=False
+        )
+
+
+class BatchRandomFlipHV(BaseTransforms):
+    """Flips each image of a batch horizontally and vertically, each with probability 0.5"""
+
+    def __call__(self, images):
+        batch = images.shape[0]
+        for dim in [-1, -2]:
+            flip = torch.rand(batch, device=images.device) < 0.5
+            images = torch.where(flip[:, None, None, None], images.flip(dim), images)
+        return images
+
+
+class BatchColorJitter(BaseTransforms):
+    """
+    Randomly changes the brightness, contrast and saturation of each image of a batch of images
+    scaled to 0-1, in place. The factors are sampled uniformly from [1 - value, 1 + value] for each image.
+    """
+
+    brightness = 0.2
+    contrast = 0.2
+    saturation = 0.2
+
+    def factors(self, images, value):
+        return torch.empty(images.shape[0], 1, 1, 1, device=images.device).uniform_(
+            1 - value, 1 + value
+        )
+
+    def grayscale_weights(self, images):
+        channels = images.shape[1]
+        if channels == 3:
+            return [0.299, 0.587, 0.114]
+        return [1 / channels] * channels
+
+    def __call__(self, images):
+        weights = self.grayscale_weights(images)
+        if self.brightness:
+            images.mul_(self.factors(images, self.brightness))
+        if self.contrast:
+            factor = self.factors(images, self.contrast)
+            mean = images.mean((2, 3)) @ images.new_tensor(weights)
+            images.mul_(factor).add_((1 - factor) * mean[:, None, None, None])
+        if self.saturation:
+            factor = self.factors(images, self.saturation)
+            # weighted sum of the channels, one channel at a time
+            gray = images[:, :1] * weights[0]
+            for channel in range(1, len(weights)):
+                gray.add_(images[:, channel : channel + 1], alpha=weights[channel])
+            images.mul_(factor).addcmul_(1 - factor, gray)
+        return images.clamp_(0, 1)
+
+
+class BatchNormalize(BaseTransforms):
+    """Normalizes a batch of images with the ImageNet mean and standard deviation, in place"""
+
+    mean = [0.485, 0.456, 0.406]
+    std = [0.229, 0.224, 0.225]
+
+    def __call__(self, images):
+        mean = images.new_tensor(self.mean)[None, :, None, None]
+        std = images.new_tensor(self.std)[None, :, None, None]
+        return images.sub_(mean).div_(std)
@@ -0,0 +1,185 @@
+"""
+Microbenchmark of the per-sample overhead of the transformation classes.
+
+Each class exported by `aitlas.transforms` is constructed once, like `load_transforms` does, and called
+repeatedly on synthetic samples of the kind it expects. Run it with
+
+    python -m aitlas.transforms.benchmark [--repeats 50] [--classes ClassName ...]
+"""
+
+import argparse
+import inspect
+import time
+
+import numpy as np
+import torch
+
+from .. import transforms as aitlas_transforms
+from ..base import BaseTransforms
+from ..utils import pad_time_series
+
+
+# values of the configurable parameters, for the classes which need them
+CONFIGURABLES = {
+    "level": "L2A",
+    "bands10_mean": [0.5, 0.5, 0.5],
+    "bands10_std": [0.25, 0.25, 0.25],
+    "bands20_mean": [0.5] * 6,
+    "bands20_std": [0.25] * 6,
+}
+
+BATCH_SIZE = 32
+
+
+def image(rng):
+    return rng.integers(0, 256, (256, 256, 3), dtype=np.uint8)
+
+
+SAMPLES = {
+    "image": image,
+    "image and mask": lambda rng: (
+        image(rng),
+        rng.integers(0, 2, (256, 256), dtype=np.uint8),
+    ),
+    "image and boxes": lambda rng: (
+        image(rng),
+        {"boxes": [[16.0, 16.0, 128.0, 128.0]], "labels": [1]},
+    ),
+    "channels first image": lambda rng: rng.integers(
+        0, 256, (4, 120, 120), dtype=np.uint8
+    ),
+    "spacenet6 image and mask": lambda rng: {
+        "image": rng.random((900, 900, 4), dtype=np.float32),
+        "mask": rng.random((900, 900, 3), dtype=np.float32),
+    },
+    "time series": lambda rng: (rng.random((60, 16)) * 1e4, 1),
+    "bigearthnet bands": lambda rng: (
+        rng.random((120, 120, 4), dtype=np.float32),
+        rng.random((60, 60, 6), dtype=np.float32),
+        np.zeros(19, dtype=np.float32),
+    ),
+    "bigearthnet band tensors": lambda rng: (
+        torch.rand(4, 120, 120),
+        torch.rand(6, 60, 60),
+        np.zeros(19, dtype=np.float32),
+    ),
+    # batches, the overhead is reported per sample of the batch
+    "time series batch": lambda rng: pad_time_series(
+        [
+            (rng.random((int(rng.integers(20, 80)), 16)) * 1e4, 1)
+            for _ in range(BATCH_SIZE)
+        ]
+    ),
+    "uint8 image batch": lambda rng: torch.from_numpy(
+        rng.integers(0, 256, (BATCH_SIZE, 256, 256, 3), dtype=np.uint8)
+    ),
+    "uint8 channels first batch": lambda rng: torch.from_numpy(
+        rng.integers(0, 256, (BATCH_SIZE, 3, 256, 256), dtype=np.uint8)
+    ),
+    "float image batch": lambda rng: torch.rand(BATCH_SIZE, 3, 256, 256),
+}
+
+BATCHES = [
+    "time series batch",
+    "uint8 image batch",
+    "uint8 channels first batch",
+    "float image batch",
+]
+
+# kind of sample of the classes which don't take a single image
+SAMPLE_KINDS = {
+    "FlipHVRandomRotate": "image and mask",
+    "FlipHVToTensorV2": "image and boxes",
+    "ResizeToTensorV2": "image and boxes",
+    "ResizePerChannelToTensor": "channels first image",
+    "SpaceNet6Transforms": "spacenet6 image and mask",
+    "SelectBands": "time series",
+    "SelectBandsBatch": "time series batch",
+    "SelectBandsVariableLength": "time series batch",
+    "ToTensorAllBands": "bigearthnet bands",
+    "NormalizeAllBands": "bigearthnet band tensors",
+    "BatchChannelsFirst": "uint8 image batch",
+    "BatchToFloat": "uint8 channels first batch",
+    "BatchRandomCrop": "uint8 channels first batch",
+    "BatchRandomFlipHV": "uint8 channels first batch",
+    "BatchResize": "float image batch",
+    "BatchCenterCrop": "float image batch",
+    "BatchRandomResizedCrop": "float image batch",
+    "BatchColorJitter": "float image batch",
+    "BatchNormalize": "float image batch",
+}
+
+
+def transform_classes():
+    """Returns the transformation classes exported by `aitlas.transforms`, by name"""
+    return {
+        name: cls
+        for name, cls in sorted(vars(aitlas_transforms).items())
+        if inspect.isclass(cls)
+        and issubclass(cls, BaseTransforms)
+        and cls is not BaseTransforms
+    }
+
+
+def construct(cls):
+    """Constructs a transformation like `load_transforms`, with the configurable parameters"""
+    if getattr(cls, "configurables", None):
+        return cls(**{key: CONFIGURABLES[key] for key in cls.configurables})
+    return cls()
+
+
+def benchmark(cls, repeats=50, seed=0):
+    """
+    Measures the time of calling a transformation on synthetic samples
+
+    :param cls: transformation class
+    :param repeats: number of calls
+    :param seed: seed of the synthetic samples
+    :return: tuple of (sample kind, microseconds per sample)
+    :rtype: tuple
+    """
+    kind = SAMPLE_KINDS.get(cls.__name__, "image")
+    rng = np.random.default_rng(seed)
+    # the samples are created beforehand, some transformations modify them in place
+    samples = [SAMPLES[kind](rng) for _ in range(repeats + 1)]
+    transform = construct(cls)
+
+    transform(samples[0])  # warm up
+    start = time.perf_counter()
+    for sample in samples[1:]:
+        transform(sample)
+    elapsed = time.perf_counter() - start
+
+    per_call = elapsed / repeats
+    if kind in BATCHES:
+        per_call /= BATCH_SIZE
+    return kind, per_call * 1e6
+
+
+def main(repeats=50, classes=None):
+    classes = classes or list(transform_classes())
+    width = max(len(name) for name in classes)
+    print(f"{'transformation':<{width}}  {'input':<26}  {'us/sample':>10}")
+    for name, cls in transform_classes().items():
+        if name not in classes:
+            continue
+        try:
+            kind, micros = benchmark(cls, repeats)
+            print(f"{name:<{width}}  {kind:<26}  {micros:>10.1f}")
+        except Exception as e:
+            print(f"{name:<{width}}  failed: {type(e).__name__}: {e}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Reports the per-sample overhead of the transformation classes."
+    )
+    parser.add_argument(
+        "--repeats", type=int, default=50, help="Number of calls per transformation."
+    )
+    parser.add_argument(
+        "--classes", nargs="*", help="Names of the transformations, all by default."
+    )
+    args = parser.parse_args()
+
+    main(repeats=args.repeats, classes=args.classes)
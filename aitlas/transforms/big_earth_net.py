@@ -26,6 +26,11 @@ class ResizeToTensorNormalizeRGB(BaseTransforms):
 
         self.bands10_mean = kwargs["bands10_mean"]
         self.bands10_std = kwargs["bands10_std"]
+        self.data_transforms = transforms.Compose([
+            transforms.ToTensor(),  # transform the image from H x W x C to C x H x W
+            transforms.Resize((224, 224)),
+            transforms.Normalize(self.bands10_mean, self.bands10_std)
+        ])
 
     def __call__(self, sample):
         """
@@ -36,12 +41,7 @@ class ResizeToTensorNormalizeRGB(BaseTransforms):
         :return: Transformed image
         :rtype: torch.Tensor
         """
-        data_transforms = transforms.Compose([
-            transforms.ToTensor(),  # transform the image from H x W x C to C x H x W
-            transforms.Resize((224, 224)),
-            transforms.Normalize(self.bands10_mean, self.bands10_std)
-        ])
-        return data_transforms(sample)
+        return self.data_transforms(sample)
 
 
 class ToTensorResizeRandomCropFlipHV(BaseTransforms):
@@ -51,6 +51,13 @@ class ToTensorResizeRandomCropFlipHV(BaseTransforms):
     """
     def __init__(self, *args, **kwargs):
         super().__init__(self, *args, **kwargs)
+        self.data_transforms = transforms.Compose([
+            transforms.ToTensor(),  # transform the image from H x W x C to C x H x W
+            transforms.Resize((256, 256)),
+            transforms.RandomCrop(224),
+            transforms.RandomHorizontalFlip(),
+            transforms.RandomVerticalFlip(),
+        ])
 
     def __call__(self, sample):
         """
@@ -61,15 +68,7 @@ class ToTensorResizeRandomCropFlipHV(BaseTransforms):
         :return: Transformed image
         :rtype: torch.Tensor
         """
-        data_transforms = transforms.Compose([
-            transforms.ToTensor(),  # transform the image from H x W x C to C x H x W
-            transforms.Resize((256, 256)),
-            transforms.RandomCrop(224),
-            transforms.RandomHorizontalFlip(),
-            transforms.RandomVerticalFlip(),
-        ])
-
-        return data_transforms(sample)
+        return self.data_transforms(sample)
 
 
 class ToTensorResizeCenterCrop(BaseTransforms):
@@ -79,6 +78,11 @@ class ToTensorResizeCenterCrop(BaseTransforms):
     """
     def __init__(self, *args, **kwargs):
         super().__init__(self, *args, **kwargs)
+        self.data_transforms = transforms.Compose([
+            transforms.ToTensor(),  # transform the image from H x W x C to C x H x W
+            transforms.Resize((256, 256)),
+            transforms.CenterCrop(224),
+        ])
 
     def __call__(self, sample):
         """
@@ -89,13 +93,7 @@ class ToTensorResizeCenterCrop(BaseTransforms):
         :return: Transformed image
         :rtype: torch.Tensor
         """
-        data_transforms = transforms.Compose([
-            transforms.ToTensor(),  # transform the image from H x W x C to C x H x W
-            transforms.Resize((256, 256)),
-            transforms.CenterCrop(224),
-        ])
-
-        return data_transforms(sample)
+        return self.data_transforms(sample)
 
 
 class ToTensorResize(BaseTransforms):
@@ -105,6 +103,10 @@ class ToTensorResize(BaseTransforms):
     """
     def __init__(self, *args, **kwargs):
         super().__init__(self, *args, **kwargs)
+        self.data_transforms = transforms.Compose([
+            transforms.ToTensor(),  # transform the image from H x W x C to C x H x W
+            transforms.Resize((224, 224)),
+        ])
 
     def __call__(self, sample):
         """
@@ -115,11 +117,7 @@ class ToTensorResize(BaseTransforms):
         :return: Transformed image
         :rtype: torch.Tensor
         """
-        data_transforms = transforms.Compose([
-            transforms.ToTensor(),  # transform the image from H x W x C to C x H x W
-            transforms.Resize((224, 224)),
-        ])
-        return data_transforms(sample)
+        return self.data_transforms(sample)
 
 
 class NormalizeAllBands(BaseTransforms):
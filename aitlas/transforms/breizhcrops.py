@@ -174,3 +174,73 @@ class SelectBands(BaseTransforms):
         return torch.from_numpy(x).type(torch.FloatTensor), torch.tensor(
             y, dtype=torch.long
         )
+
+
+class SelectBandsBatch(SelectBands):
+    """
+    Batched version of SelectBands, applied to a whole padded batch of time series at once.
+    To be used as a batch transformation of the crops datasets.
+    """
+
+    def __call__(self, batch):
+        """
+        Select the bands, scale them and sample `sequencelength` time steps of each time series,
+        with replacement for the time series which are shorter.
+
+        :param batch: time series of shape (batch, time, bands), mask of the observed time steps
+                      of shape (batch, time) and targets
+        :type batch: tuple
+        :return: time series of shape (batch, sequencelength, selected bands), mask and targets
+        :rtype: tuple
+        """
+        x, mask, y = batch
+        size, time = mask.shape
+        lengths = mask.sum(1)
+
+        # choose selected bands and scale reflectances to 0-1
+        x = (x[:, :, torch.as_tensor(self.selected_band_idxs)] * 1e-4).float()
+        if time == 0:  # only empty time series, sampled from a single padded step
+            x = x.new_zeros(size, 1, x.shape[2])
+
+        # with replacement: uniform positions within each time series
+        idxs = (torch.rand(size, self.sequencelength) * lengths[:, None]).long()
+        if time >= self.sequencelength:
+            # without replacement: the observed steps with the smallest random keys
+            keys = torch.rand(size, time).masked_fill_(~mask, 2.0)
+            unique_idxs = keys.topk(self.sequencelength, dim=1, largest=False).indices
+            replace = lengths < self.sequencelength
+            idxs = torch.where(replace[:, None], idxs, unique_idxs)
+        idxs = idxs.sort(dim=1).values
+
+        x = torch.gather(x, 1, idxs[:, :, None].expand(-1, -1, x.shape[2]))
+        mask = torch.ones(size, self.sequencelength, dtype=torch.bool)
+        return x, mask, torch.as_tensor(y, dtype=torch.long)
+
+
+class SelectBandsVariableLength(SelectBands):
+    """
+    Batched band selection which keeps the time series at their own lengths, for the models
+    taking padded time series with their mask. To be used as a batch transformation of the
+    crops datasets with `variable_length` enabled.
+    """
+
+    def __call__(self, batch):
+        """
+        Select the bands and scale them, the padded time steps are kept as they are.
+
+        :param batch: time series of shape (batch, time, bands), mask of the observed time steps
+                      of shape (batch, time) and targets
+        :type batch: tuple
+        :return: time series of shape (batch, time, selected bands), mask and targets
+        :rtype: tuple
+        """
+        x, mask, y = batch
+
+        # choose selected bands and scale reflectances to 0-1
+        x = (x[:, :, torch.as_tensor(self.selected_band_idxs)] * 1e-4).float()
+        # only empty time series, represented by a single padded step
+        if mask.shape[1] == 0:
+            x = x.new_zeros(x.shape[0], 1, x.shape[2])
+            mask = mask.new_zeros(mask.shape[0], 1)
+
+        return x, mask, torch.as_tensor(y, dtype=torch.long)
@@ -13,16 +13,9 @@ class ResizeRandomCropFlipHVToTensor(BaseTransforms):
     A class that applies resizing to (256,256), random cropping to size (224,224), random flipping, and tensor conversion to images.
     
     """
-    def __call__(self, sample):
-        """
-        Apply the transformation to the input sample.
-
-        :param sample: Input image
-        :type sample: numpy.ndarray
-        :return: Transformed image
-        :rtype: torch.Tensor
-        """
-        data_transforms = transforms.Compose([
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = transforms.Compose([
             transforms.ToPILImage(),
             transforms.Resize(256),
             transforms.RandomCrop(224),
@@ -31,14 +24,6 @@ class ResizeRandomCropFlipHVToTensor(BaseTransforms):
             transforms.ToTensor(),  # transform the image from H x W x C to C x H x W
         ])
 
-        return data_transforms(sample)
-
-
-class ResizeCenterCropFlipHVToTensor(BaseTransforms):
-    """
-    A class that applies resizing to (256,256), center cropping to size (224,224), random HV flipping, and tensor conversion to images.
-    
-    """
     def __call__(self, sample):
         """
         Apply the transformation to the input sample.
@@ -48,7 +33,17 @@ class ResizeCenterCropFlipHVToTensor(BaseTransforms):
         :return: Transformed image
         :rtype: torch.Tensor
         """
-        data_transforms = transforms.Compose([
+        return self.data_transforms(sample)
+
+
+class ResizeCenterCropFlipHVToTensor(BaseTransforms):
+    """
+    A class that applies resizing to (256,256), center cropping to size (224,224), random HV flipping, and tensor conversion to images.
+    
+    """
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = transforms.Compose([
             transforms.ToPILImage(),
             transforms.Resize(256),
             transforms.CenterCrop(224),
@@ -57,7 +52,16 @@ class ResizeCenterCropFlipHVToTensor(BaseTransforms):
             transforms.ToTensor(),  # transform the image from H x W x C to C x H x W
         ])
 
-        return data_transforms(sample)
+    def __call__(self, sample):
+        """
+        Apply the transformation to the input sample.
+
+        :param sample: Input image
+        :type sample: numpy.ndarray
+        :return: Transformed image
+        :rtype: torch.Tensor
+        """
+        return self.data_transforms(sample)
 
 
 class ResizeCenterCropToTensor(BaseTransforms):
@@ -65,6 +69,15 @@ class ResizeCenterCropToTensor(BaseTransforms):
     A class that applies resizing to (256,256), center cropping to size (224,224), and tensor conversion to images.
     
     """
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = transforms.Compose([
+            transforms.ToPILImage(),
+            transforms.Resize(256),
+            transforms.CenterCrop(224),
+            transforms.ToTensor(),
+        ])
+
     def __call__(self, sample):
         """
         Apply the transformation to the input sample.
@@ -74,14 +87,7 @@ class ResizeCenterCropToTensor(BaseTransforms):
         :return: Transformed image
         :rtype: torch.Tensor
         """
-        data_transforms = transforms.Compose([
-            transforms.ToPILImage(),
-            transforms.Resize(256),
-            transforms.CenterCrop(224),
-            transforms.ToTensor(),
-        ])
-
-        return data_transforms(sample)
+        return self.data_transforms(sample)
 
 
 class Resize1ToTensor(BaseTransforms):
@@ -89,14 +95,16 @@ class Resize1ToTensor(BaseTransforms):
     A class that applies fixed resizing to (224,224) and tensor conversion to images.
     
     """
-    def __call__(self, sample):
-        data_transforms = transforms.Compose([
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = transforms.Compose([
             transforms.ToPILImage(),
             transforms.Resize((224, 224)),
             transforms.ToTensor(),
         ])
 
-        return data_transforms(sample)
+    def __call__(self, sample):
+        return self.data_transforms(sample)
 
 
 class GrayToRGB(BaseTransforms):
@@ -117,6 +125,15 @@ class ConvertToRGBResizeCenterCropToTensor(BaseTransforms):
     A class that converts an image to RGB format, applies resizing to size (256,256), center cropping to size (224,224), and tensor conversion.
     
     """
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = transforms.Compose([
+            transforms.ToPILImage(),
+            transforms.Resize(256),
+            transforms.CenterCrop(224),
+            transforms.ToTensor(),
+        ])
+
     def __call__(self, sample):
         """
         Apply the transformation to the input sample.
@@ -127,14 +144,7 @@ class ConvertToRGBResizeCenterCropToTensor(BaseTransforms):
         :rtype: torch.Tensor
         """
         sample = sample[:, :, :3]
-        data_transforms = transforms.Compose([
-            transforms.ToPILImage(),
-            transforms.Resize(256),
-            transforms.CenterCrop(224),
-            transforms.ToTensor(),
-        ])
-
-        return data_transforms(sample)
+        return self.data_transforms(sample)
 
 
 class RandomFlipHVToTensor(BaseTransforms):
@@ -142,6 +152,15 @@ class RandomFlipHVToTensor(BaseTransforms):
     A class that applies random flipping and tensor conversion to images.
     
     """
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = transforms.Compose([
+            transforms.ToPILImage(),
+            transforms.RandomHorizontalFlip(),
+            transforms.RandomVerticalFlip(),
+            transforms.ToTensor(),  # transform the image from H x W x C to C x H x W
+        ])
+
     def __call__(self, sample):
         """
         Apply the transformation to the input sample.
@@ -151,14 +170,7 @@ class RandomFlipHVToTensor(BaseTransforms):
         :return: Transformed image
         :rtype: torch.Tensor
         """
-        data_transforms = transforms.Compose([
-            transforms.ToPILImage(),
-            transforms.RandomHorizontalFlip(),
-            transforms.RandomVerticalFlip(),
-            transforms.ToTensor(),  # transform the image from H x W x C to C x H x W
-        ])
-
-        return data_transforms(sample)
+        return self.data_transforms(sample)
 
 
 class ComplexTransform(BaseTransforms):
@@ -177,16 +189,9 @@ class ComplexTransform(BaseTransforms):
     
     """
 
-    def __call__(self, sample):
-        """
-        Apply the transformation to the input sample.
-
-        :param sample: Input image
-        :type sample: numpy.ndarray
-        :return: Transformed image
-        :rtype: torch.Tensor
-        """
-        data_transforms = A.Compose([
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = A.Compose([
             #A.Transpose(p=0.5),
             A.VerticalFlip(p=0.5),
             A.HorizontalFlip(p=0.5),
@@ -213,7 +218,17 @@ class ComplexTransform(BaseTransforms):
             #A.Normalize()
             #ToTensorV2(p=1.0)
         ])
-        transformed = data_transforms(image=sample)
+
+    def __call__(self, sample):
+        """
+        Apply the transformation to the input sample.
+
+        :param sample: Input image
+        :type sample: numpy.ndarray
+        :return: Transformed image
+        :rtype: torch.Tensor
+        """
+        transformed = self.data_transforms(image=sample)
         transformed = torch.tensor(transformed["image"].transpose(2, 0, 1), dtype=torch.float32) / 255.0
         return transformed
 
@@ -13,19 +13,9 @@ class FlipHVRandomRotate(BaseTransforms):
     A class that applies flipping, random rotation, and shift-scale-rotation transformations to image and mask pairs.
   
     """
-    def __call__(self, sample):
-        """
-        Apply the transformation to the input sample.
-
-        :param sample: Tuple of input image and mask
-        :type sample: tuple
-        :return: Transformed image and mask
-        :rtype: tuple
-        """
-        image, mask = sample
-        image = np.asarray(image)
-        mask = np.asarray(mask)
-        data_transforms = A.Compose(
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = A.Compose(
             [
                 A.HorizontalFlip(),
                 A.VerticalFlip(),
@@ -39,7 +29,20 @@ class FlipHVRandomRotate(BaseTransforms):
                 ),
             ]
         )
-        transformed = data_transforms(image=image, mask=mask)
+
+    def __call__(self, sample):
+        """
+        Apply the transformation to the input sample.
+
+        :param sample: Tuple of input image and mask
+        :type sample: tuple
+        :return: Transformed image and mask
+        :rtype: tuple
+        """
+        image, mask = sample
+        image = np.asarray(image)
+        mask = np.asarray(mask)
+        transformed = self.data_transforms(image=image, mask=mask)
 
         return transformed["image"], transformed["mask"]
 
@@ -50,6 +53,18 @@ class FlipHVToTensorV2(BaseTransforms):
     
     """
 
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = A.Compose(
+            [
+                A.Resize(480, 480),
+                A.HorizontalFlip(0.5),
+                A.VerticalFlip(0.5),
+                ToTensorV2(p=1.0),
+            ],
+            bbox_params={"format": "pascal_voc", "label_fields": ["labels"]},
+        )
+
     def __call__(self, sample):
         """
         Apply the transformation to the input sample.
@@ -60,17 +75,7 @@ class FlipHVToTensorV2(BaseTransforms):
         :rtype: tuple
         """
         image, target = sample
-        data_transforms = A.Compose(
-            [
-                A.Resize(480, 480),
-                A.HorizontalFlip(0.5),
-                A.VerticalFlip(0.5),
-                ToTensorV2(p=1.0),
-            ],
-            bbox_params={"format": "pascal_voc", "label_fields": ["labels"]},
-        )
-
-        transformed = data_transforms(
+        transformed = self.data_transforms(
             image=image, bboxes=target["boxes"], labels=target["labels"]
         )
         target["boxes"] = torch.Tensor(transformed["bboxes"])
@@ -83,6 +88,13 @@ class ResizeToTensorV2(BaseTransforms):
     A class that applies resizing and tensor conversion to images with bounding boxes and labels.
     
     """
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = A.Compose(
+            [A.Resize(480, 480), ToTensorV2(p=1.0)],
+            bbox_params={"format": "pascal_voc", "label_fields": ["labels"]},
+        )
+
     def __call__(self, sample):
         """
         Apply the transformation to the input sample.
@@ -93,12 +105,7 @@ class ResizeToTensorV2(BaseTransforms):
         :rtype: tuple
         """
         image, target = sample
-        data_transforms = A.Compose(
-            [A.Resize(480, 480), ToTensorV2(p=1.0)],
-            bbox_params={"format": "pascal_voc", "label_fields": ["labels"]},
-        )
-
-        transformed = data_transforms(
+        transformed = self.data_transforms(
             image=image, bboxes=target["boxes"], labels=target["labels"]
         )
         target["boxes"] = torch.Tensor(transformed["bboxes"])
@@ -110,6 +117,10 @@ class Resize(BaseTransforms):
     """
     A class that applies resizing to images.
     """
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = A.Compose([A.Resize(480, 480)])
+
     def __call__(self, sample):
         """
         Apply the transformation to the input sample.
@@ -119,8 +130,6 @@ class Resize(BaseTransforms):
         :return: Transformed image
         :rtype: numpy.ndarray
         """
-        data_transforms = A.Compose([A.Resize(480, 480)])
-
-        transformed = data_transforms(image=sample)
+        transformed = self.data_transforms(image=sample)
 
         return transformed["image"]
@@ -66,6 +66,12 @@ class Pad(BaseTransforms):
     Applies padding to a given sample.
     """
 
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = transforms.Compose(
+            [transforms.ToPILImage(), transforms.Pad(4), transforms.ToTensor()]
+        )
+
     def __call__(self, sample):
         """
         Applies padding to a given sample.
@@ -75,10 +81,7 @@ class Pad(BaseTransforms):
         :return: padded tensor
         :rtype: tensor
         """
-        data_transforms = transforms.Compose(
-            [transforms.ToPILImage(), transforms.Pad(4), transforms.ToTensor()]
-        )
-        return data_transforms(sample)
+        return self.data_transforms(sample)
 
 
 class ColorTransformations(BaseTransforms):
@@ -86,6 +89,21 @@ class ColorTransformations(BaseTransforms):
     Applies a set of color transformations to a given sample.
     """
 
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = A.Compose(
+            [
+                A.OneOf(
+                    [
+                        A.HueSaturationValue(10, 15, 10),
+                        A.CLAHE(clip_limit=2),
+                        A.RandomBrightnessContrast(),
+                    ],
+                    p=0.3,
+                ),
+            ]
+        )
+
     def __call__(self, sample):
         """
         Applies color transformations to the given sample with a probability of 0.3. These include:
@@ -99,19 +117,7 @@ class ColorTransformations(BaseTransforms):
         :rtype: tensor
         """
         sample = np.asarray(sample)
-        data_transforms = A.Compose(
-            [
-                A.OneOf(
-                    [
-                        A.HueSaturationValue(10, 15, 10),
-                        A.CLAHE(clip_limit=2),
-                        A.RandomBrightnessContrast(),
-                    ],
-                    p=0.3,
-                ),
-            ]
-        )
-        return data_transforms(image=sample)["image"]
+        return self.data_transforms(image=sample)["image"]
 
 
 class ResizeToTensor(BaseTransforms):
@@ -120,6 +126,16 @@ class ResizeToTensor(BaseTransforms):
 
     """
 
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = transforms.Compose(
+            [
+                transforms.ToPILImage(),
+                transforms.Resize((256, 256)),
+                transforms.ToTensor(),
+            ]
+        )
+
     def __call__(self, sample):
         """
         Resizes and converts the given sample to a tensor.
@@ -128,7 +144,13 @@ class ResizeToTensor(BaseTransforms):
         :type sample: tensor
         :return: resized tensor
         """
-        data_transforms = transforms.Compose(
+        return self.data_transforms(sample)
+
+
+class ResizePerChannelToTensor(BaseTransforms):
+    def __init__(self, *args, **kwargs):
+        BaseTransforms.__init__(self, *args, **kwargs)
+        self.data_transforms = transforms.Compose(
             [
                 transforms.ToPILImage(),
                 transforms.Resize((256, 256)),
@@ -136,10 +158,6 @@ class ResizeToTensor(BaseTransforms):
             ]
         )
 
-        return data_transforms(sample)
-
-
-class ResizePerChannelToTensor(BaseTransforms):
     def __call__(self, sample):
         """Applies resize transformations per channel. This is useful for multichannel images.
 
@@ -149,18 +167,10 @@ class ResizePerChannelToTensor(BaseTransforms):
 
         """
 
-        data_transforms = transforms.Compose(
-            [
-                transforms.ToPILImage(),
-                transforms.Resize((256, 256)),
-                transforms.ToTensor(),
-            ]
-        )
-
         x = []
         # apply transformations to each channel
         for ch in sample:
-            x.append(data_transforms(ch))
+            x.append(self.data_transforms(ch))
 
         # this is the multichannel transformed image (a torch tensor)
         return torch.cat(x)
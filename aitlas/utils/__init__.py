@@ -1,4 +1,13 @@
+from .band_decoding import decode_bands
+from .image_cache import DecodedImageCache
+from .prediction_writers import (
+    PREDICTION_WRITERS,
+    CsvPredictionWriter,
+    NpyPredictionWriter,
+    ParquetPredictionWriter,
+)
 from .segmentation_losses import *
+from .tiling import SceneReader, TileBlender, tile_starts, window_weights
 from .utils import (
     current_ts,
     get_class,
@@ -13,6 +22,10 @@ from .utils import (
     stringify,
     tiff_loader,
     save_best_model,
+    state_dict_to_cpu,
+    write_checkpoint,
+    CheckpointWriter,
     submit_inria_results,
     collate_fn,
+    pad_time_series,
 )
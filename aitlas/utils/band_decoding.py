@@ -0,0 +1,49 @@
+"""
+Decoding of raw band arrays to calibrated images, without round-trips through PIL.
+
+The raw values are multiplied by a per-dataset calibration scale and clipped to 0-1 in vectorized
+steps, in the (height, width, channels) layout of the raw arrays. The uint8 images are scaled in float64,
+the same as `np.clip(bands * scale * 255.0, 0, 255).astype(np.uint8)`.
+"""
+import numpy as np
+import torch
+
+
+def decode_bands(bands, scale, channels=None, to_float=False):
+    """
+    Calibrates raw bands to images, computing `clip(bands * scale, 0, 1)`.
+
+    :param bands: raw bands of shape (..., height, width, channels) or a single band of shape (height, width)
+    :type bands: numpy.ndarray
+    :param scale: calibration scale of the raw values, e.g. 1 / 255 for 8-bit images
+    :type scale: float
+    :param channels: indices of the channels to keep, in order, defaults to all
+    :type channels: list, optional
+    :param to_float: return a float32 tensor of shape (channels, height, width) with values in 0-1, ready for
+                     the tensor and batch transformations, instead of a uint8 array of shape
+                     (..., height, width, channels) with values in 0-255
+    :type to_float: bool, optional
+    :return: calibrated image
+    :rtype: numpy.ndarray or torch.Tensor
+    """
+    bands = np.asarray(bands)
+    if bands.ndim == 2:
+        bands = bands[:, :, None]
+    if channels is not None and list(channels) != list(range(bands.shape[-1])):
+        bands = bands[..., channels]
+
+    if to_float:
+        if bands.ndim != 3:
+            raise ValueError("Only single images can be decoded to float tensors")
+        image = np.multiply(bands, np.float32(scale), dtype=np.float32)
+        np.clip(image, 0, 1, out=image)
+        # a channels first view of the channels last image, the batch is contiguous after collation
+        return torch.from_numpy(image).permute(2, 0, 1)
+
+    if bands.dtype == np.uint8 and scale * 255.0 == 1:
+        return np.array(bands)
+    # scaled in float64 and in two steps, a single float32 product can round differently before the cast
+    image = np.multiply(bands, scale, dtype=np.float64)
+    image *= 255.0
+    np.clip(image, 0, 255, out=image)
+    return image.astype(np.uint8)
@@ -0,0 +1,175 @@
+"""Cache of decoded images shared between the data loader workers"""
+import atexit
+import hashlib
+import os
+import tempfile
+
+import numpy as np
+
+# no file locking on some platforms, the cache is then filled without a lock
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+# columns of an index row: where the image is stored, its shape and the key of the source file
+OFFSET, NBYTES, HEIGHT, WIDTH, CHANNELS, NDIM, PATH_HASH, MTIME = range(8)
+
+
+def path_hash(file_path):
+    """Returns a signed 64-bit hash of a file path"""
+    digest = hashlib.blake2b(file_path.encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+class DecodedImageCache:
+    """Stores decoded uint8 images in a memory-mapped buffer, so they are decoded only once.
+
+    The buffer and the index are files, either in RAM (`/dev/shm`) or on a given path, which are mapped by every
+    data loader worker. An entry is invalidated when the modification time of its source file changes.
+    Images which are not uint8 or do not fit in the remaining space are not cached.
+    """
+
+    def __init__(self, size, max_bytes, cache_file=None):
+        """
+        :param size: number of items in the dataset
+        :type size: int
+        :param max_bytes: maximum size of the decoded images in the cache
+        :type max_bytes: int
+        :param cache_file: file in which the cache is stored and reused across runs, defaults to None (RAM)
+        :type cache_file: str, optional
+        """
+        self.size = size
+        self.max_bytes = max_bytes
+        self.owner_pid = None
+
+        if cache_file:
+            self.cache_file = cache_file
+        else:
+            shm = "/dev/shm" if os.path.isdir("/dev/shm") else None
+            fd, self.cache_file = tempfile.mkstemp(prefix="aitlas_cache_", dir=shm)
+            os.close(fd)
+            self.owner_pid = os.getpid()
+            atexit.register(self.remove)
+        self.index_file = f"{self.cache_file}.index"
+
+        self.data = None
+        self.index = None
+        self.create()
+
+    def __getstate__(self):
+        # the maps are opened again in each worker
+        state = self.__dict__.copy()
+        state["data"] = None
+        state["index"] = None
+        return state
+
+    def create(self):
+        """Create the cache files, or reuse them if they match the dataset size and the size bound"""
+        if os.path.isfile(self.index_file) and os.path.isfile(self.cache_file):
+            index = np.memmap(self.index_file, dtype=np.int64, mode="r")
+            if (
+                len(index) == (self.size + 1) * 8
+                and index[1] == self.max_bytes
+                and os.path.getsize(self.cache_file) == self.max_bytes
+            ):
+                return
+
+        with open(self.cache_file, "wb") as f:
+            f.truncate(self.max_bytes)
+        index = np.memmap(
+            self.index_file, dtype=np.int64, mode="w+", shape=(self.size + 1, 8)
+        )
+        index[0, 1] = self.max_bytes  # row 0 holds the used bytes and the capacity
+        index.flush()
+
+    def open(self):
+        """Map the cache files in the current process"""
+        self.data = np.memmap(self.cache_file, dtype=np.uint8, mode="r+")
+        self.index = np.memmap(self.index_file, dtype=np.int64, mode="r+").reshape(
+            self.size + 1, 8
+        )
+
+    def get(self, index, file_path, loader):
+        """
+        Returns the decoded image for an item, decoding and caching it if needed
+
+        :param index: index of the item in the dataset
+        :type index: int
+        :param file_path: path to the image
+        :type file_path: str
+        :param loader: function decoding the image
+        :type loader: callable
+        :return: the decoded image
+        :rtype: numpy.ndarray
+        """
+        if self.data is None:
+            self.open()
+
+        row = self.index[index + 1]
+        mtime = os.stat(file_path).st_mtime_ns
+        key = path_hash(file_path)
+        if row[MTIME] == mtime and row[PATH_HASH] == key:
+            shape = tuple(row[HEIGHT : HEIGHT + row[NDIM]])
+            offset = row[OFFSET]
+            return np.array(self.data[offset : offset + row[NBYTES]]).reshape(shape)
+
+        image = loader(file_path)
+        self.put(index, image, key, mtime)
+        return image
+
+    def put(self, index, image, key, mtime):
+        """Store a decoded image in the cache, if it is uint8 and there is space left"""
+        image = np.asarray(image)
+        if image.dtype != np.uint8 or not 2 <= image.ndim <= 3:
+            return
+
+        row = self.index[index + 1]
+        with self.lock():
+            if 0 < image.nbytes <= row[NBYTES]:
+                offset = row[OFFSET]  # reuse the space of a stale entry
+            else:
+                offset = self.index[0, 0]
+                if offset + image.nbytes > self.max_bytes:
+                    return
+                self.index[0, 0] = offset + image.nbytes
+
+            # invalidate the entry first, so it is never read while it is written
+            row[MTIME] = 0
+            self.data[offset : offset + image.nbytes] = image.reshape(-1)
+            row[OFFSET] = offset
+            row[NBYTES] = image.nbytes
+            row[HEIGHT : HEIGHT + image.ndim] = image.shape
+            row[NDIM] = image.ndim
+            row[PATH_HASH] = key
+            row[MTIME] = mtime
+
+    def lock(self):
+        """Returns an exclusive lock over the cache, shared by all the processes"""
+        return _FileLock(self.index_file)
+
+    def remove(self):
+        """Remove the cache files created in RAM by this process"""
+        if self.owner_pid != os.getpid():
+            return
+        for file in (self.cache_file, self.index_file):
+            if os.path.exists(file):
+                os.remove(file)
+
+
+class _FileLock:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.file = None
+
+    def __enter__(self):
+        if fcntl:
+            self.file = open(self.file_path, "rb")
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *args):
+        if self.file:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
@@ -0,0 +1,237 @@
+"""Writers storing the predictions incrementally, one batch at a time"""
+import csv
+import glob
+import logging
+import os
+
+import numpy as np
+from numpy.lib.format import open_memmap
+
+
+def truncate_partial_line(file):
+    """Remove an incomplete last line, left by an interrupted write"""
+    with open(file, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        while end > 0:
+            start = max(end - 4096, 0)
+            f.seek(start)
+            newline = f.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        f.truncate(end)
+
+
+class CsvPredictionWriter:
+    """Appends the predicted probabilities to a CSV file with one row per image"""
+
+    def __init__(self, file, labels, size, resume=False):
+        """
+        :param file: CSV file for the predictions
+        :type file: str
+        :param labels: labels of the predicted classes
+        :type labels: list
+        :param size: total number of images
+        :type size: int
+        :param resume: whether to keep the predictions already in the file, defaults to False
+        :type resume: bool, optional
+        """
+        self.file = file
+        self.labels = labels
+        self.done = set()
+
+        if resume and os.path.isfile(self.file):
+            truncate_partial_line(self.file)
+        if resume and os.path.isfile(self.file) and os.path.getsize(self.file):
+            with open(self.file, "r", newline="") as f:
+                reader = csv.reader(f, delimiter=";")
+                next(reader, None)  # header
+                self.done = {row[0] for row in reader if len(row) == len(labels) + 1}
+            self.csvfile = open(self.file, "a", newline="")
+            self.writer = csv.writer(self.csvfile, delimiter=";")
+        else:
+            self.csvfile = open(self.file, "w", newline="")
+            self.writer = csv.writer(self.csvfile, delimiter=";")
+            self.writer.writerow(["image"] + list(labels))
+
+    def written(self):
+        """Returns the names of the images which already have predictions"""
+        return self.done
+
+    def write(self, fnames, probs):
+        self.writer.writerows(
+            [fname] + list(prob) for fname, prob in zip(fnames, probs)
+        )
+        self.csvfile.flush()
+
+    def close(self):
+        self.csvfile.close()
+
+
+class ParquetPredictionWriter:
+    """
+    Stores the predicted probabilities in a directory of Parquet files, with an `image` column
+    and a float32 column per label. The rows are buffered and written as a new part file every
+    `part_size` rows.
+    """
+
+    def __init__(self, file, labels, size, resume=False, part_size=10000):
+        """
+        :param file: directory for the Parquet part files
+        :type file: str
+        :param labels: labels of the predicted classes
+        :type labels: list
+        :param size: total number of images
+        :type size: int
+        :param resume: whether to keep the predictions already in the directory, defaults to False
+        :type resume: bool, optional
+        :param part_size: number of rows per part file, defaults to 10000
+        :type part_size: int, optional
+        """
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise ImportError("Writing the predictions to Parquet requires `pyarrow`.")
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+
+        self.dir = file
+        self.labels = labels
+        self.part_size = part_size
+        self.done = set()
+        self.fnames = []
+        self.probs = []
+        self.buffered = 0
+
+        os.makedirs(self.dir, exist_ok=True)
+        parts = sorted(glob.glob(os.path.join(self.dir, "part-*.parquet")))
+        if resume:
+            for part in parts:
+                table = self.pq.read_table(part, columns=["image"])
+                self.done.update(table.column("image").to_pylist())
+        else:
+            for part in parts:
+                os.remove(part)
+        # number of the next part, after the existing ones
+        self.part = 0
+        if resume and parts:
+            self.part = int(os.path.basename(parts[-1])[5:-8]) + 1
+
+    def written(self):
+        """Returns the names of the images which already have predictions"""
+        return self.done
+
+    def write(self, fnames, probs):
+        self.fnames += list(fnames)
+        self.probs.append(np.asarray(probs, dtype=np.float32))
+        self.buffered += len(fnames)
+        if self.buffered >= self.part_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows to a new part file"""
+        if not self.buffered:
+            return
+        probs = np.concatenate(self.probs)
+        columns = [self.pa.array(self.fnames, type=self.pa.string())]
+        columns += [self.pa.array(probs[:, j]) for j in range(len(self.labels))]
+        table = self.pa.Table.from_arrays(columns, names=["image"] + list(self.labels))
+
+        # the part is written under a temporary name, so a resumed run never reads a partial file
+        part = os.path.join(self.dir, f"part-{self.part:05d}.parquet")
+        self.pq.write_table(table, f"{part}.tmp")
+        os.replace(f"{part}.tmp", part)
+
+        self.part += 1
+        self.fnames = []
+        self.probs = []
+        self.buffered = 0
+
+    def close(self):
+        self.flush()
+
+
+class NpyPredictionWriter:
+    """
+    Stores the predicted probabilities in a memory-mapped `.npy` array of shape (images, labels).
+    The image of each row is listed, in order, in a text file next to it (`<name>_images.txt`).
+    """
+
+    def __init__(self, file, labels, size, resume=False):
+        """
+        :param file: `.npy` file for the predictions
+        :type file: str
+        :param labels: labels of the predicted classes
+        :type labels: list
+        :param size: total number of images
+        :type size: int
+        :param resume: whether to keep the predictions already in the file, defaults to False
+        :type resume: bool, optional
+        """
+        self.file = file
+        self.names_file = f"{os.path.splitext(file)[0]}_images.txt"
+        self.labels = labels
+        self.done = []
+
+        if resume and os.path.isfile(self.file) and os.path.isfile(self.names_file):
+            truncate_partial_line(self.names_file)
+            with open(self.names_file, "r") as f:
+                self.done = f.read().splitlines()
+            self.probs = open_memmap(self.file, mode="r+")
+            if self.probs.shape[1] != len(labels):
+                raise ValueError(
+                    f"{self.file} has predictions for {self.probs.shape[1]} labels, "
+                    f"expected {len(labels)}"
+                )
+            self.count = len(self.done)
+            if self.probs.shape[0] < size:
+                self.grow(size)
+            self.names = open(self.names_file, "a")
+        else:
+            self.probs = open_memmap(
+                self.file, mode="w+", dtype=np.float32, shape=(size, len(labels))
+            )
+            self.names = open(self.names_file, "w")
+            self.count = 0
+
+    def grow(self, size):
+        """Copy the predictions to a larger array, when images were added since the last run"""
+        logging.info(f"Resizing {self.file} from {self.probs.shape[0]} to {size} rows")
+        tmp_file = f"{self.file}.tmp.npy"
+        probs = open_memmap(
+            tmp_file, mode="w+", dtype=np.float32, shape=(size, len(self.labels))
+        )
+        for start in range(0, self.count, 65536):
+            end = min(start + 65536, self.count)
+            probs[start:end] = self.probs[start:end]
+        probs.flush()
+        del probs, self.probs
+        os.replace(tmp_file, self.file)
+        self.probs = open_memmap(self.file, mode="r+")
+
+    def written(self):
+        """Returns the names of the images which already have predictions"""
+        return set(self.done)
+
+    def write(self, fnames, probs):
+        if self.count + len(fnames) > len(self.probs):
+            self.grow(self.count + len(fnames))
+        # the rows are written before the names, which mark them as done
+        self.probs[self.count : self.count + len(fnames)] = probs
+        self.probs.flush()
+        self.names.writelines(f"{fname}\n" for fname in fnames)
+        self.names.flush()
+        self.count += len(fnames)
+
+    def close(self):
+        self.probs.flush()
+        self.names.close()
+
+
+PREDICTION_WRITERS = {
+    "csv": CsvPredictionWriter,
+    "parquet": ParquetPredictionWriter,
+    "npy": NpyPredictionWriter,
+}
@@ -0,0 +1,169 @@
+"""Sliding-window inference over images too large to be predicted at once"""
+import os
+
+import numpy as np
+import tifffile
+
+from .utils import image_loader
+
+
+def tile_starts(length, tile_size, stride):
+    """
+    Returns the start positions of the windows along one axis. The last window is aligned
+    to the end, so every position is covered by a window which fits in the image.
+
+    :param length: size of the image along the axis
+    :type length: int
+    :param tile_size: size of the window
+    :type tile_size: int
+    :param stride: step between two windows
+    :type stride: int
+    :rtype: list
+    """
+    if length <= tile_size:
+        return [0]
+    starts = list(range(0, length - tile_size, stride))
+    starts.append(length - tile_size)
+    return starts
+
+
+def window_weights(tile_size, blending="gaussian"):
+    """
+    Returns the weights of the window pixels when overlapping windows are blended.
+
+    :param tile_size: size of the window
+    :type tile_size: int
+    :param blending: 'gaussian' to favour the centre of the windows, where the model sees most
+                     of the context, or 'uniform' to average the windows
+    :type blending: str
+    :return: weights of shape (tile_size, tile_size)
+    :rtype: numpy.ndarray
+    """
+    if blending == "uniform":
+        return np.ones((tile_size, tile_size), dtype=np.float32)
+    if blending != "gaussian":
+        raise ValueError(f"Unknown blending `{blending}`, use 'gaussian' or 'uniform'")
+    sigma = tile_size / 8
+    coords = np.arange(tile_size, dtype=np.float32) - (tile_size - 1) / 2
+    weights = np.exp(-(coords**2) / (2 * sigma**2))
+    weights = np.outer(weights, weights)
+    # keep the border pixels of the scene, covered by a single window, well defined
+    return np.maximum(weights / weights.max(), 1e-3).astype(np.float32)
+
+
+class SceneReader:
+    """
+    Reads windows of a large image. GeoTIFFs are read window by window with `rasterio` if it is installed,
+    or memory-mapped with `tifffile` when they are not compressed. Other images are loaded at once.
+    """
+
+    def __init__(self, file_path):
+        """
+        :param file_path: path to the image
+        :type file_path: str
+        """
+        self.file_path = file_path
+        self.dataset = None
+        self.image = None
+        # the bands come first in planar TIFFs, of shape (bands, height, width)
+        self.planar = False
+
+        if os.path.splitext(file_path)[1].lower() in [".tif", ".tiff"]:
+            try:
+                import rasterio
+            except ImportError:
+                rasterio = None
+            if rasterio:
+                self.dataset = rasterio.open(file_path)
+                self.height, self.width = self.dataset.height, self.dataset.width
+                return
+            with tifffile.TiffFile(file_path) as tif:
+                axes = tif.series[0].axes
+            try:
+                self.image = tifffile.memmap(file_path, mode="r")
+            except ValueError:  # compressed or tiled, can't be memory-mapped
+                self.image = tifffile.imread(file_path)
+            self.planar = self.image.ndim == 3 and axes.endswith("YX")
+        else:
+            self.image = image_loader(file_path)
+        if self.planar:
+            self.height, self.width = self.image.shape[1:]
+        else:
+            self.height, self.width = self.image.shape[:2]
+
+    def read(self, y, x, height, width):
+        """
+        Reads a window of the image
+
+        :return: the window, of shape (height, width) or (height, width, channels) like the loaded image
+        :rtype: numpy.ndarray
+        """
+        if self.dataset is not None:
+            from rasterio.windows import Window
+
+            window = self.dataset.read(window=Window(x, y, width, height))
+            if len(window) == 1:
+                return window[0]
+            return np.moveaxis(window, 0, -1)
+        if self.planar:
+            return np.moveaxis(self.image[:, y : y + height, x : x + width], 0, -1)
+        return np.asarray(self.image[y : y + height, x : x + width])
+
+    def close(self):
+        if self.dataset is not None:
+            self.dataset.close()
+        self.image = None
+
+
+class TileBlender:
+    """
+    Accumulates the weighted probabilities of overlapping windows. Only the rows which can still
+    be covered by a window are kept, the finished ones are handed out with `pop`.
+    """
+
+    def __init__(self, num_classes, width, weights):
+        """
+        :param num_classes: number of predicted classes
+        :type num_classes: int
+        :param width: width of the image
+        :type width: int
+        :param weights: weights of the window pixels, see `window_weights`
+        :type weights: numpy.ndarray
+        """
+        self.weights = weights
+        self.top = 0
+        self.probs = np.zeros((num_classes, 0, width), dtype=np.float32)
+        self.weight_sum = np.zeros((0, width), dtype=np.float32)
+
+    def add(self, y, x, probs):
+        """
+        Add the probabilities of a window
+
+        :param y: first row of the window
+        :param x: first column of the window
+        :param probs: probabilities of shape (num_classes, height, width)
+        """
+        height, width = probs.shape[1:]
+        missing = y + height - self.top - self.weight_sum.shape[0]
+        if missing > 0:
+            self.probs = np.pad(self.probs, ((0, 0), (0, missing), (0, 0)))
+            self.weight_sum = np.pad(self.weight_sum, ((0, missing), (0, 0)))
+        weights = self.weights[:height, :width]
+        rows = slice(y - self.top, y - self.top + height)
+        self.probs[:, rows, x : x + width] += probs * weights
+        self.weight_sum[rows, x : x + width] += weights
+
+    def pop(self, row):
+        """
+        Returns the blended probabilities of the rows above `row`, which no more windows will cover
+
+        :return: tuple of (first row, probabilities of shape (num_classes, rows, width))
+        :rtype: tuple
+        """
+        count = row - self.top
+        probs = self.probs[:, :count] / self.weight_sum[:count]
+        top = self.top
+        self.probs = self.probs[:, count:]
+        self.weight_sum = self.weight_sum[count:]
+        self.top = row
+        return top, probs
@@ -1,6 +1,11 @@
 import csv
+import functools
 import importlib
+import logging
 import os
+import queue
+import threading
+from shutil import copyfile
 from time import time
 import glob
 import cv2
@@ -12,8 +17,12 @@ import subprocess
 from PIL import Image, ImageOps
 
 
+@functools.lru_cache(maxsize=None)
 def get_class(class_name):
-    """Returns the class type for a given class name. Expects a string of type `module.submodule.Class`"""
+    """
+    Returns the class type for a given class name. Expects a string of type `module.submodule.Class`.
+    The lookups are cached, so each class is imported only once.
+    """
     module = class_name[: class_name.rindex(".")]
     cls = class_name[class_name.rindex(".") + 1 :]
     return getattr(importlib.import_module(module), cls)
@@ -250,11 +259,117 @@ def submit_inria_results(input_dir, output_dir):
             subprocess.call(command, shell=True)
 
 
-def save_best_model(model, model_directory, epoch, optimizer, loss, start, run_id):
+def state_dict_to_cpu(state):
+    """
+    Snapshot a (nested) state dict to CPU, so it can be written while training continues
+
+    :param state: state dict of a model or an optimizer
+    :type state: dict
+    :return: copy of the state dict with all tensors detached and copied to CPU
+    :rtype: dict
+    """
+    if torch.is_tensor(state):
+        return state.detach().to("cpu", copy=True)
+    if isinstance(state, dict):
+        snapshot = type(state)((k, state_dict_to_cpu(v)) for k, v in state.items())
+        if hasattr(state, "_metadata"):  # module versions used when loading
+            snapshot._metadata = state._metadata
+        return snapshot
+    if isinstance(state, (list, tuple)):
+        return type(state)(state_dict_to_cpu(v) for v in state)
+    return state
+
+
+def write_checkpoint(checkpoint, path, link=None):
+    """
+    Atomically writes a checkpoint on disk and optionally links it to a second path
+
+    :param checkpoint: checkpoint to save
+    :type checkpoint: dict
+    :param path: where to save the checkpoint
+    :type path: str
+    :param link: path which should point to the saved checkpoint, e.g. the latest checkpoint
+    :type link: str, optional
+    """
+    tmp_path = f"{path}.tmp"
+    torch.save(checkpoint, tmp_path)
+    os.replace(tmp_path, path)
+
+    if link:
+        tmp_link = f"{link}.tmp"
+        if os.path.lexists(tmp_link):
+            os.remove(tmp_link)
+        try:
+            os.link(path, tmp_link)
+        except OSError:  # hard links are not supported, fall back to a copy
+            copyfile(path, tmp_link)
+        os.replace(tmp_link, link)
+
+
+class CheckpointWriter:
+    """Writes checkpoints on disk in a background thread, so training does not wait for the storage"""
+
+    def __init__(self, max_pending=1):
+        """
+        :param max_pending: number of checkpoints that can wait to be written before `write` blocks
+        :type max_pending: int
+        """
+        self.queue = queue.Queue(maxsize=max_pending)
+        self.error = None
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            try:
+                if item is None:
+                    return
+                write_checkpoint(*item)
+            except Exception as e:
+                logging.error(f"Failed to write checkpoint {item[1]}: {e}")
+                self.error = e
+            finally:
+                self.queue.task_done()
+
+    def _raise_error(self):
+        if self.error:
+            error, self.error = self.error, None
+            raise error
+
+    def write(self, checkpoint, path, link=None):
+        """
+        Queue a checkpoint for writing. The tensors in the checkpoint should not be modified afterwards.
+
+        :param checkpoint: checkpoint to save
+        :type checkpoint: dict
+        :param path: where to save the checkpoint
+        :type path: str
+        :param link: path which should point to the saved checkpoint
+        :type link: str, optional
+        """
+        self._raise_error()
+        self.queue.put((checkpoint, path, link))
+
+    def wait(self):
+        """Block until all the queued checkpoints are written"""
+        self.queue.join()
+        self._raise_error()
+
+    def close(self):
+        """Write the remaining checkpoints and stop the background thread"""
+        self.queue.put(None)
+        self.thread.join()
+        self._raise_error()
+
+
+def save_best_model(
+    model, model_directory, epoch, optimizer, loss, start, run_id, writer=None
+):
     """
     Saves the model on disk
-    :param model: model to save
-    :type model: torch.nn.Module
+    :param model: model to save, or a snapshot of its state dict
+    :type model: torch.nn.Module or dict
     :param model_directory: directory where to save the model
     :type model_directory: str
     :param epoch: current epoch
@@ -267,6 +382,8 @@ def save_best_model(model, model_directory, epoch, optimizer, loss, start, run_i
     :type start: float
     :param run_id: run id
     :type run_id: str
+    :param writer: background writer to use, the checkpoint is written synchronously if not set
+    :type writer: CheckpointWriter, optional
     """
     if not os.path.isdir(os.path.join(model_directory, run_id)):
         os.makedirs(os.path.join(model_directory, run_id))
@@ -276,19 +393,44 @@ def save_best_model(model, model_directory, epoch, optimizer, loss, start, run_i
         model_directory, run_id, f"best_checkpoint_{timestamp}_{epoch}.pth.tar"
     )
 
+    state_dict = model if isinstance(model, dict) else model.state_dict()
+    state = {
+        "epoch": epoch + 1,
+        "state_dict": state_dict_to_cpu(state_dict),
+        "optimizer": state_dict_to_cpu(optimizer.state_dict()),
+        "loss": loss,
+        "start": start,
+        "id": run_id,
+    }
+
     # create timestamped checkpoint
-    torch.save(
-        {
-            "epoch": epoch + 1,
-            "state_dict": model.state_dict(),
-            "optimizer": optimizer.state_dict(),
-            "loss": loss,
-            "start": start,
-            "id": run_id,
-        },
-        checkpoint,
-    )
+    if writer:
+        writer.write(state, checkpoint)
+    else:
+        write_checkpoint(state, checkpoint)
 
 
 def collate_fn(batch):
     return tuple(zip(*batch))
+
+
+def pad_time_series(batch, padding_value=0.0):
+    """
+    Collates time series of different lengths, of shape (time, bands), into a padded batch
+
+    :param batch: list of (time series, target) samples
+    :type batch: list
+    :param padding_value: value of the padded time steps, defaults to 0.0
+    :type padding_value: float, optional
+    :return: tuple of (time series of shape (batch, time, bands), mask of shape (batch, time)
+             which is True for the observed time steps, targets)
+    :rtype: tuple
+    """
+    series, targets = zip(*batch)
+    series = [torch.as_tensor(x) for x in series]
+    lengths = torch.tensor([len(x) for x in series])
+    x = torch.nn.utils.rnn.pad_sequence(
+        series, batch_first=True, padding_value=padding_value
+    )
+    mask = torch.arange(x.shape[1]) < lengths[:, None]
+    return x, mask, torch.utils.data.default_collate(list(targets))
@@ -0,0 +1,46 @@
+import unittest
+
+import numpy as np
+import torch
+
+from aitlas.utils import decode_bands
+
+
+class TestDecodeBands(unittest.TestCase):
+    def test_big_earth_net_bands(self):
+        # every raw value, calibrated like the BigEarthNet patches before
+        bands = np.arange(2**16, dtype=np.uint16).reshape(256, 64, 4)
+        expected = np.clip(bands / 2000 * 255.0, 0, 255).astype(np.uint8)
+        np.testing.assert_array_equal(decode_bands(bands, 1 / 2000), expected)
+        np.testing.assert_array_equal(
+            decode_bands(bands, 1 / 2000, channels=[2, 1, 0]), expected[..., [2, 1, 0]]
+        )
+
+    def test_so2sat_bands(self):
+        # the float32 values closest to the uint8 boundaries, calibrated like So2Sat before
+        boundaries = np.float32(np.arange(1, 256) / (3.5 * 255.0)).view(np.int32)
+        neighbours = boundaries[:, None] + np.arange(-1000, 1000, dtype=np.int32)
+        bands = neighbours.view(np.float32).reshape(255, 100, 20)[..., :3]
+        expected = np.clip(bands * 3.5 * 255.0, 0, 255).astype(np.uint8)
+        np.testing.assert_array_equal(decode_bands(bands, 3.5), expected)
+
+    def test_uint8_bands(self):
+        rng = np.random.default_rng(0)
+        bands = rng.integers(0, 256, (8, 8, 3), dtype=np.uint8)
+        decoded = decode_bands(bands, 1 / 255)
+        np.testing.assert_array_equal(decoded, bands)
+        self.assertFalse(np.shares_memory(decoded, bands))
+        self.assertEqual(decode_bands(bands[:, :, 0], 1 / 255).shape, (8, 8, 1))
+
+    def test_to_float(self):
+        bands = np.array([[[0, 1000, 4000]]], dtype=np.uint16)
+        image = decode_bands(bands, 1 / 2000, to_float=True)
+        self.assertEqual(image.dtype, torch.float32)
+        self.assertEqual(tuple(image.shape), (3, 1, 1))
+        np.testing.assert_allclose(image.flatten().numpy(), [0, 0.5, 1])
+        with self.assertRaises(ValueError):
+            decode_bands(np.stack([bands, bands]), 1 / 2000, to_float=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,53 @@
+import unittest
+
+import torch
+
+from aitlas.transforms import (
+    BatchChannelsFirst,
+    BatchRandomCrop,
+    BatchRandomFlipHV,
+)
+
+
+class TestBatchTransforms(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.images = BatchChannelsFirst()(
+            torch.randint(0, 256, (16, 40, 48, 3), dtype=torch.uint8)
+        )
+
+    def test_random_crop(self):
+        crop = BatchRandomCrop()
+        crop.size = 32
+
+        torch.manual_seed(1)
+        crops = crop(self.images)
+        torch.manual_seed(1)
+        top = torch.randint(0, 40 - 32 + 1, (16,))
+        left = torch.randint(0, 48 - 32 + 1, (16,))
+
+        self.assertEqual(crops.shape, (16, 3, 32, 32))
+        for i, (y, x) in enumerate(zip(top.tolist(), left.tolist())):
+            torch.testing.assert_close(
+                crops[i], self.images[i, :, y : y + 32, x : x + 32], rtol=0, atol=0
+            )
+
+    def test_random_flip(self):
+        torch.manual_seed(2)
+        flipped = BatchRandomFlipHV()(self.images)
+        torch.manual_seed(2)
+        horizontal = torch.rand(16) < 0.5
+        vertical = torch.rand(16) < 0.5
+
+        self.assertEqual(flipped.shape, self.images.shape)
+        for i in range(16):
+            image = self.images[i]
+            if horizontal[i]:
+                image = image.flip(-1)
+            if vertical[i]:
+                image = image.flip(-2)
+            torch.testing.assert_close(flipped[i], image, rtol=0, atol=0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,267 @@
+import sys
+import unittest
+from unittest import mock
+
+import faiss
+import numpy as np
+from scipy.sparse import csr_matrix
+
+from aitlas.clustering import PIC, Kmeans
+from aitlas.clustering.benchmark import synthetic_features
+from aitlas.clustering.utils import (
+    KNN_GRAPH_BACKENDS,
+    arrange_clustering,
+    cluster_assign,
+    cluster_index_arrays,
+    fill_empty_clusters,
+    find_maxima_cluster,
+    make_adjacencyW,
+    make_graph,
+    preprocess_features,
+    run_minibatch_kmeans,
+    run_pic,
+)
+
+
+def loop_make_adjacencyW(I, D, sigma):
+    """The adjacency matrix as computed before, with a vectorized Python kernel"""
+    V, k = I.shape
+    k = k - 1
+    indices = np.reshape(np.delete(I, 0, 1), (1, -1))
+    indptr = np.multiply(k, np.arange(V + 1))
+    res_D = np.vectorize(lambda d: np.exp(-d / sigma**2))(D)
+    data = np.reshape(np.delete(res_D, 0, 1), (1, -1))
+    return csr_matrix((data[0], indices[0], indptr), shape=(V, V))
+
+
+def loop_run_pic(I, D, sigma, alpha):
+    """PIC as computed before, 200 power iterations"""
+    a = loop_make_adjacencyW(I, D, sigma)
+    W = a + a.transpose()
+    nim = W.shape[0]
+    v = (np.ones(nim) / nim).astype("float32")
+    for i in range(200):
+        vnext = np.zeros(nim, dtype="float32")
+        vnext = vnext + W.transpose().dot(v)
+        vnext = alpha * vnext + (1 - alpha) / nim
+        vnext /= vnext.sum()
+        v = vnext
+    return [int(i) for i in loop_find_maxima_cluster(W, v)]
+
+
+def loop_find_maxima_cluster(W, v):
+    """The clusters as found before, following the pointers node by node"""
+    n, m = W.shape
+    assign = np.zeros(n)
+    pointers = list(range(n))
+    for i in range(n):
+        best_vi = 0
+        for l in range(W.indptr[i], W.indptr[i + 1]):
+            j = W.indices[l]
+            vi = W.data[l] * (v[j] - v[i])
+            if vi > best_vi:
+                best_vi = vi
+                pointers[i] = j
+    n_clus = 0
+    cluster_ids = -1 * np.ones(n)
+    for i in range(n):
+        if pointers[i] == i:
+            cluster_ids[i] = n_clus
+            n_clus = n_clus + 1
+    for i in range(n):
+        current_node = i
+        while pointers[current_node] != current_node:
+            current_node = pointers[current_node]
+        assign[i] = cluster_ids[current_node]
+    return assign
+
+
+class TestKnnGraph(unittest.TestCase):
+    def setUp(self):
+        self.xb = synthetic_features(500, 16, clusters=10)
+        self.nnn = 5
+        self.expected_I, self.expected_D = make_graph(self.xb, self.nnn, "numpy")
+
+    def test_numpy_backend(self):
+        self.assertEqual(self.expected_I.shape, (500, self.nnn + 1))
+        # each point is its own nearest neighbor
+        np.testing.assert_array_equal(self.expected_I[:, 0], np.arange(500))
+        np.testing.assert_allclose(self.expected_D[:, 0], 0, atol=1e-5)
+        self.assertTrue(np.all(np.diff(self.expected_D, axis=1) >= 0))
+
+    def test_same_neighbors_as_numpy(self):
+        for backend in KNN_GRAPH_BACKENDS:
+            if backend == "gpu" and not (
+                hasattr(faiss, "StandardGpuResources") and faiss.get_num_gpus() > 0
+            ):
+                continue
+            with self.subTest(backend=backend):
+                # the approximate indexes are exact on small data, all the lists are probed
+                I, D = make_graph(self.xb, self.nnn, backend)
+                np.testing.assert_array_equal(I, self.expected_I)
+                np.testing.assert_allclose(D, self.expected_D, rtol=1e-4, atol=1e-5)
+
+    def test_small_blocks(self):
+        I, D = make_graph(self.xb, self.nnn, "numpy", block_size=64)
+        np.testing.assert_array_equal(I, self.expected_I)
+        np.testing.assert_allclose(D, self.expected_D, rtol=1e-5, atol=1e-6)
+
+    def test_unknown_backend(self):
+        with self.assertRaises(ValueError):
+            make_graph(self.xb, self.nnn, "annoy")
+
+
+class TestWithoutFaiss(unittest.TestCase):
+    def test_numpy_pca_same_as_faiss(self):
+        x = synthetic_features(500, 32, clusters=10)
+        expected = preprocess_features(x, pca=16)
+        with mock.patch.dict(sys.modules, {"faiss": None}):
+            reduced = preprocess_features(x, pca=16, block_size=64)
+        # the same features up to the signs of the components
+        np.testing.assert_allclose(np.abs(reduced), np.abs(expected), atol=1e-3)
+        np.testing.assert_allclose(
+            reduced @ reduced.T, expected @ expected.T, atol=1e-3
+        )
+
+    def test_pic(self):
+        x = synthetic_features(400, 300, clusters=8)
+        with mock.patch.dict(sys.modules, {"faiss": None}):
+            pic = PIC()
+            pic.cluster(x)
+        self.assertEqual(len(pic.assignments), 400)
+        self.assertEqual(sum(len(images) for images in pic.images_lists), 400)
+
+
+class TestPIC(unittest.TestCase):
+    def setUp(self):
+        self.xb = synthetic_features(400, 16, clusters=8)
+        self.I, self.D = make_graph(self.xb, 5, "numpy")
+        self.sigma, self.alpha = 0.2, 0.001
+
+    def test_adjacency_same_as_loop(self):
+        expected = loop_make_adjacencyW(self.I, self.D, self.sigma)
+        W = make_adjacencyW(self.I, self.D, self.sigma)
+        np.testing.assert_allclose(W.toarray(), expected.toarray(), rtol=1e-5)
+
+    def test_find_maxima_cluster_same_as_loop(self):
+        a = make_adjacencyW(self.I, self.D, self.sigma)
+        W = (a + a.transpose()).tocsr()
+        rng = np.random.default_rng(0)
+        for v in [rng.random(400).astype("float32"), self.xb[:, 0].copy()]:
+            np.testing.assert_array_equal(
+                find_maxima_cluster(W, v), loop_find_maxima_cluster(W, v)
+            )
+
+    def test_run_pic_same_as_loop(self):
+        for sigma, alpha in [(self.sigma, self.alpha), (0.5, 0.5), (1.0, 0.9)]:
+            with self.subTest(sigma=sigma, alpha=alpha):
+                expected = loop_run_pic(self.I, self.D, sigma, alpha)
+                # the same 200 iterations, without stopping at a fixed point
+                clusters = run_pic(self.I, self.D, sigma, alpha, max_iter=200, tol=-1)
+                np.testing.assert_array_equal(clusters, expected)
+                # stopping at the fixed point doesn't change the clusters
+                np.testing.assert_array_equal(
+                    run_pic(self.I, self.D, sigma, alpha), expected
+                )
+
+    def test_run_pic_without_iterations(self):
+        clusters = run_pic(self.I, self.D, self.sigma, self.alpha, max_iter=0)
+        self.assertEqual(len(clusters), 400)
+
+
+class TestMiniBatchKmeans(unittest.TestCase):
+    def setUp(self):
+        self.x = synthetic_features(600, 16, clusters=5)
+
+    def test_fill_empty_clusters(self):
+        labels = np.array([0, 0, 0, 1, 1, 3])
+        dists = np.array([0.1, 0.9, 0.2, 0.3, 0.4, 5.0], dtype=np.float32)
+        filled = fill_empty_clusters(labels, dists, 5)
+        # the farthest data of the clusters keeping at least one data
+        np.testing.assert_array_equal(filled, [0, 2, 0, 1, 4, 3])
+
+    def test_no_empty_clusters(self):
+        # more clusters than the 5 groups of the data, some of them are left empty
+        labels, loss = run_minibatch_kmeans(self.x, 40, batch_size=64, iterations=5)
+        self.assertEqual(len(labels), 600)
+        self.assertTrue(np.all(np.bincount(labels, minlength=40) > 0))
+        self.assertGreater(loss, 0)
+
+    def test_warm_start(self):
+        labels, _ = run_minibatch_kmeans(self.x, 10, batch_size=64, iterations=20)
+        warm, _ = run_minibatch_kmeans(
+            self.x, 10, init_labels=labels, batch_size=64, iterations=20, seed=1
+        )
+        self.assertTrue(np.all(np.bincount(warm, minlength=10) > 0))
+
+    def test_fewer_data_than_clusters(self):
+        with self.assertRaises(ValueError):
+            run_minibatch_kmeans(self.x[:5], 10)
+
+    def test_runs_use_other_seeds(self):
+        x = synthetic_features(600, 300, clusters=5)
+        kmeans = Kmeans(20, mode="minibatch", batch_size=64, iterations=3)
+        with mock.patch(
+            "aitlas.clustering.kmeans.run_minibatch_kmeans", wraps=run_minibatch_kmeans
+        ) as run:
+            for _ in range(3):
+                kmeans.cluster(x)
+                self.assertTrue(
+                    np.all(np.bincount(kmeans.assignments, minlength=20) > 0)
+                )
+
+        seeds = [call.kwargs["seed"] for call in run.call_args_list]
+        self.assertEqual(seeds, [0, 1, 2])
+        # each run after the first one is warm-started from the previous clusters
+        self.assertIsNone(run.call_args_list[0].args[2])
+        self.assertIsNotNone(run.call_args_list[1].args[2])
+
+
+class TestReassignedDataset(unittest.TestCase):
+    def setUp(self):
+        self.dataset = [(f"image {i}", -1) for i in range(8)]
+        # clusters 1 and 3 are empty
+        self.images_lists = [
+            np.array([5, 0]),
+            np.array([], dtype=np.int64),
+            np.array([1, 7, 2]),
+            [],
+            np.array([3, 4, 6]),
+        ]
+
+    def test_empty_clusters(self):
+        dataset = cluster_assign(self.images_lists, self.dataset)
+        self.assertEqual(len(dataset), 8)
+        # the pseudolabels of the clusters with images are numbered consecutively
+        self.assertEqual(
+            [dataset[i] for i in range(8)],
+            [
+                ("image 0", 0),
+                ("image 1", 1),
+                ("image 2", 1),
+                ("image 3", 2),
+                ("image 4", 2),
+                ("image 5", 0),
+                ("image 6", 2),
+                ("image 7", 1),
+            ],
+        )
+
+    def test_arrange_clustering(self):
+        np.testing.assert_array_equal(
+            arrange_clustering(self.images_lists), [0, 2, 2, 4, 4, 0, 4, 2]
+        )
+
+    def test_cluster_index_arrays(self):
+        labels = np.array([0, 2, 2, 4, 4, 0, 4, 2])
+        indexes, offsets = cluster_index_arrays(labels, 5)
+        np.testing.assert_array_equal(offsets, [0, 2, 2, 5, 5, 8])
+        for cluster in range(5):
+            np.testing.assert_array_equal(
+                indexes[offsets[cluster] : offsets[cluster + 1]],
+                np.flatnonzero(labels == cluster),
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
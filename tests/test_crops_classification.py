@@ -0,0 +1,157 @@
+import unittest
+
+import numpy as np
+import torch
+
+from aitlas.datasets.crops_classification import (
+    LengthBucketBatchSampler,
+    TimeSeriesCollate,
+)
+from aitlas.transforms.breizhcrops import (
+    BANDS,
+    SelectBands,
+    SelectBandsBatch,
+    SelectBandsVariableLength,
+)
+from aitlas.utils import pad_time_series
+
+
+def time_series(length, bands=len(BANDS["L2A"])):
+    """A time series whose values encode their time step and band, 1000 * time + band"""
+    return (1000.0 * np.arange(length)[:, None] + np.arange(bands)).astype(np.float64)
+
+
+class TestLengthBucketBatchSampler(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        self.lengths = np.random.randint(1, 100, 1003)
+
+    def check_batches(self, sampler, batches):
+        indexes = np.concatenate(batches)
+        np.testing.assert_array_equal(np.sort(indexes), np.arange(len(self.lengths)))
+        self.assertEqual(len(batches), len(sampler))
+
+        sizes = [len(batch) for batch in batches]
+        self.assertEqual(sorted(sizes)[0], len(self.lengths) % 8)
+        self.assertTrue(all(size == 8 for size in sorted(sizes)[1:]))
+
+    def test_buckets_sorted_by_length(self):
+        sampler = LengthBucketBatchSampler(
+            self.lengths, batch_size=8, shuffle=False, bucket_batches=10
+        )
+        batches = list(sampler)
+        self.check_batches(sampler, batches)
+
+        # without shuffling the buckets follow each other, each sorted by length
+        indexes = np.concatenate(batches)
+        for start in range(0, len(indexes), 80):
+            bucket = indexes[start : start + 80]
+            expected = start + np.argsort(
+                self.lengths[start : start + 80], kind="stable"
+            )
+            np.testing.assert_array_equal(bucket, expected)
+
+    def test_shuffled_batches(self):
+        sampler = LengthBucketBatchSampler(
+            self.lengths, batch_size=8, shuffle=True, bucket_batches=10
+        )
+        batches = list(sampler)
+        self.check_batches(sampler, batches)
+        for batch in batches:
+            self.assertTrue(np.all(np.diff(self.lengths[batch]) >= 0))
+
+
+class TestTimeSeriesCollate(unittest.TestCase):
+    def setUp(self):
+        self.batch = [
+            (time_series(length), label) for label, length in enumerate([3, 7, 5])
+        ]
+
+    def test_padding(self):
+        x, y = TimeSeriesCollate()(self.batch)
+        self.assertEqual(x.shape, (3, 7, 16))
+        np.testing.assert_array_equal(y.numpy(), [0, 1, 2])
+        for i, (series, _) in enumerate(self.batch):
+            np.testing.assert_array_equal(x[i, : len(series)].numpy(), series)
+            self.assertTrue((x[i, len(series) :] == 0).all())
+
+    def test_mask_and_batch_transform(self):
+        collate = TimeSeriesCollate(
+            batch_transform=SelectBandsVariableLength(level="L2A"), return_mask=True
+        )
+        (x, mask), y = collate(self.batch)
+        self.assertEqual(x.shape, (3, 7, 10))
+        np.testing.assert_array_equal(mask.sum(1).numpy(), [3, 7, 5])
+        self.assertEqual(y.dtype, torch.long)
+
+
+class TestSelectBandsBatch(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        torch.manual_seed(0)
+        self.select_bands = SelectBands(level="L2A")
+        # shorter and longer than the 45 sampled time steps
+        self.batch = [
+            (time_series(length), label)
+            for label, length in enumerate([1, 20, 45, 60, 100])
+        ]
+
+    def time_steps(self, x):
+        """The time steps sampled in the selected bands, decoded from their values"""
+        first_band = self.select_bands.selected_band_idxs[0]
+        return np.round((x[..., 0].numpy() * 1e4 - first_band) / 1000).astype(int)
+
+    def test_same_as_per_sample(self):
+        x, mask, y = SelectBandsBatch(level="L2A")(pad_time_series(self.batch))
+        self.assertEqual(x.dtype, torch.float32)
+        self.assertTrue(mask.all())
+        np.testing.assert_array_equal(y.numpy(), np.arange(5))
+
+        for i, (series, label) in enumerate(self.batch):
+            sample_x, sample_y = self.select_bands((series, label))
+            self.assertEqual(x[i].shape, sample_x.shape)
+            self.assertEqual(mask[i].shape, sample_x.shape[:1])
+            self.assertEqual(y[i], sample_y)
+
+            idxs = self.time_steps(x[i])
+            self.assertTrue(np.all(np.diff(idxs) >= 0))
+            self.assertTrue(np.all((idxs >= 0) & (idxs < len(series))))
+            if len(series) >= self.select_bands.sequencelength:
+                self.assertEqual(len(np.unique(idxs)), len(idxs))
+
+            # the same values as the per-sample selection of these time steps
+            expected = torch.from_numpy(
+                series[:, self.select_bands.selected_band_idxs][idxs] * 1e-4
+            ).float()
+            torch.testing.assert_close(x[i], expected, rtol=0, atol=0)
+
+
+class TestSelectBandsVariableLength(unittest.TestCase):
+    def setUp(self):
+        self.select_bands = SelectBands(level="L2A")
+        self.batch = [(time_series(length), 0) for length in [4, 9, 2]]
+
+    def test_same_as_per_sample(self):
+        padded = pad_time_series(self.batch)
+        x, mask, y = SelectBandsVariableLength(level="L2A")(padded)
+        self.assertEqual(x.shape, (3, 9, 10))
+        torch.testing.assert_close(mask, padded[1], rtol=0, atol=0)
+
+        for i, (series, _) in enumerate(self.batch):
+            # all the time steps of the per-sample selection, in order
+            expected = torch.from_numpy(
+                series[:, self.select_bands.selected_band_idxs] * 1e-4
+            ).float()
+            torch.testing.assert_close(x[i, : len(series)], expected, rtol=0, atol=0)
+            self.assertFalse(mask[i, len(series) :].any())
+
+    def test_empty_time_series(self):
+        batch = [(np.zeros((0, 16)), 0), (np.zeros((0, 16)), 1)]
+        x, mask, y = SelectBandsVariableLength(level="L2A")(pad_time_series(batch))
+        self.assertEqual(x.shape, (2, 1, 10))
+        self.assertEqual(mask.shape, (2, 1))
+        self.assertFalse(mask.any())
+
+
+if __name__ == "__main__":
+    unittest.main()
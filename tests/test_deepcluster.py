@@ -0,0 +1,105 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import torch
+
+from aitlas.clustering.utils import preprocess_features
+from aitlas.models.unsupervised import UnifLabelSampler, compute_features
+
+
+class TestFeatures(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.images = torch.randn(50, 300)
+        self.dataloader = torch.utils.data.DataLoader(
+            torch.utils.data.TensorDataset(self.images, torch.zeros(50)), batch_size=7
+        )
+        self.model = torch.nn.Linear(300, 260)
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_memory_mapped_features(self):
+        in_ram = compute_features(self.dataloader, self.model, 50, "cpu")
+        path = os.path.join(self.tmp.name, "features.npy")
+        mapped = compute_features(self.dataloader, self.model, 50, "cpu", path=path)
+
+        self.assertIsInstance(mapped, np.memmap)
+        self.assertEqual(mapped.shape, (50, 260))
+        np.testing.assert_array_equal(mapped, in_ram)
+        with torch.no_grad():
+            np.testing.assert_allclose(
+                in_ram, self.model(self.images).numpy(), atol=1e-5
+            )
+        # the file holds all the features
+        np.testing.assert_array_equal(np.load(path), in_ram)
+
+    def test_preprocess_by_blocks(self):
+        path = os.path.join(self.tmp.name, "features.npy")
+        features = compute_features(self.dataloader, self.model, 50, "cpu", path=path)
+
+        expected = preprocess_features(np.array(features), pca=16)
+        blocks = preprocess_features(features, pca=16, block_size=8)
+        np.testing.assert_allclose(blocks, expected, rtol=1e-5, atol=1e-6)
+        np.testing.assert_allclose(np.linalg.norm(blocks, axis=1), 1, rtol=1e-5)
+
+        # the PCA fitted on a sample of the features
+        sampled = preprocess_features(features, pca=16, sample_size=40)
+        self.assertEqual(sampled.shape, (50, 16))
+        np.testing.assert_allclose(np.linalg.norm(sampled, axis=1), 1, rtol=1e-5)
+
+    def test_memory_mapped_features_sampled_by_default(self):
+        path = os.path.join(self.tmp.name, "features.npy")
+        features = compute_features(self.dataloader, self.model, 50, "cpu", path=path)
+        with mock.patch("aitlas.clustering.utils.MEMMAP_PCA_SAMPLE_SIZE", 40):
+            reduced = preprocess_features(features, pca=16)
+        np.testing.assert_array_equal(
+            reduced, preprocess_features(np.array(features), pca=16, sample_size=40)
+        )
+
+    def test_no_images(self):
+        dataloader = torch.utils.data.DataLoader(
+            torch.utils.data.TensorDataset(torch.zeros(0, 300), torch.zeros(0))
+        )
+        path = os.path.join(self.tmp.name, "features.npy")
+        self.assertIsNone(compute_features(dataloader, self.model, 0, "cpu", path=path))
+
+
+class TestUnifLabelSampler(unittest.TestCase):
+    def setUp(self):
+        np.random.seed(0)
+        # clusters of very different sizes, clusters 1 and 4 are empty
+        self.images_lists = [
+            np.arange(0, 2),
+            np.array([], dtype=np.int64),
+            np.arange(2, 60),
+            np.arange(60, 100),
+            [],
+        ]
+
+    def test_uniform_over_clusters(self):
+        sampler = UnifLabelSampler(60, self.images_lists)
+        indexes = np.array(list(sampler))
+        self.assertEqual(len(sampler), 60)
+        self.assertEqual(len(indexes), 60)
+        self.assertTrue(np.all((indexes >= 0) & (indexes < 100)))
+
+        # 21 samples drawn from each cluster with images, before keeping the first 60
+        counts = np.bincount(np.digitize(indexes, [2, 60]), minlength=3)
+        self.assertTrue(np.all(counts <= 21))
+        self.assertTrue(np.all(counts >= 60 - 2 * 21))
+        # the clusters larger than 21 images are sampled without replacement
+        for large in [indexes[(indexes >= 2) & (indexes < 60)], indexes[indexes >= 60]]:
+            self.assertEqual(len(np.unique(large)), len(large))
+
+    def test_all_clusters_empty(self):
+        with self.assertRaises(ValueError):
+            UnifLabelSampler(10, [np.array([], dtype=np.int64), []])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import unittest
+import warnings
+
+import numpy as np
+import torch
+from sklearn.metrics import average_precision_score, roc_auc_score
+
+from aitlas.base.metrics import MultiLabelRunningScore, average_precision, roc_auc
+
+
+class TestRankingMetrics(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.samples, self.classes = 500, 6
+        self.y_true = (rng.random((self.samples, self.classes)) < 0.3).astype(np.uint8)
+        self.y_true[:, 4] = 0  # no positive sample
+        self.y_true[:, 5] = 1  # no negative sample
+        scores = rng.random((self.samples, self.classes)).astype(np.float32)
+        self.inputs = {
+            "distinct scores": scores,
+            # many ties, within and across the labels
+            "tied scores": np.round(scores * 10) / 10,
+        }
+
+    def sklearn_average_precision(self, y_true, y_score, column):
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            return average_precision_score(y_true[:, column], y_score[:, column])
+
+    def test_average_precision(self):
+        for name, y_score in self.inputs.items():
+            ap = average_precision(
+                torch.from_numpy(self.y_true), torch.from_numpy(y_score)
+            )
+            for column in range(self.classes):
+                with self.subTest(scores=name, column=column):
+                    self.assertAlmostEqual(
+                        float(ap[column]),
+                        self.sklearn_average_precision(self.y_true, y_score, column),
+                        places=6,
+                    )
+
+    def test_roc_auc(self):
+        for name, y_score in self.inputs.items():
+            auc = roc_auc(torch.from_numpy(self.y_true), torch.from_numpy(y_score))
+            with self.subTest(scores=name):
+                np.testing.assert_allclose(
+                    auc[:4].numpy(),
+                    roc_auc_score(self.y_true[:, :4], y_score[:, :4], average=None),
+                    rtol=0,
+                    atol=1e-9,
+                )
+                # undefined for a single label value, where sklearn raises an error
+                self.assertTrue(torch.isnan(auc[4:]).all())
+
+    def test_running_score(self):
+        y_score = self.inputs["tied scores"]
+        score = MultiLabelRunningScore(self.classes, "cpu")
+        for start in range(0, self.samples, 64):
+            y_true = torch.from_numpy(self.y_true[start : start + 64])
+            y_prob = torch.from_numpy(y_score[start : start + 64])
+            score.update(y_true, (y_prob > 0.5).to(torch.uint8), y_prob)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            expected = average_precision_score(self.y_true, y_score)
+        self.assertAlmostEqual(score.map()["mAP"], expected, places=6)
+
+
+if __name__ == "__main__":
+    unittest.main()
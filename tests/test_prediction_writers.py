@@ -0,0 +1,187 @@
+import csv
+import glob
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from aitlas.tasks.predict import ImageFolderDataset
+from aitlas.utils.prediction_writers import (
+    CsvPredictionWriter,
+    NpyPredictionWriter,
+    ParquetPredictionWriter,
+)
+
+
+LABELS = ["cat", "dog", "bird"]
+
+
+def predictions(fnames):
+    """Fake probabilities, derived from the number of each image"""
+    numbers = np.array(
+        [int(os.path.basename(fname)[4:7]) for fname in fnames], dtype=np.float32
+    )
+    return np.stack([numbers / 100, numbers / 200, 1 - numbers / 100], axis=1)
+
+
+class PredictionWriterTestCase:
+    """Writes the predictions of a folder of images in two runs, the second one resuming the first"""
+
+    images = 25
+    batch_size = 4
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data_dir = os.path.join(self.tmp.name, "images")
+        os.makedirs(self.data_dir)
+        self.fnames = [f"img_{i:03d}.png" for i in range(self.images)]
+        for fname in self.fnames:
+            open(os.path.join(self.data_dir, fname), "w").close()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def create_writer(self, size, resume):
+        raise NotImplementedError
+
+    def read_predictions(self):
+        """Returns the names of the images and the probabilities in the output"""
+        raise NotImplementedError
+
+    def run_predictions(self, resume, batches=None, close=True):
+        """Writes the predictions batch by batch like `PredictTask.export_predictions`"""
+        dataset = ImageFolderDataset(self.data_dir, LABELS, None, self.batch_size)
+        writer = self.create_writer(len(dataset), resume)
+        done = writer.written()
+        if done:
+            dataset.exclude(done)
+
+        starts = range(0, len(dataset), self.batch_size)
+        for start in list(starts)[:batches]:
+            fnames = dataset.relative_paths[start : start + self.batch_size]
+            writer.write(fnames, predictions(fnames))
+        if close:
+            writer.close()
+        return dataset
+
+    def check_predictions(self):
+        fnames, probs = self.read_predictions()
+        self.assertEqual(len(fnames), len(set(fnames)))
+        self.assertEqual(sorted(fnames), self.fnames)
+        np.testing.assert_allclose(probs, predictions(fnames), rtol=1e-6)
+
+    def test_write(self):
+        self.run_predictions(resume=False)
+        self.check_predictions()
+
+    def test_resume(self):
+        self.run_predictions(resume=False, batches=3)
+        dataset = self.run_predictions(resume=True)
+        self.assertEqual(len(dataset), self.images - 3 * self.batch_size)
+        self.check_predictions()
+
+    def test_resume_finished(self):
+        self.run_predictions(resume=False)
+        dataset = self.run_predictions(resume=True)
+        self.assertEqual(len(dataset), 0)
+        self.check_predictions()
+
+    def test_resume_subfolders(self):
+        # images with the same file names in subfolders
+        for folder in ["a", "b"]:
+            os.makedirs(os.path.join(self.data_dir, folder))
+            for fname in self.fnames[:3]:
+                open(os.path.join(self.data_dir, folder, fname), "w").close()
+        self.fnames = sorted(
+            self.fnames + [os.path.join(f, n) for f in "ab" for n in self.fnames[:3]]
+        )
+        self.run_predictions(resume=False, batches=2)
+        dataset = self.run_predictions(resume=True)
+        self.assertEqual(len(dataset), self.images + 6 - 2 * self.batch_size)
+        self.check_predictions()
+
+
+class TestCsvPredictionWriter(PredictionWriterTestCase, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.file = os.path.join(self.tmp.name, "predictions.csv")
+
+    def create_writer(self, size, resume):
+        return CsvPredictionWriter(self.file, LABELS, size, resume)
+
+    def read_predictions(self):
+        with open(self.file, "r", newline="") as f:
+            rows = list(csv.reader(f, delimiter=";"))
+        self.assertEqual(rows[0], ["image"] + LABELS)
+        fnames = [row[0] for row in rows[1:]]
+        probs = np.array([row[1:] for row in rows[1:]], dtype=np.float32)
+        return fnames, probs
+
+    def test_resume_after_partial_line(self):
+        self.run_predictions(resume=False, batches=2)
+        # a row interrupted while it was written
+        with open(self.file, "a") as f:
+            f.write("img_008.png;0.08")
+        self.run_predictions(resume=True)
+        self.check_predictions()
+
+
+class TestParquetPredictionWriter(PredictionWriterTestCase, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.dir = os.path.join(self.tmp.name, "predictions")
+
+    def create_writer(self, size, resume):
+        return ParquetPredictionWriter(self.dir, LABELS, size, resume, part_size=8)
+
+    def read_predictions(self):
+        import pyarrow.parquet as pq
+
+        fnames, probs = [], []
+        for part in sorted(glob.glob(os.path.join(self.dir, "part-*.parquet"))):
+            table = pq.read_table(part)
+            fnames += table.column("image").to_pylist()
+            probs.append(
+                np.stack([table.column(label).to_numpy() for label in LABELS], 1)
+            )
+        return fnames, np.concatenate(probs)
+
+    def test_resume_after_interruption(self):
+        # the rows buffered after the last part are lost
+        self.run_predictions(resume=False, batches=3, close=False)
+        self.assertEqual(len(self.read_predictions()[0]), 8)
+        dataset = self.run_predictions(resume=True)
+        self.assertEqual(len(dataset), self.images - 8)
+        self.check_predictions()
+
+
+class TestNpyPredictionWriter(PredictionWriterTestCase, unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.file = os.path.join(self.tmp.name, "predictions.npy")
+
+    def create_writer(self, size, resume):
+        return NpyPredictionWriter(self.file, LABELS, size, resume)
+
+    def read_predictions(self):
+        with open(os.path.join(self.tmp.name, "predictions_images.txt")) as f:
+            fnames = f.read().splitlines()
+        probs = np.load(self.file)
+        self.assertEqual(probs.shape[1], len(LABELS))
+        return fnames, probs[: len(fnames)]
+
+    def test_resume_with_new_images(self):
+        self.run_predictions(resume=False, batches=3)
+        # images added to the folder since the first run
+        for i in range(self.images, self.images + 5):
+            fname = f"img_{i:03d}.png"
+            open(os.path.join(self.data_dir, fname), "w").close()
+            self.fnames.append(fname)
+        self.run_predictions(resume=True)
+        self.check_predictions()
+        self.assertEqual(len(np.load(self.file)), len(self.fnames))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+
+import numpy as np
+from skimage.morphology import erosion
+
+from aitlas.datasets.spacenet6 import border_mask
+
+
+def per_label_border_mask(labels, edge_width):
+    """The border mask as computed before, eroding each building separately"""
+    border = np.zeros_like(labels, dtype="bool")
+    footprint = np.ones((edge_width, edge_width), dtype=np.uint8)
+    for label in range(1, labels.max() + 1):
+        building = labels == label
+        border |= erosion(building, footprint) ^ building
+    return border
+
+
+class TestBorderMask(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.labels = np.zeros((120, 120), dtype="uint16")
+        for label in range(1, 25):
+            y, x = rng.integers(0, 110, 2)
+            height, width = rng.integers(2, 20, 2)
+            self.labels[y : y + height, x : x + width] = label
+
+    def test_same_as_per_label_erosion(self):
+        for edge_width in range(1, 9):
+            with self.subTest(edge_width=edge_width):
+                np.testing.assert_array_equal(
+                    border_mask(self.labels, edge_width),
+                    per_label_border_mask(self.labels, edge_width),
+                )
+
+    def test_no_buildings(self):
+        labels = np.zeros((32, 32), dtype="uint16")
+        self.assertFalse(border_mask(labels, 3).any())
+
+
+if __name__ == "__main__":
+    unittest.main()
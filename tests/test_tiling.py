@@ -0,0 +1,212 @@
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+import tifffile
+import torch
+
+from aitlas.base import BaseSegmentationClassifier
+from aitlas.utils.tiling import SceneReader, TileBlender, tile_starts, window_weights
+
+
+class PointwiseSegmentation(BaseSegmentationClassifier):
+    """The prediction of each pixel only depends on its bands, wherever the window is"""
+
+    def __init__(self, config):
+        super().__init__(config)
+        self.model = torch.nn.Conv2d(3, 2, kernel_size=1)
+
+    def forward(self, x):
+        return self.model(x)
+
+
+def to_tensor(tile):
+    return torch.from_numpy(tile).permute(2, 0, 1).float() / 255
+
+
+class TestTileStarts(unittest.TestCase):
+    def test_windows_cover_the_image(self):
+        for length, tile_size, stride in [(100, 32, 24), (96, 32, 32), (33, 32, 8)]:
+            with self.subTest(length=length, tile_size=tile_size, stride=stride):
+                starts = tile_starts(length, tile_size, stride)
+                self.assertEqual(starts[0], 0)
+                # the last window is aligned to the end of the image
+                self.assertEqual(starts[-1], length - tile_size)
+                self.assertTrue(np.all(np.diff(starts) > 0))
+                self.assertTrue(np.all(np.diff(starts) <= stride))
+                covered = np.zeros(length, dtype=bool)
+                for start in starts:
+                    covered[start : start + tile_size] = True
+                self.assertTrue(covered.all())
+
+    def test_image_smaller_than_window(self):
+        self.assertEqual(tile_starts(20, 32, 16), [0])
+        self.assertEqual(tile_starts(32, 32, 16), [0])
+
+
+class TestWindowWeights(unittest.TestCase):
+    def test_gaussian(self):
+        weights = window_weights(16)
+        self.assertEqual(weights.shape, (16, 16))
+        self.assertEqual(weights.dtype, np.float32)
+        np.testing.assert_allclose(weights, weights.T)
+        np.testing.assert_allclose(weights, weights[::-1, ::-1])
+        # the centre weighs most, the borders are not ignored
+        self.assertAlmostEqual(float(weights.max()), 1, places=2)
+        self.assertEqual(weights.argmax() // 16, 7)
+        self.assertGreaterEqual(weights.min(), 1e-3)
+
+    def test_uniform(self):
+        np.testing.assert_array_equal(window_weights(8, "uniform"), np.ones((8, 8)))
+
+    def test_unknown_blending(self):
+        with self.assertRaises(ValueError):
+            window_weights(8, "linear")
+
+
+class TestTileBlender(unittest.TestCase):
+    def test_blended_sums(self):
+        weights = np.arange(1, 17, dtype=np.float32).reshape(4, 4)
+        blender = TileBlender(2, 6, weights)
+        first = np.full((2, 4, 4), 0.2, dtype=np.float32)
+        second = np.full((2, 4, 4), 0.8, dtype=np.float32)
+        blender.add(0, 0, first)
+        blender.add(0, 2, second)
+
+        top, probs = blender.pop(4)
+        self.assertEqual(top, 0)
+        self.assertEqual(probs.shape, (2, 4, 6))
+        np.testing.assert_allclose(probs[:, :, :2], 0.2, rtol=1e-6)
+        np.testing.assert_allclose(probs[:, :, 4:], 0.8, rtol=1e-6)
+        # the overlapping columns are averaged with the weights of both windows
+        expected = (0.2 * weights[:, 2:] + 0.8 * weights[:, :2]) / (
+            weights[:, 2:] + weights[:, :2]
+        )
+        np.testing.assert_allclose(probs[0, :, 2:4], expected, rtol=1e-6)
+
+    def test_pop_strips(self):
+        blender = TileBlender(1, 4, np.ones((4, 4), dtype=np.float32))
+        blender.add(0, 0, np.full((1, 4, 4), 0.5, dtype=np.float32))
+        blender.add(2, 0, np.full((1, 4, 4), 1.0, dtype=np.float32))
+        # only the rows which a window can still cover are kept
+        self.assertEqual(blender.weight_sum.shape, (6, 4))
+
+        top, probs = blender.pop(2)
+        self.assertEqual((top, probs.shape), (0, (1, 2, 4)))
+        np.testing.assert_allclose(probs, 0.5)
+        self.assertEqual(blender.top, 2)
+        self.assertEqual(blender.weight_sum.shape, (4, 4))
+
+        blender.add(4, 0, np.full((1, 2, 4), 0.25, dtype=np.float32))
+        top, probs = blender.pop(6)
+        self.assertEqual((top, probs.shape), (2, (1, 4, 4)))
+        np.testing.assert_allclose(probs[0, :2], 0.75)
+        np.testing.assert_allclose(probs[0, 2:], 0.625)
+        self.assertEqual(blender.weight_sum.shape, (0, 4))
+
+
+class TestSceneReader(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.image = rng.integers(0, 256, (50, 70, 3), dtype=np.uint8)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def write(self, name, **kwargs):
+        path = os.path.join(self.tmp.name, name)
+        tifffile.imwrite(path, **kwargs)
+        return path
+
+    def read_without_rasterio(self, path):
+        with mock.patch.dict(sys.modules, {"rasterio": None}):
+            reader = SceneReader(path)
+        self.assertEqual((reader.height, reader.width), (50, 70))
+        window = reader.read(10, 20, 16, 32)
+        reader.close()
+        return window
+
+    def test_planar_tiff(self):
+        planar = np.ascontiguousarray(np.moveaxis(self.image, -1, 0))
+        for compression in [None, "zlib"]:
+            with self.subTest(compression=compression):
+                path = self.write(
+                    f"planar_{compression}.tif",
+                    data=planar,
+                    planarconfig="separate",
+                    compression=compression,
+                )
+                np.testing.assert_array_equal(
+                    self.read_without_rasterio(path), self.image[10:26, 20:52]
+                )
+
+    def test_interleaved_tiff(self):
+        path = self.write("interleaved.tif", data=self.image, photometric="rgb")
+        np.testing.assert_array_equal(
+            self.read_without_rasterio(path), self.image[10:26, 20:52]
+        )
+
+    def test_single_band_tiff(self):
+        path = self.write("band.tif", data=self.image[..., 0])
+        np.testing.assert_array_equal(
+            self.read_without_rasterio(path), self.image[10:26, 20:52, 0]
+        )
+
+
+class TestTiledPrediction(unittest.TestCase):
+    def setUp(self):
+        torch.manual_seed(0)
+        self.model = PointwiseSegmentation({"num_classes": 2, "use_cuda": False})
+        self.tmp = tempfile.TemporaryDirectory()
+        rng = np.random.default_rng(0)
+        self.image = rng.integers(0, 256, (3, 90, 110), dtype=np.uint8)
+        self.path = os.path.join(self.tmp.name, "scene.tif")
+        tifffile.imwrite(self.path, self.image, planarconfig="separate")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def predict_tiled(self, **kwargs):
+        with mock.patch.dict(sys.modules, {"rasterio": None}):
+            reader = SceneReader(self.path)
+        probs = np.zeros((2, reader.height, reader.width), dtype=np.float32)
+        covered = np.zeros(reader.height, dtype=int)
+        for row, strip in self.model.predict_tiled(reader, to_tensor, **kwargs):
+            probs[:, row : row + strip.shape[1]] = strip
+            covered[row : row + strip.shape[1]] += 1
+        reader.close()
+        # every row is handed out once
+        np.testing.assert_array_equal(covered, 1)
+        return probs
+
+    def test_same_as_untiled(self):
+        with torch.no_grad():
+            inputs = to_tensor(np.moveaxis(self.image, 0, -1))[None]
+            expected = torch.sigmoid(self.model(inputs))[0].numpy()
+
+        # overlapping windows, windows without overlap and a window larger than the image
+        windows = [(32, 8, 3), (48, 16, 8), (128, 0, 1)]
+        for blending in ["gaussian", "uniform"]:
+            for tile_size, overlap, batch_size in windows:
+                with self.subTest(
+                    blending=blending, tile_size=tile_size, overlap=overlap
+                ):
+                    probs = self.predict_tiled(
+                        tile_size=tile_size,
+                        overlap=overlap,
+                        batch_size=batch_size,
+                        blending=blending,
+                    )
+                    np.testing.assert_allclose(probs, expected, rtol=1e-5, atol=1e-6)
+
+    def test_overlap_larger_than_window(self):
+        with self.assertRaises(ValueError):
+            self.predict_tiled(tile_size=32, overlap=32)
+
+
+if __name__ == "__main__":
+    unittest.main()